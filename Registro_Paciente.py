@@ -2,55 +2,61 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from datetime import datetime
-import json
-import base64
 
 # Importamos la función de cálculo del motor
-from utils import calcular_probabilidad_math, obtener_color_riesgo
-
-# --- LIBRERÍAS DE CONEXIÓN GSPREAD ---
-import gspread
-from google.oauth2.service_account import Credentials
-# ------------------------------------
+from utils import calcular_probabilidad_math, obtener_color_riesgo, SERVICIOS
+from persistencia import EscritorRegistro, estado_escritura, podar_guardados
+from fragmentos import abrir_registro, modificacion_registro
+from cache_compartida import CACHE
+from centros import centros, config_centro, clave_cache
+from codificacion import codificar, OPCIONES_FISIO, OPCIONES_COMORB, OPCIONES_FRAIL
+from historial import HistorialPacientes
 
 # Configuración de la página principal
 st.set_page_config(page_title="CriSTAL: Registro de Paciente", page_icon="🔢", layout="centered")
 st.title("📝 CriSTAL: Registro de Paciente")
 st.markdown("Fórmula Logística: L = -3.844 + 0.285 * Score")
 
-# --- INICIALIZACIÓN DE LA CONEXIÓN CON GSPREAD (CON BASE64) ---
-ws = None
+# --- ESCRITOR COMPARTIDO (UNO POR CENTRO Y SERVIDOR) ---
+@st.cache_resource
+def obtener_escritor(centro):
+    """
+    Conecta con el registro del centro una sola vez por proceso y arranca el hilo escritor.
+    Todas las sesiones comparten esta instancia y sus escrituras se agrupan en lotes.
+    Con `fragmentacion` en los secrets, cada fila va a la hoja de su periodo.
+    """
+    ws = abrir_registro(config_centro(st.secrets["gcp"], centro))
+    return EscritorRegistro(ws)
+
+@st.cache_resource
+def obtener_historial(centro):
+    """
+    Carga el registro del centro una única vez por proceso; después solo se le anexan
+    las valoraciones guardadas desde este servidor. La descarga se comparte entre
+    procesos (caché en disco) mientras el documento no se modifique. Se espera a la
+    versión pedida: el historial queda memorizado y no debe partir de una descarga anterior.
+    """
+    registro = obtener_escritor(centro).ws
+    version = modificacion_registro(registro) or datetime.now().strftime("%Y%m%d-%H")
+    _, registros = CACHE.obtener(clave_cache("registro", centro), version, registro.get_all_records, esperar=True)
+    return HistorialPacientes.desde_registros(registros)
+
+escritor = None
+historial = None
 conn_exitosa = False
 
 try:
-    # 1. Obtener la cadena Base64 de Streamlit Secrets
-    # Nota: Asume que tienes st.secrets["gcp"]["service_account_base64"]
-    base64_string = st.secrets["gcp"]["service_account_base64"]
-    
-    # 2. Decodificar la cadena Base64 a JSON
-    json_service_account = base64.b64decode(base64_string).decode('utf-8')
-    service_account_info = json.loads(json_service_account)
-    
-    # 3. Preparar credenciales
-    scopes = [
-        "https://www.googleapis.com/auth/spreadsheets",
-        "https://www.googleapis.com/auth/drive"
-    ]
-    credentials = Credentials.from_service_account_info(
-        service_account_info,
-        scopes=scopes
-    )
-    
-    # 4. Autorización y conexión
-    gc = gspread.authorize(credentials)
-    
-    SPREADSHEET_ID = st.secrets["gcp"]["spreadsheet_id"]
-    WORKSHEET_NAME = st.secrets["gcp"]["worksheet_name"] 
-    
-    sh = gc.open_by_key(SPREADSHEET_ID)
-    ws = sh.worksheet(WORKSHEET_NAME) 
-    
-    # Lectura de datos existentes no es necesaria aquí, pero se deja el flag
+    CENTROS = centros(st.secrets["gcp"])
+except Exception:
+    CENTROS = centros()
+if len(CENTROS) > 1:
+    centro = st.sidebar.selectbox("🏥 Centro", list(CENTROS), format_func=lambda c: CENTROS[c]["nombre"], key="centro")
+else:
+    centro = next(iter(CENTROS))
+
+try:
+    escritor = obtener_escritor(centro)
+    historial = obtener_historial(centro)
     conn_exitosa = True
     st.sidebar.success("Conexión a BBDD Exitosa")
     
@@ -59,12 +65,63 @@ except Exception as e:
     st.sidebar.error(f"⚠️ Error BBDD. No se pudo conectar a Google Sheets: {e}")
     conn_exitosa = False
 
+# --- ESTADO DE LOS GUARDADOS DE ESTA SESIÓN ---
+MAX_GUARDADOS_VISIBLES = 10
+
+if 'guardados' not in st.session_state:
+    st.session_state['guardados'] = []  # (id_paciente, hora, Future del escritor)
+
+@st.fragment(run_every=2)
+def estado_guardados():
+    """Se refresca solo cada 2 s para reflejar las escrituras completadas sin rerun de la página."""
+    guardados = st.session_state['guardados']
+    if not guardados:
+        return
+    # Olvidar los antiguos ya guardados para que la sesión no crezca indefinidamente;
+    # los pendientes y los fallidos siguen a la vista
+    podar_guardados(guardados, MAX_GUARDADOS_VISIBLES)
+    st.markdown("#### Registros enviados")
+    for id_pac, hora, futuro in reversed(guardados):
+        estado = estado_escritura(futuro)
+        if estado == "pendiente":
+            st.info(f"⏳ {hora} · **{id_pac}**: guardando...")
+        elif estado == "guardado":
+            st.success(f"✅ {hora} · **{id_pac}**: guardado")
+        else:
+            st.error(f"❌ {hora} · **{id_pac}**: error al guardar ({futuro.exception()})")
+
+with st.sidebar:
+    estado_guardados()
+
+# --- BÚSQUEDA DE PACIENTE E HISTORIAL ---
+with st.sidebar:
+    st.markdown("#### Historial de paciente")
+    id_buscado = st.text_input("Buscar por ID", key="id_busqueda")
+    if id_buscado and historial is not None:
+        previas = historial.historial(id_buscado)
+        if len(previas) == 0:
+            st.caption(f"Sin valoraciones previas para **{id_buscado}**.")
+        else:
+            ultima = previas.iloc[-1]
+            delta = previas["Delta_Score"].iloc[-1]
+            st.metric(
+                f"Última valoración ({str(ultima['Fecha'])[:10]})",
+                f"{int(ultima['Score_Total'])} puntos",
+                delta=None if pd.isna(delta) else f"{int(delta):+d} vs. visita anterior",
+                delta_color="inverse",
+            )
+            st.dataframe(
+                previas[["Visita", "Fecha", "Score_Total", "Prob_Mortalidad_Mat_%", "Delta_Score"]],
+                hide_index=True,
+            )
+
 # -----------------------------------------------------------------------
 # --- FORMULARIO ---
 # -----------------------------------------------------------------------
 
 with st.form("entry_form", clear_on_submit=True):
     id_paciente = st.text_input("ID Paciente / Historia Clínica", key="id_input")
+    servicio = st.selectbox("Servicio quirúrgico (lista de espera)", SERVICIOS)
     
     puntos = 0
     data_to_save = {}
@@ -185,7 +242,12 @@ with st.form("entry_form", clear_on_submit=True):
                 "V7_Proteinuria_Valor": v7_val, "V7_Proteinuria_Puntos": v7_pts,
                 "V8_ECG_Valor": v8_val, "V8_ECG_Puntos": v8_pts,
                 "V9_Fragilidad_Detalle": v9_val, "V9_Fragilidad_Puntos": v9_pts,
-                "Outcome_30dias": "" # Columna para rellenar en el seguimiento
+                "Outcome_30dias": "", # Columna para rellenar en el seguimiento
+                # Factores codificados como máscara de bits (ver codificacion.py)
+                "V3_Fisiologico_Codigo": codificar(fisio_activas, OPCIONES_FISIO),
+                "V4_Comorbilidad_Codigo": codificar(comorb_activas, OPCIONES_COMORB),
+                "V9_Fragilidad_Codigo": codificar(frag_list, OPCIONES_FRAIL),
+                "Servicio": servicio
             }])
             
             # --- MOSTRAR RESULTADOS INMEDIATOS ---
@@ -206,12 +268,14 @@ with st.form("entry_form", clear_on_submit=True):
             )
             
             # --- ENVIAR A GOOGLE SHEETS ---
-            if conn_exitosa and ws is not None:
-                try:
-                    datos_fila = nuevo_registro.values.tolist()
-                    ws.append_rows(datos_fila, value_input_option='USER_ENTERED')
-                    st.toast("Datos guardados en la nube correctamente")
-                except Exception as e:
-                    st.error(f"Error al guardar en la nube: {e}")
+            if conn_exitosa and escritor is not None:
+                # No bloqueamos: el escritor agrupa esta fila con las de otras sesiones y
+                # el estado (pendiente/guardado/error) se actualiza en la barra lateral
+                datos_fila = nuevo_registro.values.tolist()[0]
+                futuro = escritor.encolar(datos_fila)
+                st.session_state['guardados'].append((id_paciente, datetime.now().strftime("%H:%M:%S"), futuro))
+                # Al historial solo llega cuando el escritor confirma que está en la hoja
+                historial.agregar_al_guardarse(futuro, nuevo_registro)
+                st.toast("Registro enviado. Puede empezar con el siguiente paciente.")
             else:
                 st.warning("⚠️ El cálculo fue exitoso, pero la conexión a Google Sheets falló. Los datos no se han guardado.")
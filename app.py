@@ -1,6 +1,5 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 from datetime import datetime
 import json
 import base64
@@ -10,6 +9,8 @@ import gspread
 from google.oauth2.service_account import Credentials
 # ------------------------------------
 
+from modelos import probabilidades
+
 st.set_page_config(page_title="CriSTAL Secuencial", page_icon="🔢", layout="centered")
 st.title("📊 Registro CriSTAL Detallado")
 st.markdown("Variables del Score Modificado, ordenadas del 1 al 9.")
@@ -149,21 +150,13 @@ with st.form("entry_form", clear_on_submit=True):
         score_total = v1_pts + v2_pts + v3_pts + v4_pts + v5_pts + v6_pts + v7_pts + v8_pts + v9_pts
         
         # --- CÁLCULOS DE PROBABILIDAD (DOBLE) ---
-        
-        # 1. Logit (común a ambos): L = -3.844 + (0.285 * Score Total)
-        logit = -3.844 + (0.285 * score_total)
-        
-        # 2. Probabilidad Matemática / Esperada (Función Logística Estándar)
-        # P_Mat = 1 / (1 + e^(-Logit))
-        prob_math = 1 / (1 + np.exp(-logit))
-        prob_math_pct = round(prob_math * 100, 2)
-        
-        # 3. Probabilidad Tesis Literal (Interpretación directa de la expresión citada)
-        # P_Tesis = e^(Score) / (1 + e^(Logit))
-        # Nota: Esta fórmula puede resultar en una probabilidad mayor al 100% o muy alta para scores altos,
-        # lo que subraya el posible error tipográfico en la fuente original.
-        prob_thesis = np.exp(score_total) / (1 + np.exp(logit))
-        prob_thesis_pct = round(prob_thesis * 100, 2)
+        # Ambas fórmulas salen del registro de modelos (modelos.py) en una sola evaluación.
+        # Nota: la fórmula Tesis Literal, P = e^(Score) / (1 + e^(Logit)), supera el 100%
+        # para casi cualquier score (posible error tipográfico en la fuente original);
+        # se calcula sin desbordamiento y se acota a 100%.
+        prob = probabilidades(score_total, ["CriSTAL original", "Tesis literal"])
+        prob_math_pct = round(prob["CriSTAL original"], 2)
+        prob_thesis_pct = round(prob["Tesis literal"], 2)
         
         # --- MOSTRAR RESULTADOS INMEDIATOS ---
         st.success(f"✅ Paciente **{id_paciente}** guardado correctamente.")
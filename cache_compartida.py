@@ -0,0 +1,117 @@
+import os
+import fcntl
+import pickle
+
+# --- CACHÉ EN DISCO COMPARTIDA ENTRE PROCESOS ---
+# Con varias réplicas del servidor detrás de un balanceador, cada proceso tendría
+# su propia copia del registro, de los agregados del Dashboard y de las imágenes.
+# Estructura:  <directorio>/<clave>/<version>.pkl   (inmutable una vez escrito)
+#              <directorio>/<clave>/ACTUAL          -> versión vigente (os.replace)
+#              <directorio>/<clave>/.lock           -> cerrojo del único proceso que refresca
+# Los lectores nunca toman cerrojos: leen el puntero y abren un fichero que ya no cambia.
+
+DIRECTORIO_CACHE = os.environ.get("CRISTAL_CACHE", "cache")
+PUNTERO = "ACTUAL"
+
+
+class CacheCompartida:
+    """
+    Caché clave -> valor (picklable) con sello de versión.
+
+    `obtener(clave, version, construir)` devuelve (versión servida, valor); si la
+    caché tiene otra versión, un único proceso la reconstruye (cerrojo fcntl no
+    bloqueante) mientras los demás siguen sirviendo la anterior sin esperar.
+    """
+
+    def __init__(self, directorio=DIRECTORIO_CACHE):
+        self.directorio = directorio
+        self._memoria = {}  # clave -> (version, valor) ya deserializado en este proceso
+
+    def _ruta(self, clave, *partes):
+        return os.path.join(self.directorio, clave, *partes)
+
+    def version(self, clave):
+        """Versión publicada de `clave`, o None."""
+        try:
+            with open(self._ruta(clave, PUNTERO)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def leer(self, clave, version=None):
+        """Valor publicado (solo si coincide con `version`, cuando se indica), o None."""
+        vigente = self.version(clave)
+        if vigente is None or (version is not None and vigente != version):
+            return None
+
+        en_memoria = self._memoria.get(clave)
+        if en_memoria is not None and en_memoria[0] == vigente:
+            return en_memoria[1]
+        try:
+            with open(self._ruta(clave, f"{vigente}.pkl"), "rb") as f:
+                valor = pickle.load(f)
+        except FileNotFoundError:
+            return None  # Sustituida entre la lectura del puntero y la del fichero
+        self._memoria[clave] = (vigente, valor)
+        return valor
+
+    def publicar(self, clave, version, valor):
+        """Escribe la versión y mueve el puntero de forma atómica; borra las versiones anteriores."""
+        carpeta = self._ruta(clave)
+        os.makedirs(carpeta, exist_ok=True)
+        destino = os.path.join(carpeta, f"{version}.pkl")
+        temporal = f"{destino}.{os.getpid()}.tmp"
+        with open(temporal, "wb") as f:
+            pickle.dump(valor, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporal, destino)
+
+        puntero = os.path.join(carpeta, f"{PUNTERO}.{os.getpid()}.tmp")
+        with open(puntero, "w") as f:
+            f.write(version)
+        os.replace(puntero, os.path.join(carpeta, PUNTERO))
+        self._memoria[clave] = (version, valor)
+
+        # Un lector que ya abrió una versión antigua la termina de leer aunque se borre
+        for nombre in os.listdir(carpeta):
+            if nombre.endswith(".pkl") and nombre != f"{version}.pkl":
+                try:
+                    os.remove(os.path.join(carpeta, nombre))
+                except FileNotFoundError:
+                    pass
+
+    def obtener(self, clave, version, construir, esperar=False):
+        """
+        (versión servida, valor) de `clave` para `version`, construyéndolo con
+        `construir()` si hace falta. Solo un proceso construye a la vez; los demás
+        devuelven la versión anterior sin esperar, salvo que todavía no haya ninguna
+        o que se pida `esperar`. Quien memorice el resultado (st.cache_resource,
+        lru_cache) debe usar `esperar=True` o no memorizar una versión distinta de
+        la pedida: la guardaría bajo la clave nueva hasta el siguiente cambio.
+        """
+        version = str(version)
+        valor = self.leer(clave, version)
+        if valor is not None:
+            return version, valor
+
+        os.makedirs(self._ruta(clave), exist_ok=True)
+        with open(self._ruta(clave, ".lock"), "a") as cerrojo:
+            try:
+                fcntl.flock(cerrojo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                anterior = None if esperar else self.version(clave)
+                valor = None if anterior is None else self.leer(clave, anterior)
+                if valor is not None:
+                    return anterior, valor
+                fcntl.flock(cerrojo, fcntl.LOCK_EX)  # Primera carga (o `esperar`): esperar al que construye
+            try:
+                valor = self.leer(clave, version)  # Otro proceso pudo publicarla mientras tanto
+                if valor is None:
+                    valor = construir()
+                    self.publicar(clave, version, valor)
+                return version, valor
+            finally:
+                fcntl.flock(cerrojo, fcntl.LOCK_UN)
+
+
+# Instancia compartida por los módulos de la app
+CACHE = CacheCompartida()
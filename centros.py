@@ -0,0 +1,182 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from utils import CATEGORIAS_RIESGO, CODIGO_ALTO, FACTORES_COHORTE, cohorte_desde_registro
+from indices import SCORE_MAX
+from snapshots import DIRECTORIO_SNAPSHOTS, exportar_snapshot
+from tendencias import TendenciasCohorte
+
+# --- CONFIGURACIÓN MULTICENTRO ---
+# Cada hospital tiene su propio registro (documento de Google Sheets), sus snapshots
+# y sus entradas en la caché compartida, de modo que el crecimiento de un centro no
+# afecta a las consultas de los demás. Secrets:
+#
+#   [gcp]                      credenciales comunes (service_account_base64)
+#   [gcp.centros.HUVR]
+#   nombre = "Hospital Universitario Virgen del Rocío"
+#   spreadsheet_id = "..."
+#   worksheet_name = "Registro"
+#   fragmentacion = "Y"        (opcional, ver fragmentos.py)
+#
+# Sin [gcp.centros] se mantiene el despliegue de un único centro con las claves de
+# [gcp] y las rutas de siempre (snapshots/ y las claves de caché sin sufijo).
+# Los scripts de línea de comandos actúan sobre el centro de CRISTAL_CENTRO o,
+# si no se indica, sobre todos.
+
+CENTRO_UNICO = "principal"
+RED = "red"  # Vista agregada de todos los centros (solo lectura)
+CENTRO_CLI = os.environ.get("CRISTAL_CENTRO")
+RESUMEN = "resumen.pkl"  # Resumen del centro, junto a cada versión de su snapshot
+
+
+def centros(gcp=None):
+    """Configuración de cada centro: {codigo: dict con las claves de [gcp] y las del centro}."""
+    gcp = dict(gcp or {})
+    por_centro = gcp.pop("centros", None)
+    if not por_centro:
+        return {CENTRO_UNICO: {"nombre": gcp.get("nombre", "Centro"), **gcp}}
+    return {
+        codigo: {**gcp, "nombre": codigo, **dict(config)}
+        for codigo, config in por_centro.items()
+    }
+
+
+def config_centro(gcp, centro):
+    """Sección de configuración de `centro` (la que esperan abrir_registro y abrir_worksheet)."""
+    configuracion = centros(gcp)
+    if centro not in configuracion:
+        raise KeyError(f"Centro no configurado: {centro}")
+    return configuracion[centro]
+
+
+def centros_cli(gcp):
+    """Centros sobre los que actúa un script: el de CRISTAL_CENTRO o todos."""
+    if CENTRO_CLI:
+        return {CENTRO_CLI: config_centro(gcp, CENTRO_CLI)}
+    return centros(gcp)
+
+
+# --- PARTICIONES POR CENTRO ---
+
+def directorio_snapshots(centro=None, directorio=DIRECTORIO_SNAPSHOTS):
+    """
+    Carpeta de snapshots del centro (snapshots/<centro>; la raíz en despliegues de un
+    centro). Sin `centro`, la de CRISTAL_CENTRO.
+    """
+    centro = centro or CENTRO_CLI or CENTRO_UNICO
+    return directorio if centro == CENTRO_UNICO else os.path.join(directorio, centro)
+
+
+def clave_cache(clave, centro):
+    """Clave de la caché compartida para los datos de un centro."""
+    return clave if centro == CENTRO_UNICO else f"{clave}-{centro}"
+
+
+# --- AGREGADOS POR CENTRO Y VISTA DE RED ---
+
+class ResumenCohorte:
+    """
+    Agregados precalculados de la cohorte de un centro: sumas y recuentos por
+    categoría, score y factor, más sus tendencias. Son aditivos, así que la vista
+    de red se obtiene combinando los resúmenes de cada centro sin leer sus filas.
+    """
+
+    def __init__(self, centro, sumas, categorias, scores, factores, tendencias):
+        self.centros = [centro] if isinstance(centro, str) else list(centro)
+        self.sumas = sumas              # n, suma_score, suma_prob, n_alto, n_outcome, n_muertes
+        self.categorias = categorias    # Recuento por categoría de riesgo (4)
+        self.scores = scores            # Recuento por score (0..SCORE_MAX)
+        self.factores = factores        # Serie factor -> nº de pacientes con el factor
+        self.tendencias = tendencias
+
+    @classmethod
+    def desde_cohorte(cls, df, centro, factores, tendencias=None):
+        codigos = pd.Categorical(df['Categoria_Riesgo'], categories=CATEGORIAS_RIESGO).codes
+        outcome = pd.to_numeric(df['Outcome_30dias'], errors='coerce').to_numpy(dtype='float64')
+        sumas = pd.Series({
+            'n': len(df),
+            'suma_score': df['Score_CriSTAL'].astype('float64').sum(),
+            'suma_prob': df['Prob_Mortalidad'].astype('float64').sum(),
+            'n_alto': (codigos >= CODIGO_ALTO).sum(),
+            'n_outcome': (~np.isnan(outcome)).sum(),
+            'n_muertes': np.nansum(outcome),
+        }, dtype='float64')
+        return cls(
+            centro, sumas,
+            np.bincount(codigos[codigos >= 0], minlength=len(CATEGORIAS_RIESGO)),
+            np.bincount(np.clip(df['Score_CriSTAL'].to_numpy(), 0, SCORE_MAX), minlength=SCORE_MAX + 1),
+            df[factores].sum().astype('int64'),
+            tendencias if tendencias is not None else TendenciasCohorte.desde_cohorte(df),
+        )
+
+    @classmethod
+    def combinar(cls, resumenes):
+        """Resumen de red: suma de los resúmenes de cada centro."""
+        return cls(
+            [c for r in resumenes for c in r.centros],
+            sum(r.sumas for r in resumenes),
+            sum(r.categorias for r in resumenes),
+            sum(r.scores for r in resumenes),
+            sum(r.factores for r in resumenes),
+            TendenciasCohorte.combinar([r.tendencias for r in resumenes]),
+        )
+
+    # --- TABLAS (MISMO FORMATO QUE LOS AGREGADOS DE graficos.py) ---
+
+    def conteo_categorias(self):
+        total = max(self.categorias.sum(), 1)
+        return pd.DataFrame({
+            'Categoria_Riesgo': CATEGORIAS_RIESGO,
+            'Cuenta': self.categorias,
+            'Porcentaje': self.categorias / total * 100,
+        })
+
+    def histograma_score(self):
+        return pd.DataFrame({'Score': range(SCORE_MAX + 1), 'Cuenta': self.scores})
+
+    def conteo_factores(self, nombres):
+        return pd.DataFrame({
+            'Factor': list(nombres.values()),
+            'Cuenta': [int(self.factores.get(f, 0)) for f in nombres],
+        })
+
+    def indicadores(self):
+        """Métricas clave (medias y porcentajes derivados de las sumas)."""
+        s = self.sumas
+        n = s['n'] or np.nan
+        return {
+            'Pacientes': int(s['n']),
+            'Score_Medio': s['suma_score'] / n,
+            'Mortalidad_Estimada_%': s['suma_prob'] / n,
+            'Alto_Critico': int(s['n_alto']),
+            'Alto_Critico_%': s['n_alto'] / n * 100,
+            'Mortalidad_Observada_%': s['n_muertes'] / s['n_outcome'] * 100 if s['n_outcome'] else np.nan,
+        }
+
+
+# --- RESÚMENES PUBLICADOS CON CADA SNAPSHOT ---
+# El resumen se calcula al exportar, cuando las filas del centro ya están en memoria,
+# y se escribe dentro de la carpeta de la versión antes de publicarla: quien lee el
+# puntero ACTUAL encuentra siempre el resumen de esa misma versión. La vista de red
+# solo lee estos ficheros (unos cientos de números por centro), nunca las cohortes.
+
+def exportar_snapshot_centro(registros, centro, factores=FACTORES_COHORTE, formato="arrow"):
+    """Exporta el snapshot de `centro` con su ResumenCohorte al lado. Devuelve la versión."""
+    def escribir_resumen(df, carpeta):
+        resumen = ResumenCohorte.desde_cohorte(cohorte_desde_registro(df), centro, list(factores))
+        with open(os.path.join(carpeta, RESUMEN), "wb") as f:
+            pickle.dump(resumen, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return exportar_snapshot(registros, directorio_snapshots(centro), formato, complementos=escribir_resumen)
+
+
+def leer_resumen(centro, version):
+    """ResumenCohorte publicado con la versión `version` del snapshot del centro, o None si no lo tiene."""
+    try:
+        with open(os.path.join(directorio_snapshots(centro), version, RESUMEN), "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
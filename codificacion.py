@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+from gspread.utils import rowcol_to_a1
+
+from persistencia import asegurar_cabecera
+
+# --- CODIFICACIÓN ENTERA DE LOS FACTORES MULTI-ETIQUETA (V3, V4, V9) ---
+# Cada opción ocupa un bit (en el orden de las listas): "ICC, EPOC" -> 0b0001100 = 12.
+# "Ninguna" / "No Frágil" equivalen a 0.
+
+OPCIONES_FISIO = [
+    "Consciencia dism. (GCS)", "TAS < 90 mmHg", "Frec. Resp <5 o >30", "Pulso <40 o >140",
+    "O2 <90% / Supl", "Hipoglucemia/Convulsión", "Oliguria (<15ml/h)",
+]
+OPCIONES_COMORB = [
+    "Cáncer Avanzado", "IRC", "ICC", "EPOC", "ACV Reciente", "IAM Reciente", "Hepatopatía",
+]
+OPCIONES_FRAIL = [
+    "Fatiga", "Resistencia (Escaleras)", "Deambulación", "Enfermedades >5", "Pérdida Peso >5%",
+]
+
+# Etiquetas antiguas (formulario de app.py) que se escribieron con otro texto
+ALIAS = {"Consciencia (GCS desc >2)": "Consciencia dism. (GCS)"}
+
+# Columna de detalle -> (columna codificada, opciones)
+COLUMNAS_CODIFICADAS = {
+    "V3_Fisiologico_Detalle": ("V3_Fisiologico_Codigo", OPCIONES_FISIO),
+    "V4_Comorbilidad_Detalle": ("V4_Comorbilidad_Codigo", OPCIONES_COMORB),
+    "V9_Fragilidad_Detalle": ("V9_Fragilidad_Codigo", OPCIONES_FRAIL),
+}
+
+
+def codificar(etiquetas, opciones):
+    """Lista de etiquetas activas -> máscara de bits (para el formulario)."""
+    return sum(1 << opciones.index(ALIAS.get(e, e)) for e in etiquetas)
+
+
+def etiquetas(codigo, opciones):
+    """Máscara de bits -> lista de etiquetas activas."""
+    return [o for i, o in enumerate(opciones) if codigo >> i & 1]
+
+
+def _dummies(serie):
+    """Una columna 0/1 por etiqueta presente en la serie (aplicando ALIAS)."""
+    textos = serie.fillna("").astype(str)
+    for antigua, nueva in ALIAS.items():
+        textos = textos.str.replace(antigua, nueva, regex=False)
+    return textos.str.get_dummies(sep=", ").drop(columns="", errors="ignore")  # Celdas vacías
+
+
+def decodificar_serie(serie, opciones):
+    """
+    Versión vectorizada: convierte una columna de texto ("ICC, EPOC", "Ninguna"...)
+    en un array de máscaras (int8). Devuelve (codigos, etiquetas_desconocidas).
+    """
+    dummies = _dummies(serie)
+    conocidas = [c for c in dummies.columns if c in opciones]
+    pesos = np.array([1 << opciones.index(c) for c in conocidas], dtype=np.int64)
+    codigos = dummies[conocidas].to_numpy(dtype=np.int64) @ pesos if conocidas else np.zeros(len(serie), np.int64)
+
+    desconocidas = set(dummies.columns) - set(conocidas) - {"Ninguna", "No Frágil"}
+    return codigos.astype(np.int8), desconocidas
+
+
+def filas_desconocidas(serie, opciones):
+    """Máscara booleana vectorizada de las filas con alguna etiqueta que no está en `opciones`."""
+    dummies = _dummies(serie)
+    extra = [c for c in dummies.columns if c not in opciones and c not in ("Ninguna", "No Frágil")]
+    if not extra:
+        return np.zeros(len(serie), dtype=bool)
+    return dummies[extra].to_numpy().any(axis=1)
+
+
+def bit(codigos, opciones, etiqueta):
+    """Máscara booleana vectorizada: ¿tiene activo `etiqueta`?"""
+    return (np.asarray(codigos) >> opciones.index(etiqueta) & 1).astype(bool)
+
+# --- MIGRACIÓN: RELLENO DE LAS COLUMNAS CODIFICADAS EN LA HOJA EXISTENTE ---
+
+def migrar_codigos(ws, tam_bloque=1000, progreso=None):
+    """
+    Recorre la hoja por bloques de `tam_bloque` filas, decodifica V3/V4/V9 y
+    escribe las columnas codificadas con un único batch_update por bloque.
+    Nunca carga la hoja entera en memoria. Devuelve (filas, etiquetas_desconocidas).
+
+    batch_get omite las filas vacías del final de cada rango, así que un bloque corto
+    no indica el final de la hoja: se lee también la columna ID y solo se termina con
+    un bloque sin ningún dato.
+    """
+    cabecera = asegurar_cabecera(ws, [dest for dest, _ in COLUMNAS_CODIFICADAS.values()])
+    origen = {col: cabecera.index(col) + 1 for col in COLUMNAS_CODIFICADAS}
+    destino = {col: cabecera.index(dest) + 1 for col, (dest, _) in COLUMNAS_CODIFICADAS.items()}
+    leidas = list(origen.values()) + ([cabecera.index("ID") + 1] if "ID" in cabecera else [])
+
+    fila_ini, total, desconocidas = 2, 0, set()
+    while True:
+        fila_fin = fila_ini + tam_bloque - 1
+        rangos = [f"{rowcol_to_a1(fila_ini, c)}:{rowcol_to_a1(fila_fin, c)}" for c in leidas]
+        bloques = ws.batch_get(rangos)
+        n = max(len(b) for b in bloques)
+        if n == 0:
+            break
+
+        actualizaciones = []
+        for (col, (_, opciones)), valores in zip(COLUMNAS_CODIFICADAS.items(), bloques):
+            textos = pd.Series([v[0] if v else "" for v in valores] + [""] * (n - len(valores)))
+            codigos, extra = decodificar_serie(textos, opciones)
+            desconocidas |= extra
+            c = destino[col]
+            actualizaciones.append({
+                "range": f"{rowcol_to_a1(fila_ini, c)}:{rowcol_to_a1(fila_ini + n - 1, c)}",
+                "values": [[int(x)] for x in codigos],
+            })
+        ws.batch_update(actualizaciones)
+
+        total += n
+        if progreso is not None:
+            progreso(total)
+        fila_ini += tam_bloque
+
+    return total, desconocidas
+
+
+if __name__ == "__main__":
+    # Migración única:  [CRISTAL_CENTRO=...] python codificacion.py
+    import streamlit as st
+    from fragmentos import abrir_registro, hojas_registro
+    from centros import centros_cli
+
+    filas, desconocidas = 0, set()
+    hojas = [ws for config in centros_cli(st.secrets["gcp"]).values() for ws in hojas_registro(abrir_registro(config))]
+    for ws in hojas:
+        n, extra = migrar_codigos(ws, progreso=lambda n: print(f"{ws.title}: {n} filas migradas"))
+        filas += n
+        desconocidas |= extra
+    print(f"Migración completada: {filas} filas.")
+    if desconocidas:
+        print(f"Etiquetas no reconocidas (codificadas como 0): {sorted(desconocidas)}")
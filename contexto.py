@@ -0,0 +1,130 @@
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from codificacion import OPCIONES_FISIO, OPCIONES_COMORB, OPCIONES_FRAIL, codificar, etiquetas
+from informes import resumen_riesgo
+from modelos import MODELOS, probabilidades
+from optimizador import activos_desde_contexto
+from prehabilitacion import mascara_desde_contexto
+
+# --- CONTEXTO DEL PACIENTE COMPARTIDO ENTRE PÁGINAS ---
+# La Calculadora guarda en la sesión un único objeto inmutable y compacto: todos los
+# factores empaquetados en un entero y los valores derivados (probabilidad, color,
+# plan...) calculados una sola vez. Decisión Compartida y Prehabilitación lo leen
+# tal cual, sin volver a derivar nada al cambiar de página.
+#
+# Distribución de bits:
+#   0-6    V3 alteraciones fisiológicas (OPCIONES_FISIO)
+#   7-13   V4 comorbilidades (OPCIONES_COMORB)
+#   14-18  V9 ítems FRAIL (OPCIONES_FRAIL)
+#   19-24  Edad > 65, Residencia, Deterioro cognitivo, Ingreso previo, Proteinuria, ECG anormal
+
+CLAVE_SESION = "contexto_paciente"
+MODELO_CONTEXTO = "CriSTAL original"
+
+DESP_FISIO, DESP_COMORB, DESP_FRAIL = 0, 7, 14
+BIT_EDAD, BIT_RESIDENCIA, BIT_COGNITIVO, BIT_INGRESO, BIT_PROTEINURIA, BIT_ECG = 19, 20, 21, 22, 23, 24
+SCORE_MAX = 20
+
+
+def _version_modelo():
+    """Versión vigente de los coeficientes del modelo (registrar_modelo puede sustituirlos)."""
+    return MODELOS[MODELO_CONTEXTO]["version"]
+
+
+@dataclass(frozen=True, slots=True)
+class ContextoPaciente:
+    """
+    Factores del paciente (`bits`) y versión de los coeficientes con que se calcularon
+    los derivados. Los campos derivados se rellenan al crearlo con los coeficientes
+    vigentes de MODELOS[MODELO_CONTEXTO] y no cambian.
+    """
+    bits: int = 0
+    version: str = field(default_factory=_version_modelo)  # La de ese momento, no la del arranque
+    puntos: int = field(init=False)        # Suma bruta, antes del tope de 20
+    score: int = field(init=False)
+    prob: float = field(init=False)        # Mortalidad estimada a 30 días (%)
+    color: str = field(init=False)
+    n_muerte: int = field(init=False)      # De cada 100 personas
+    mascara_plan: int = field(init=False)  # Máscara de 12 bits de prehabilitacion.py
+    activos: int = field(init=False)       # Intervenciones aplicables (optimizador.py)
+
+    def __post_init__(self):
+        puntos = (
+            self.edad_65 + self.residencia + self.p_fisiologico + self.comorb.bit_count()
+            + self.cognitivo + self.ingreso + self.proteinuria + self.ecg + self.frail.bit_count()
+        )
+        score = min(puntos, SCORE_MAX)
+        prob, color, n_muerte = resumen_riesgo(score, probabilidades(score, [MODELO_CONTEXTO])[MODELO_CONTEXTO])
+        for nombre, valor in (("puntos", puntos), ("score", score), ("prob", prob), ("color", color),
+                              ("n_muerte", n_muerte), ("mascara_plan", mascara_desde_contexto(self)),
+                              ("activos", activos_desde_contexto(self))):
+            object.__setattr__(self, nombre, valor)
+
+    @classmethod
+    def desde_formulario(cls, edad, residencia, fisio, comorb, frail,
+                         cognitivo=False, ingreso=False, proteinuria=False, ecg=False):
+        """
+        Empaqueta las respuestas de la Calculadora (listas de etiquetas activas en V3/V4/V9).
+        Devuelve la instancia compartida para esa combinación de factores y versión del modelo.
+        """
+        bits = (
+            codificar(fisio, OPCIONES_FISIO) << DESP_FISIO
+            | codificar(comorb, OPCIONES_COMORB) << DESP_COMORB
+            | codificar(frail, OPCIONES_FRAIL) << DESP_FRAIL
+        )
+        for bit, activo in ((BIT_EDAD, edad > 65), (BIT_RESIDENCIA, residencia), (BIT_COGNITIVO, cognitivo),
+                            (BIT_INGRESO, ingreso), (BIT_PROTEINURIA, proteinuria), (BIT_ECG, ecg)):
+            bits |= bool(activo) << bit
+        return _compartido(cls, bits, _version_modelo())
+
+    def vigente(self):
+        """False si los coeficientes del modelo han cambiado desde que se creó."""
+        return self.version == _version_modelo()
+
+    def actualizado(self):
+        """El mismo paciente con los derivados de los coeficientes vigentes (él mismo si ya lo está)."""
+        return self if self.vigente() else _compartido(type(self), self.bits, _version_modelo())
+
+    # --- ACCESO A LOS FACTORES ---
+
+    def _bit(self, bit):
+        return bool(self.bits >> bit & 1)
+
+    edad_65 = property(lambda self: self._bit(BIT_EDAD))
+    residencia = property(lambda self: self._bit(BIT_RESIDENCIA))
+    cognitivo = property(lambda self: self._bit(BIT_COGNITIVO))
+    ingreso = property(lambda self: self._bit(BIT_INGRESO))
+    proteinuria = property(lambda self: self._bit(BIT_PROTEINURIA))
+    ecg = property(lambda self: self._bit(BIT_ECG))
+
+    @property
+    def fisio(self):
+        return self.bits >> DESP_FISIO & 0x7F
+
+    @property
+    def comorb(self):
+        return self.bits >> DESP_COMORB & 0x7F
+
+    @property
+    def frail(self):
+        return self.bits >> DESP_FRAIL & 0x1F
+
+    @property
+    def p_fisiologico(self):
+        return int(self.fisio.bit_count() >= 2)
+
+    def etiquetas_comorb(self):
+        return etiquetas(self.comorb, OPCIONES_COMORB)
+
+    def etiquetas_frail(self):
+        return etiquetas(self.frail, OPCIONES_FRAIL)
+
+
+@lru_cache(maxsize=4096)
+def _compartido(cls, bits, version):
+    """
+    Una instancia por combinación de factores, versión del modelo y proceso: las sesiones
+    con el mismo perfil la comparten y, tras recalibrar, se crean instancias nuevas.
+    """
+    return cls(bits, version)
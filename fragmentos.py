@@ -0,0 +1,334 @@
+import threading
+import time
+from collections import defaultdict
+
+import gspread
+import pandas as pd
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
+
+from persistencia import HojaAlineada, abrir_worksheet
+from utils import COLUMNAS_REGISTRO
+
+# --- FRAGMENTACIÓN DEL REGISTRO EN HOJAS POR PERIODO ---
+# En lugar de una única hoja que crece sin límite, cada periodo (año o trimestre)
+# se guarda en su propia hoja "<base>_<periodo>". La hoja "<base>_manifiesto"
+# indica qué hoja contiene cada rango de fechas, de modo que las lecturas solo
+# abren los fragmentos que solapan el rango pedido y las escrituras van siempre
+# al fragmento del periodo en curso, que se mantiene pequeño.
+#
+# Varios procesos pueden escribir a la vez: el nombre de hoja es único en el
+# documento, así que add_worksheet actúa como cerrojo entre procesos (solo el que
+# crea el fragmento lo anota en el manifiesto; el resto reabre la hoja existente).
+# Las cabeceras se escriben en A1 (idempotente) y el recuento de filas del
+# manifiesto se toma del rango que devuelve la API al anexar, no de un contador local.
+
+GRANULARIDADES = {"Y": "Anual", "Q": "Trimestral"}
+RELECTURA_MANIFIESTO = 60  # Segundos mínimos entre relecturas del manifiesto
+COLUMNAS_MANIFIESTO = ["Periodo", "Hoja", "Desde", "Hasta", "Filas"]
+
+
+def periodo_de(fecha, granularidad="Y"):
+    """Periodo de una fecha: "2025" (anual) o "2025Q1" (trimestral)."""
+    return str(pd.Period(pd.Timestamp(fecha), freq=granularidad))
+
+
+def ultima_fila_anexada(respuesta):
+    """Última fila escrita por append_row(s), según la respuesta de la API ("'Hoja'!A5:E9" -> 9)."""
+    rango = respuesta["updates"]["updatedRange"].rsplit("!", 1)[-1]
+    return a1_to_rowcol(rango.split(":")[-1])[0]
+
+
+class _Contada:
+    """
+    Envoltorio de un Spreadsheet/Worksheet de gspread que cuenta cada llamada a sus
+    métodos (todas son peticiones a la API) en `registro.peticiones`. Las hojas que
+    abre también quedan envueltas.
+    """
+
+    def __init__(self, objeto, registro):
+        self._objeto = objeto
+        self._registro = registro
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._objeto, nombre)
+        if not callable(atributo):
+            return atributo
+
+        def llamada(*args, **kwargs):
+            self._registro.peticiones += 1
+            resultado = atributo(*args, **kwargs)
+            return _Contada(resultado, self._registro) if nombre in ("worksheet", "add_worksheet") else resultado
+        return llamada
+
+
+def nombre_en_uso(error):
+    """Si un APIError de add_worksheet se debe a que ya existe una hoja con ese nombre."""
+    return error.code == 400 and "already exists" in str(error.error.get("message", ""))
+
+
+def _crear_o_abrir(sh, nombre, columnas, filas=1000):
+    """
+    Crea la hoja `nombre` con su cabecera o, si otro proceso se adelantó, abre la
+    existente. Devuelve (hoja, creada); la hoja es una HojaAlineada a `columnas`.
+    """
+    try:
+        ws = sh.add_worksheet(title=nombre, rows=filas, cols=len(columnas))
+        creada = True
+    except gspread.exceptions.APIError as e:
+        if not nombre_en_uso(e):
+            raise  # Cuota (429), error del servidor (5xx)...: no es que otro proceso la creara
+        ws = sh.worksheet(nombre)  # Nombre ya en uso: la creó otro proceso
+        creada = False
+    # La cabecera va en A1 si la hoja está vacía: no se duplica aunque escriban los dos
+    return HojaAlineada(ws, columnas), creada
+
+
+class HojaFragmentada:
+    """
+    Registro repartido en una hoja por periodo, con la misma interfaz de
+    escritura y lectura que usa la app sobre una hoja única (`append_rows`,
+    `get_all_records`), así que se puede pasar tal cual a EscritorRegistro.
+    `peticiones` cuenta las llamadas a la API hechas a través del registro: un
+    append_rows puede costar varias (fragmentos, cabeceras, manifiesto).
+    """
+
+    def __init__(self, ws_base, granularidad="Y"):
+        if granularidad not in GRANULARIDADES:
+            raise ValueError(f"Granularidad no soportada: {granularidad} (use {list(GRANULARIDADES)})")
+        self.peticiones = 0
+        self.sh = _Contada(ws_base.spreadsheet, self)
+        self.base = ws_base.title
+        self.granularidad = granularidad
+        self._hojas = {}        # periodo -> Worksheet ya abierta
+        self._entradas = {}     # periodo -> fila del manifiesto (dict) + su nº de fila en la hoja ("_fila")
+        self._cerrojo = threading.RLock()  # Creación de fragmentos y escrituras de este proceso
+        self._manifiesto = self._abrir_manifiesto()
+        self._leer_manifiesto()
+
+    # --- MANIFIESTO ---
+
+    def _abrir_manifiesto(self):
+        nombre = f"{self.base}_manifiesto"
+        try:
+            return self.sh.worksheet(nombre)
+        except gspread.WorksheetNotFound:
+            return _crear_o_abrir(self.sh, nombre, COLUMNAS_MANIFIESTO, filas=100)[0]
+
+    def _leer_manifiesto(self):
+        """Relee el manifiesto; el nº de fila de cada periodo sale de la propia hoja (si se repite, vale la primera)."""
+        self._leido = time.monotonic()
+        entradas = {}
+        for i, r in enumerate(self._manifiesto.get_all_records(), start=2):
+            periodo = str(r["Periodo"])
+            if periodo and periodo not in entradas:
+                entradas[periodo] = {**r, "Filas": int(r["Filas"] or 0), "_fila": i}
+        # Fragmentos creados por otro proceso que todavía no ha terminado de anotarlos
+        for periodo, entrada in self._entradas.items():
+            entradas.setdefault(periodo, {**entrada, "_fila": None})
+        self._entradas = entradas
+
+    def manifiesto(self):
+        """Tabla del manifiesto (periodo, hoja, rango de fechas y nº de filas)."""
+        return pd.DataFrame(
+            [{c: e[c] for c in COLUMNAS_MANIFIESTO} for e in self._entradas.values()],
+            columns=COLUMNAS_MANIFIESTO,
+        ).sort_values("Desde", ignore_index=True)
+
+    # --- FRAGMENTOS ---
+
+    def hoja(self, periodo):
+        """Hoja del periodo; si no existe se crea con la cabecera y se anota en el manifiesto."""
+        with self._cerrojo:  # Dos sesiones que llegan a la vez a un periodo nuevo
+            if periodo in self._hojas:
+                return self._hojas[periodo]
+
+            if periodo not in self._entradas:
+                self._leer_manifiesto()  # Otro proceso pudo crearlo ya
+            entrada = self._entradas.get(periodo)
+            if entrada is not None:
+                # Fragmentos creados antes de añadir columnas: se completan y se escribe según su cabecera
+                ws = HojaAlineada(self.sh.worksheet(entrada["Hoja"]), COLUMNAS_REGISTRO)
+            else:
+                ws = self._crear_fragmento(periodo)
+
+            self._hojas[periodo] = ws
+            return ws
+
+    def _crear_fragmento(self, periodo):
+        p = pd.Period(periodo, freq=self.granularidad)
+        nombre = f"{self.base}_{periodo}"
+        ws, creada = _crear_o_abrir(self.sh, nombre, COLUMNAS_REGISTRO)
+        entrada = {
+            "Periodo": periodo, "Hoja": nombre,
+            "Desde": p.start_time.strftime("%Y-%m-%d"), "Hasta": p.end_time.strftime("%Y-%m-%d"),
+            "Filas": 0, "_fila": None,
+        }
+        if creada:
+            # Solo quien crea la hoja la anota: el manifiesto no tiene filas repetidas
+            respuesta = self._manifiesto.append_row([entrada[c] for c in COLUMNAS_MANIFIESTO])
+            entrada["_fila"] = ultima_fila_anexada(respuesta)
+        self._entradas[periodo] = entrada
+        return ws
+
+    def _fila_manifiesto(self, periodo):
+        """Fila del periodo en el manifiesto (buscada en la hoja si aún no se conoce), o None."""
+        if self._entradas[periodo]["_fila"] is None:
+            self._leer_manifiesto()
+        return self._entradas[periodo]["_fila"]
+
+    def hoja_activa(self):
+        """Fragmento del periodo en curso (destino de los registros nuevos)."""
+        return self.hoja(periodo_de(pd.Timestamp.now(), self.granularidad))
+
+    def periodos_para(self, desde=None, hasta=None):
+        """Periodos del manifiesto cuyo rango de fechas solapa [desde, hasta]."""
+        if (periodo_de(pd.Timestamp.now(), self.granularidad) not in self._entradas
+                and time.monotonic() - self._leido > RELECTURA_MANIFIESTO):
+            self._leer_manifiesto()  # Otro proceso pudo abrir el fragmento del periodo en curso
+
+        desde = None if desde is None else pd.Timestamp(desde).strftime("%Y-%m-%d")
+        hasta = None if hasta is None else pd.Timestamp(hasta).strftime("%Y-%m-%d")
+        return sorted(
+            periodo for periodo, e in self._entradas.items()
+            if (desde is None or str(e["Hasta"]) >= desde) and (hasta is None or str(e["Desde"]) <= hasta)
+        )
+
+    def hojas_para(self, desde=None, hasta=None):
+        """Hojas de los fragmentos que solapan [desde, hasta], en orden cronológico."""
+        return [self.hoja(p) for p in self.periodos_para(desde, hasta)]
+
+    # --- INTERFAZ DE HOJA ÚNICA ---
+
+    def repartir(self, filas):
+        """Filas agrupadas por periodo (según su primera columna, Fecha): {periodo: filas}."""
+        grupos = defaultdict(list)
+        for fila in filas:
+            grupos[periodo_de(fila[0], self.granularidad)].append(fila)
+        return dict(grupos)
+
+    def append_rows(self, filas, value_input_option='USER_ENTERED'):
+        """
+        Reparte las filas por periodo (según su primera columna, Fecha) y las
+        anexa a cada fragmento con un append_rows por fragmento. El recuento de
+        filas del manifiesto (la última fila que devuelve la API, menos la
+        cabecera, así cuenta también lo escrito por otros procesos) se actualiza
+        con un único batch_update.
+        """
+        grupos = self.repartir(filas)
+        with self._cerrojo:
+            cambios = []
+            for periodo, grupo in grupos.items():
+                respuesta = self.hoja(periodo).append_rows(grupo, value_input_option=value_input_option)
+                entrada = self._entradas[periodo]
+                entrada["Filas"] = max(entrada["Filas"], ultima_fila_anexada(respuesta) - 1)
+                fila_manifiesto = self._fila_manifiesto(periodo)
+                if fila_manifiesto is None:
+                    continue  # Lo anotará quien creó el fragmento; el siguiente lote corrige el recuento
+                cambios.append({
+                    "range": rowcol_to_a1(fila_manifiesto, COLUMNAS_MANIFIESTO.index("Filas") + 1),
+                    "values": [[entrada["Filas"]]],
+                })
+            if cambios:
+                try:
+                    self._manifiesto.batch_update(cambios)
+                except gspread.exceptions.APIError:
+                    # Las filas ya están escritas: propagar el error haría que se reintentaran
+                    # (duplicadas). El recuento se corrige con el siguiente append_rows.
+                    pass
+
+    def leer(self, desde=None, hasta=None):
+        """Registros (lista de dicts) con Fecha en [desde, hasta], abriendo solo los fragmentos necesarios."""
+        registros = []
+        for ws in self.hojas_para(desde, hasta):
+            registros.extend(ws.get_all_records())
+        if desde is None and hasta is None:
+            return registros
+
+        # Los fragmentos de los extremos pueden contener fechas fuera del rango
+        fechas = pd.to_datetime([r.get("Fecha") for r in registros], errors='coerce')
+        dentro = pd.Series(True, index=range(len(registros)))
+        if desde is not None:
+            dentro &= fechas >= pd.Timestamp(desde)
+        if hasta is not None:
+            dentro &= fechas <= pd.Timestamp(hasta) + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+        return [r for r, ok in zip(registros, dentro) if ok]
+
+    def get_all_records(self):
+        return self.leer()
+
+    # --- ARCHIVADO ---
+
+    def archivar(self, ws_origen, tam_lote=5000, progreso=None):
+        """
+        Reparte las filas de una hoja única existente entre los fragmentos.
+        No borra la hoja de origen. Devuelve (nº de filas archivadas, filas
+        descartadas): las que no tienen una Fecha válida no pertenecen a ningún
+        periodo y se devuelven como (nº de fila en la hoja de origen, Fecha) para revisarlas.
+        """
+        valores = ws_origen.get_all_values()
+        if len(valores) < 2:
+            return 0, []
+
+        cabecera = valores[0]
+        # Alinea las columnas con COLUMNAS_REGISTRO (hojas antiguas sin las columnas nuevas)
+        posiciones = [cabecera.index(c) if c in cabecera else None for c in COLUMNAS_REGISTRO]
+        filas = [[fila[p] if p is not None and p < len(fila) else "" for p in posiciones]
+                 for fila in valores[1:]]
+        validas = pd.notna(pd.to_datetime([f[0] for f in filas], errors='coerce', format='mixed'))
+        descartadas = [(i, f[0]) for i, (f, ok) in enumerate(zip(filas, validas), start=2) if not ok]
+        filas = [f for f, ok in zip(filas, validas) if ok]
+
+        for inicio in range(0, len(filas), tam_lote):
+            self.append_rows(filas[inicio:inicio + tam_lote])
+            if progreso is not None:
+                progreso(min(inicio + tam_lote, len(filas)))
+        return len(filas), descartadas
+
+
+# --- APERTURA SEGÚN CONFIGURACIÓN ---
+
+def abrir_registro(gcp):
+    """
+    Hoja única o registro fragmentado según los secrets: si [gcp] incluye
+    `fragmentacion = "Y"` (anual) o `"Q"` (trimestral) se usa HojaFragmentada.
+    """
+    ws = abrir_worksheet(gcp)
+    granularidad = gcp.get("fragmentacion")
+    if granularidad:
+        return HojaFragmentada(ws, granularidad)
+    # Quien escribe lo hace en el orden de COLUMNAS_REGISTRO; la hoja lo traduce al de su cabecera
+    return HojaAlineada(ws, COLUMNAS_REGISTRO)
+
+
+def modificacion_registro(registro):
+    """Fecha de última modificación del documento en Drive (sello de versión), o None."""
+    sh = registro.sh if isinstance(registro, HojaFragmentada) else registro.spreadsheet
+    try:
+        return sh.get_lastUpdateTime()
+    except Exception:
+        return None
+
+
+def hojas_registro(registro, desde=None, hasta=None):
+    """Hojas físicas que contienen [desde, hasta], tanto para hoja única como fragmentada."""
+    if isinstance(registro, HojaFragmentada):
+        return registro.hojas_para(desde, hasta)
+    return [registro]
+
+
+if __name__ == "__main__":
+    # Archivado único de la hoja actual en fragmentos:  [CRISTAL_CENTRO=...] python fragmentos.py [Y|Q]
+    import sys
+    import streamlit as st
+    from centros import centros_cli
+
+    for gcp in centros_cli(st.secrets["gcp"]).values():
+        ws = abrir_worksheet(gcp)
+        fragmentado = HojaFragmentada(ws, sys.argv[1] if len(sys.argv) > 1 else gcp.get("fragmentacion", "Y"))
+        n, descartadas = fragmentado.archivar(ws, progreso=lambda n: print(f"{n} filas archivadas"))
+        print(f"{gcp['nombre']}: archivado completado, {n} filas.")
+        for fila, fecha in descartadas:
+            print(f"  Fila {fila} no archivada: Fecha no válida ({fecha!r})")
+        print(fragmentado.manifiesto().to_string(index=False))
+        print(f"Revise los fragmentos y vacíe la hoja '{ws.title}' (salvo la cabecera) "
+              f"antes de activar `fragmentacion` en los secrets.")
@@ -0,0 +1,162 @@
+import altair as alt
+import pandas as pd
+
+from utils import CATEGORIAS_RIESGO, COLORES_RIESGO
+from indices import SCORE_MAX
+
+# --- CAPA DE GRÁFICOS CON AGREGACIÓN EN SERVIDOR ---
+# Los gráficos solo reciben tablas ya agregadas: el JSON de Vega-Lite que llega
+# al navegador tiene un tamaño acotado, sea cual sea el tamaño de la cohorte.
+# Si aun así una tabla supera MAX_FILAS_GRAFICO (p. ej. una serie semanal de
+# muchos años), se reduce en vez de fallar y el gráfico lo indica en el subtítulo.
+
+MAX_FILAS_GRAFICO = 500
+
+SELECCION_CATEGORIA = "categoria"
+
+
+def _acotado(datos):
+    """
+    Limita las filas embebidas en el gráfico: por encima de MAX_FILAS_GRAFICO se
+    conserva una de cada `paso` filas (anotado en datos.attrs['paso']).
+    """
+    if len(datos) <= MAX_FILAS_GRAFICO:
+        return datos
+    paso = -(-len(datos) // MAX_FILAS_GRAFICO)
+    reducidos = datos.iloc[::paso].copy()
+    reducidos.attrs['paso'] = paso
+    return reducidos
+
+
+def nota_reduccion(datos):
+    """Texto que explica cómo se ha reducido la tabla para graficarla, o None."""
+    notas = []
+    if datos.attrs.get('periodos_por_punto', 1) > 1:
+        notas.append(f"Cada punto agrupa {datos.attrs['periodos_por_punto']} periodos consecutivos.")
+    if datos.attrs.get('paso', 1) > 1:
+        notas.append(f"Se muestra 1 de cada {datos.attrs['paso']} filas (máx. {MAX_FILAS_GRAFICO}).")
+    return " ".join(notas) or None
+
+
+def _titulo(texto, datos):
+    nota = nota_reduccion(datos)
+    return alt.TitleParams(texto, subtitle=nota) if nota else texto
+
+# --- AGREGADOS (A PARTIR DE LOS ÍNDICES DE BITS) ---
+
+def conteo_categorias(indice, consulta):
+    """Nº de pacientes por categoría de riesgo dentro de la consulta (4 filas)."""
+    cuentas = [(consulta & indice.categoria(c)).contar() for c in range(len(CATEGORIAS_RIESGO))]
+    total = max(sum(cuentas), 1)
+    return pd.DataFrame({
+        'Categoria_Riesgo': CATEGORIAS_RIESGO,
+        'Cuenta': cuentas,
+        'Porcentaje': [c / total * 100 for c in cuentas],
+    })
+
+
+def conteo_factores(indice, consulta, nombres):
+    """Nº de pacientes con cada factor activo dentro de la consulta (1 fila por factor)."""
+    return pd.DataFrame({
+        'Factor': list(nombres.values()),
+        'Cuenta': [(consulta & indice.factor(f)).contar() for f in nombres],
+    })
+
+
+def histograma_score(indice, consulta):
+    """Distribución del Score (0-20) a partir de los bitmaps por rangos score >= s."""
+    acumulado = [consulta.contar()] + [(consulta & indice.score_min(s)).contar() for s in range(1, SCORE_MAX + 2)]
+    return pd.DataFrame({
+        'Score': range(SCORE_MAX + 1),
+        'Cuenta': [acumulado[s] - acumulado[s + 1] for s in range(SCORE_MAX + 1)],
+    })
+
+# --- GRÁFICOS ---
+
+def grafico_categorias(df_dist):
+    """Barras por categoría de riesgo, con selección de barra para el drill-down."""
+    seleccion = alt.selection_point(name=SELECCION_CATEGORIA, fields=['Categoria_Riesgo'])
+    df_dist = _acotado(df_dist)
+    return alt.Chart(df_dist).mark_bar().encode(
+        x=alt.X('Categoria_Riesgo', title='Categoría de Riesgo', sort=CATEGORIAS_RIESGO),
+        y=alt.Y('Cuenta', title='Nº de Pacientes'),
+        tooltip=['Categoria_Riesgo', 'Cuenta', alt.Tooltip('Porcentaje', format='.1f')],
+        color=alt.Color('Categoria_Riesgo',
+                        scale=alt.Scale(domain=CATEGORIAS_RIESGO, range=COLORES_RIESGO),
+                        legend=None
+                       ),
+        opacity=alt.condition(seleccion, alt.value(1), alt.value(0.4))
+    ).add_params(
+        seleccion
+    ).properties(
+        title=_titulo('Pacientes por Nivel de Riesgo (clic para desglosar)', df_dist)
+    )
+
+
+def grafico_factores(conteo, titulo='Factores de Riesgo más Prevalentes'):
+    """Barras horizontales con la frecuencia de cada factor."""
+    conteo = _acotado(conteo)
+    return alt.Chart(conteo).mark_bar().encode(
+        x=alt.X('Cuenta', title='Recuento de Pacientes con Factor Activo'),
+        y=alt.Y('Factor', sort='-x', title='Factor de Riesgo'),
+        color=alt.value('#3498db'),
+        tooltip=['Factor', 'Cuenta']
+    ).properties(
+        title=_titulo(titulo, conteo)
+    )
+
+
+def grafico_histograma(hist):
+    """Histograma del Score CriSTAL (21 barras)."""
+    hist = _acotado(hist)
+    return alt.Chart(hist).mark_bar().encode(
+        x=alt.X('Score:O', title='Score CriSTAL'),
+        y=alt.Y('Cuenta', title='Nº de Pacientes'),
+        tooltip=['Score', 'Cuenta']
+    ).properties(
+        title=_titulo('Distribución del Score', hist)
+    )
+
+
+def grafico_tendencias(serie, metricas):
+    """Líneas temporales de varias métricas (una fila por periodo)."""
+    serie = _acotado(serie)
+    return alt.Chart(serie).transform_fold(
+        metricas, as_=['Métrica', 'Valor']
+    ).mark_line(point=True).encode(
+        x=alt.X('Periodo:T', title='Periodo'),
+        y=alt.Y('Valor:Q', title='Valor'),
+        color=alt.Color('Métrica:N', title='Métrica'),
+        tooltip=['Periodo:T', 'Métrica:N', alt.Tooltip('Valor:Q', format='.1f'), 'Pacientes:Q']
+    ).properties(
+        title=_titulo('Tendencias de Riesgo y Desenlace', serie)
+    ).interactive()
+
+
+def grafico_calibracion(tabla, modelos):
+    """Mortalidad observada (puntos) frente a la estimada por cada modelo (líneas), por score."""
+    tabla = _acotado(tabla)
+    base = alt.Chart(tabla)
+    estimada = base.transform_fold(
+        modelos, as_=['Modelo', 'Estimada']
+    ).mark_line().encode(
+        x=alt.X('Score:Q', title='Score CriSTAL', scale=alt.Scale(domain=[0, SCORE_MAX])),
+        y=alt.Y('Estimada:Q', title='Mortalidad a 30 días (%)'),
+        color=alt.Color('Modelo:N', title='Modelo'),
+        tooltip=['Score:Q', 'Modelo:N', alt.Tooltip('Estimada:Q', format='.1f')]
+    )
+    observada = base.mark_circle(color='black').encode(
+        x='Score:Q',
+        y='Observada:Q',
+        size=alt.Size('Pacientes:Q', title='Pacientes'),
+        tooltip=['Score:Q', alt.Tooltip('Observada:Q', format='.1f'), 'Pacientes:Q']
+    )
+    return (estimada + observada).properties(title=_titulo('Calibración: Observada vs. Estimada', tabla))
+
+
+def categoria_seleccionada(evento):
+    """Extrae la categoría clicada del evento devuelto por st.altair_chart(on_select='rerun')."""
+    if not evento:
+        return None
+    puntos = evento.get("selection", {}).get(SELECCION_CATEGORIA) or []
+    return puntos[0].get('Categoria_Riesgo') if puntos else None
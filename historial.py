@@ -0,0 +1,151 @@
+import threading
+from bisect import bisect_left, bisect_right
+
+import pandas as pd
+
+from utils import COLUMNAS_REGISTRO, cargar_registro_tipado
+
+# --- HISTORIAL LONGITUDINAL DE VALORACIONES ---
+# Registro de solo anexado con dos índices en memoria:
+#   - hash por ID de paciente -> posiciones de sus valoraciones (búsqueda O(1))
+#   - lista ordenada por Fecha (bisect) -> consultas por rango de fechas
+
+
+class HistorialPacientes:
+    """
+    Registro de valoraciones de solo anexado (nunca se modifica ni borra una fila).
+
+    `agregar()` acepta filas con las columnas de Registro_Paciente.py (p. ej. el
+    resultado de ws.get_all_records() o la fila recién guardada) y actualiza los
+    índices sin recorrer lo ya cargado. Es seguro compartirlo entre sesiones.
+    """
+
+    def __init__(self):
+        self._filas = []          # Valoraciones en orden de llegada
+        self._fecha_fila = []     # Fecha ya interpretada de cada fila (NaT si no es válida)
+        self._por_id = {}         # ID -> [posiciones en _filas]
+        self._fechas = []         # Fechas ordenadas (para bisect)
+        self._pos_fechas = []     # Posición en _filas de cada fecha de _fechas
+        self._cerrojo = threading.Lock()
+
+    @classmethod
+    def desde_registros(cls, registros):
+        historial = cls()
+        historial.agregar(registros)
+        return historial
+
+    def __len__(self):
+        return len(self._filas)
+
+    # --- MANTENIMIENTO ---
+
+    def agregar(self, registros):
+        """Anexa valoraciones (lista de dicts o DataFrame) y actualiza los índices."""
+        if isinstance(registros, pd.DataFrame):
+            registros = registros.to_dict('records')
+        if not registros:
+            return
+
+        fechas = pd.to_datetime([r.get("Fecha") for r in registros], errors='coerce')
+        with self._cerrojo:
+            for registro, fecha in zip(registros, fechas):
+                pos = len(self._filas)
+                self._filas.append(dict(registro))
+                self._fecha_fila.append(fecha)
+                self._por_id.setdefault(str(registro.get("ID", "")).strip(), []).append(pos)
+                if pd.isna(fecha):
+                    continue  # Sin fecha válida: localizable por ID, pero no por rango
+                # Lo normal es llegar en orden, así que la inserción cae al final
+                i = bisect_right(self._fechas, fecha)
+                self._fechas.insert(i, fecha)
+                self._pos_fechas.insert(i, pos)
+
+    def agregar_al_guardarse(self, futuro, registros):
+        """
+        Anexa `registros` cuando el Future de EscritorRegistro se resuelve sin error.
+        Si la escritura falla no se anexan: el historial nunca muestra valoraciones
+        que no están en el registro.
+        """
+        def confirmado(f):
+            if not f.cancelled() and f.exception() is None:
+                self.agregar(registros)
+        futuro.add_done_callback(confirmado)
+
+    # --- CONSULTAS ---
+
+    def pacientes(self):
+        """IDs con al menos una valoración."""
+        return list(self._por_id)
+
+    def num_valoraciones(self, id_paciente):
+        return len(self._por_id.get(str(id_paciente).strip(), ()))
+
+    def historial(self, id_paciente):
+        """
+        Valoraciones de un paciente en orden cronológico, con la variación de
+        score y de mortalidad estimada respecto a la visita anterior.
+        """
+        with self._cerrojo:
+            filas = [self._filas[p] for p in self._por_id.get(str(id_paciente).strip(), ())]
+        df = self._tabla(filas)
+        if len(df) == 0:
+            return df
+
+        df = df.sort_values("Fecha", kind="stable").reset_index(drop=True)
+        df["Visita"] = range(1, len(df) + 1)
+        df["Dias_Desde_Anterior"] = df["Fecha"].diff().dt.days
+        df["Delta_Score"] = df["Score_Total"].astype("int16").diff()
+        df["Delta_Prob_%"] = df["Prob_Mortalidad_Mat_%"].diff()
+        return df
+
+    def entre(self, desde=None, hasta=None):
+        """Valoraciones con Fecha en [desde, hasta] (ambos incluidos), en orden cronológico."""
+        with self._cerrojo:
+            inicio = 0 if desde is None else bisect_left(self._fechas, pd.Timestamp(desde))
+            if hasta is None:
+                fin = len(self._fechas)
+            else:
+                hasta = pd.Timestamp(hasta)
+                if hasta == hasta.normalize():
+                    hasta += pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)  # Día completo
+                fin = bisect_right(self._fechas, hasta)
+            filas = [self._filas[p] for p in self._pos_fechas[inicio:fin]]
+        return self._tabla(filas)
+
+    def evolucion(self, ids=None):
+        """
+        Resumen primera/última valoración por paciente con más de una visita
+        (p. ej. antes y después de la prehabilitación).
+        """
+        resumen = []
+        with self._cerrojo:
+            for id_paciente in (self._por_id if ids is None else ids):
+                posiciones = self._por_id.get(str(id_paciente).strip(), ())
+                if len(posiciones) < 2:
+                    continue
+                # Sin reconstruir el historial completo: solo la primera y la última visita
+                con_fecha = [p for p in posiciones if not pd.isna(self._fecha_fila[p])]
+                if len(con_fecha) < 2:
+                    continue
+                p0 = min(con_fecha, key=self._fecha_fila.__getitem__)
+                p1 = max(reversed(con_fecha), key=self._fecha_fila.__getitem__)
+                primera, ultima = self._filas[p0], self._filas[p1]
+                s0, s1 = int(primera["Score_Total"]), int(ultima["Score_Total"])
+                resumen.append({
+                    "ID": id_paciente,
+                    "Visitas": len(posiciones),
+                    "Primera": self._fecha_fila[p0],
+                    "Ultima": self._fecha_fila[p1],
+                    "Score_Inicial": s0,
+                    "Score_Final": s1,
+                    "Delta_Score": s1 - s0,
+                    "Delta_Prob_%": float(ultima["Prob_Mortalidad_Mat_%"]) - float(primera["Prob_Mortalidad_Mat_%"]),
+                })
+        return pd.DataFrame(resumen, columns=["ID", "Visitas", "Primera", "Ultima", "Score_Inicial",
+                                              "Score_Final", "Delta_Score", "Delta_Prob_%"])
+
+    @staticmethod
+    def _tabla(filas):
+        if not filas:
+            return cargar_registro_tipado([]).reindex(columns=COLUMNAS_REGISTRO)
+        return cargar_registro_tipado(filas)
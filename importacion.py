@@ -0,0 +1,317 @@
+import os
+import csv
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from gspread.exceptions import APIError
+
+from utils import COLUMNAS_REGISTRO, SERVICIOS, calcular_probabilidad_math
+from codificacion import (COLUMNAS_CODIFICADAS, OPCIONES_FISIO, OPCIONES_COMORB, OPCIONES_FRAIL,
+                          decodificar_serie, filas_desconocidas, etiquetas)
+
+# --- IMPORTACIÓN MASIVA DE VALORACIONES HISTÓRICAS (CSV / EXCEL) ---
+# Los ficheros (con las columnas del registro) se leen por bloques. Cada bloque se
+# valida con operaciones vectorizadas, se vuelve a puntuar con la misma lógica que
+# el formulario y se anexa a la hoja en lotes grandes, respetando la cuota de
+# escritura de Google Sheets. Tras cada bloque (y, con el registro fragmentado, tras
+# cada fragmento escrito) se guarda un punto de control para poder reanudar sin
+# repetir filas, y las filas rechazadas se acumulan en un informe CSV con el motivo.
+
+TAM_BLOQUE = 2000
+EDAD_MIN, EDAD_MAX = 18, 110
+INTERVALO_ESCRITURA = 1.1  # s entre escrituras: ~55 peticiones/min (cuota: 60/min por usuario)
+REINTENTOS = 5
+
+# Columnas mínimas que debe traer el fichero
+COLUMNAS_OBLIGATORIAS = [
+    "Fecha", "ID", "V1_Edad_Valor", "V2_Residencia_Valor", "V3_Fisiologico_Detalle",
+    "V4_Comorbilidad_Detalle", "V5_Cognitivo_Detalle", "V6_IngresoPrevio_Valor",
+    "V7_Proteinuria_Valor", "V8_ECG_Valor", "V9_Fragilidad_Detalle",
+]
+COLUMNAS_SI_NO = ["V2_Residencia_Valor", "V5_Cognitivo_Detalle", "V6_IngresoPrevio_Valor",
+                  "V7_Proteinuria_Valor", "V8_ECG_Valor"]
+SIN_ETIQUETAS = {"V3_Fisiologico_Detalle": "Ninguna", "V4_Comorbilidad_Detalle": "Ninguna",
+                 "V9_Fragilidad_Detalle": "No Frágil"}
+# Formatos de fecha admitidos, en este orden: los del registro (ISO) y el español
+# (día primero). Con formatos explícitos pandas no deduce uno distinto en cada bloque.
+FORMATOS_FECHA = ["%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d",
+                  "%d/%m/%Y %H:%M", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y"]
+
+
+# --- LECTURA POR BLOQUES ---
+
+def leer_bloques(ruta, tam_bloque=TAM_BLOQUE, saltar=0):
+    """
+    Genera DataFrames de texto de `tam_bloque` filas, saltando las `saltar` primeras.
+    Los CSV se leen en streaming; los Excel se leen enteros (el formato no permite
+    leer por trozos) y después se reparten en bloques.
+    """
+    if ruta.lower().endswith((".xlsx", ".xls")):
+        df = pd.read_excel(ruta, dtype=str, keep_default_na=False)
+        for inicio in range(saltar, len(df), tam_bloque):
+            yield df.iloc[inicio:inicio + tam_bloque]
+        return
+
+    # Separador detectado en la cabecera ("," o ";" según la configuración regional de Excel)
+    with open(ruta, newline="", encoding="utf-8-sig") as f:
+        separador = csv.Sniffer().sniff(f.readline(), delimiters=",;\t").delimiter
+    lector = pd.read_csv(ruta, dtype=str, keep_default_na=False, chunksize=tam_bloque,
+                         skiprows=range(1, saltar + 1), sep=separador, encoding="utf-8-sig")
+    for bloque in lector:
+        bloque.index += saltar
+        yield bloque
+
+
+# --- VALIDACIÓN Y PUNTUACIÓN ---
+
+def leer_fechas(serie):
+    """Fechas de un bloque según FORMATOS_FECHA (NaT si no encaja en ninguno)."""
+    texto = serie.str.strip()
+    fechas = pd.Series(pd.NaT, index=serie.index, dtype="datetime64[ns]")
+    for formato in FORMATOS_FECHA:
+        faltan = fechas.isna()
+        if not faltan.any():
+            break
+        fechas[faltan] = pd.to_datetime(texto[faltan], format=formato, errors="coerce")
+    return fechas
+
+
+def _outcomes(bloque):
+    """Outcome_30dias numérico (NaN si vacío o no válido) y máscara de celdas informadas."""
+    if "Outcome_30dias" not in bloque.columns:
+        vacio = pd.Series(False, index=bloque.index)
+        return pd.Series(np.nan, index=bloque.index), vacio
+    texto = bloque["Outcome_30dias"].str.strip()
+    return pd.to_numeric(texto, errors="coerce"), texto != ""
+
+
+def _popcount(codigos):
+    return np.unpackbits(np.asarray(codigos, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+
+def puntuar_bloque(bloque):
+    """
+    Puntos de cada variable a partir de los valores y detalles, con la misma
+    lógica que Registro_Paciente.py. Devuelve (puntos por columna V*_Puntos, códigos V3/V4/V9).
+    """
+    si = {c: bloque[c].str.strip().str.lower().isin(["sí", "si"]).to_numpy() for c in COLUMNAS_SI_NO}
+    codigos = {col: decodificar_serie(bloque[col], opciones)[0] for col, (_, opciones) in COLUMNAS_CODIFICADAS.items()}
+    edad = pd.to_numeric(bloque["V1_Edad_Valor"], errors="coerce").to_numpy()
+
+    puntos = {
+        "V1_Edad_Puntos": (edad > 65).astype(np.int8),
+        "V2_Residencia_Puntos": si["V2_Residencia_Valor"].astype(np.int8),
+        "V3_Fisiologico_Puntos": (_popcount(codigos["V3_Fisiologico_Detalle"]) >= 2).astype(np.int8),
+        "V4_Comorbilidad_Puntos": _popcount(codigos["V4_Comorbilidad_Detalle"]).astype(np.int8),
+        "V5_Cognitivo_Puntos": si["V5_Cognitivo_Detalle"].astype(np.int8),
+        "V6_IngresoPrevio_Puntos": si["V6_IngresoPrevio_Valor"].astype(np.int8),
+        "V7_Proteinuria_Puntos": si["V7_Proteinuria_Valor"].astype(np.int8),
+        "V8_ECG_Puntos": si["V8_ECG_Valor"].astype(np.int8),
+        "V9_Fragilidad_Puntos": _popcount(codigos["V9_Fragilidad_Detalle"]).astype(np.int8),
+    }
+    return puntos, codigos
+
+
+def validar_bloque(bloque):
+    """
+    Comprobaciones vectorizadas de esquema. Devuelve una Serie con el motivo de
+    rechazo de cada fila ("" si la fila es válida).
+    """
+    motivos = pd.Series("", index=bloque.index)
+
+    def rechazar(mascara, motivo):
+        nonlocal motivos
+        mascara = np.asarray(mascara, dtype=bool)
+        motivos = motivos.where(~mascara, motivos + np.where(motivos == "", "", "; ") + motivo)
+
+    rechazar(leer_fechas(bloque["Fecha"]).isna(), "Fecha no válida")
+    rechazar(bloque["ID"].str.strip() == "", "ID vacío")
+
+    edad = pd.to_numeric(bloque["V1_Edad_Valor"], errors="coerce")
+    rechazar(~edad.between(EDAD_MIN, EDAD_MAX), f"Edad fuera de rango ({EDAD_MIN}-{EDAD_MAX})")
+
+    for col in COLUMNAS_SI_NO:
+        rechazar(~bloque[col].str.strip().str.lower().isin(["sí", "si", "no"]), f"{col} no es Sí/No")
+    for col, (_, opciones) in COLUMNAS_CODIFICADAS.items():
+        rechazar(filas_desconocidas(bloque[col], opciones), f"{col} con etiquetas desconocidas")
+
+    outcome, informado = _outcomes(bloque)
+    rechazar(informado & ~outcome.isin([0, 1]), "Outcome_30dias no es 0, 1 o vacío")
+    if "Servicio" in bloque.columns:
+        servicio = bloque["Servicio"].str.strip()
+        rechazar((servicio != "") & ~servicio.isin(SERVICIOS), "Servicio desconocido")
+
+    # Si el fichero trae los puntos, deben coincidir con los detalles
+    puntos, _ = puntuar_bloque(bloque)
+    for col, esperado in puntos.items():
+        if col in bloque.columns:
+            valor = pd.to_numeric(bloque[col], errors="coerce")
+            informado = bloque[col].str.strip() != ""
+            rechazar(informado & (valor.to_numpy() != esperado), f"{col} no coincide con el detalle")
+    return motivos
+
+
+def filas_registro(bloque):
+    """Filas (listas en el orden de COLUMNAS_REGISTRO) de un bloque ya validado, repuntuado."""
+    puntos, codigos = puntuar_bloque(bloque)
+    score = np.minimum(sum(p.astype(np.int16) for p in puntos.values()), 20)
+    prob = np.round(calcular_probabilidad_math(score), 2)
+
+    def detalle(col, opciones):
+        return [", ".join(etiquetas(int(c), opciones)) or SIN_ETIQUETAS[col] for c in codigos[col]]
+
+    si_no = {c: np.where(bloque[c].str.strip().str.lower().isin(["sí", "si"]), "Sí", "No") for c in COLUMNAS_SI_NO}
+    salida = pd.DataFrame({
+        "Fecha": leer_fechas(bloque["Fecha"]).dt.strftime("%Y-%m-%d %H:%M").to_numpy(),
+        "ID": bloque["ID"].str.strip().to_numpy(),
+        "Score_Total": score,
+        "Prob_Mortalidad_Mat_%": prob,
+        "V1_Edad_Valor": pd.to_numeric(bloque["V1_Edad_Valor"]).astype(int).to_numpy(),
+        "V3_Fisiologico_Detalle": detalle("V3_Fisiologico_Detalle", OPCIONES_FISIO),
+        "V4_Comorbilidad_Detalle": detalle("V4_Comorbilidad_Detalle", OPCIONES_COMORB),
+        "V9_Fragilidad_Detalle": detalle("V9_Fragilidad_Detalle", OPCIONES_FRAIL),
+        "Outcome_30dias": [int(o) if o == o else "" for o in _outcomes(bloque)[0]],  # 0/1 o vacío
+        "Servicio": bloque["Servicio"].str.strip().to_numpy() if "Servicio" in bloque.columns else "",
+        **si_no,
+        **puntos,
+        **{dest: codigos[col] for col, (dest, _) in COLUMNAS_CODIFICADAS.items()},
+    })
+    return salida[COLUMNAS_REGISTRO].astype(object).values.tolist()
+
+
+# --- ESCRITURA CON CUOTA ---
+
+class EscrituraConCuota:
+    """
+    Anexa lotes respetando un intervalo mínimo por petición y reintentando los 429/5xx.
+
+    Con un registro fragmentado (HojaFragmentada) un append_rows cuesta varias
+    peticiones: se miden con su contador `peticiones` y la siguiente escritura
+    espera `intervalo` por cada una. Cada periodo se escribe y se reintenta por
+    separado, de modo que un fallo parcial no vuelve a anexar lo ya escrito.
+    """
+
+    def __init__(self, ws, intervalo=INTERVALO_ESCRITURA, reintentos=REINTENTOS):
+        self.ws = ws
+        self.intervalo = intervalo
+        self.reintentos = reintentos
+        self.peticiones = 0
+        self._siguiente = 0.0  # Instante a partir del cual se puede volver a escribir
+
+    def anexar(self, filas, hechos=(), al_escribir=None):
+        """
+        Anexa `filas`, un grupo por periodo (uno solo con una hoja única, clave None).
+        Se saltan los periodos de `hechos` (ya escritos antes de una interrupción) y
+        se llama a `al_escribir(periodo)` tras escribir cada grupo.
+        """
+        repartir = getattr(self.ws, "repartir", None)
+        grupos = repartir(filas) if repartir is not None else {None: filas}
+        for periodo, grupo in grupos.items():
+            if periodo in hechos:
+                continue
+            self._anexar_grupo(grupo)
+            if al_escribir is not None:
+                al_escribir(periodo)
+
+    def _anexar_grupo(self, filas):
+        for intento in range(self.reintentos + 1):
+            espera = self._siguiente - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            antes = getattr(self.ws, "peticiones", 0)
+            try:
+                self.ws.append_rows(filas, value_input_option='USER_ENTERED')
+                return
+            except APIError as e:
+                codigo = getattr(e, "code", None)
+                if intento == self.reintentos or not (codigo == 429 or (codigo or 0) >= 500):
+                    raise
+                time.sleep(min(2 ** intento, 64))  # Espera exponencial antes de reintentar
+            finally:
+                coste = max(getattr(self.ws, "peticiones", 0) - antes, 1)  # Hoja única: 1 petición
+                self.peticiones += coste
+                self._siguiente = time.monotonic() + self.intervalo * coste
+
+
+# --- IMPORTACIÓN REANUDABLE ---
+
+def _leer_control(ruta_control):
+    try:
+        with open(ruta_control) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _guardar_control(ruta_control, control):
+    temporal = ruta_control + ".tmp"
+    with open(temporal, "w") as f:
+        json.dump(control, f)
+    os.replace(temporal, ruta_control)
+
+
+def importar(ruta, ws, tam_bloque=TAM_BLOQUE, progreso=None):
+    """
+    Importa `ruta` en la hoja `ws` (o registro fragmentado) por bloques. Reanuda desde
+    "<ruta>.checkpoint.json" si existe; las filas rechazadas se añaden a
+    "<ruta>.rechazadas.csv". El punto de control anota también los periodos del
+    bloque en curso ya escritos, así que al reanudar no se repiten; solo si el proceso
+    se interrumpe entre una escritura y su anotación podría repetirse ese grupo.
+    Devuelve el resumen {"leidas", "importadas", "rechazadas"}.
+    """
+    ruta_control = ruta + ".checkpoint.json"
+    ruta_rechazos = ruta + ".rechazadas.csv"
+    control = _leer_control(ruta_control) or {"tam_bloque": tam_bloque, "leidas": 0, "importadas": 0, "rechazadas": 0}
+    control.setdefault("escritos", [])  # Periodos del bloque en curso ya anexados
+    escritura = EscrituraConCuota(ws)
+
+    def escrito(periodo):
+        control["escritos"].append(periodo)
+        _guardar_control(ruta_control, control)
+
+    for bloque in leer_bloques(ruta, control["tam_bloque"], saltar=control["leidas"]):
+        faltan = [c for c in COLUMNAS_OBLIGATORIAS if c not in bloque.columns]
+        if faltan:
+            raise ValueError(f"Faltan columnas obligatorias en {ruta}: {faltan}")
+
+        motivos = validar_bloque(bloque)
+        validas = bloque[motivos == ""]
+        if len(validas):
+            escritura.anexar(filas_registro(validas), hechos=set(control["escritos"]), al_escribir=escrito)
+
+        rechazadas = bloque[motivos != ""]
+        if len(rechazadas):
+            informe = rechazadas.assign(Motivo=motivos[motivos != ""])
+            informe.insert(0, "Fila", rechazadas.index + 2)  # Nº de línea en el fichero (con cabecera)
+            informe.to_csv(ruta_rechazos, mode="a", index=False, header=not os.path.exists(ruta_rechazos))
+
+        control["leidas"] += len(bloque)
+        control["importadas"] += len(validas)
+        control["rechazadas"] += len(rechazadas)
+        control["escritos"] = []
+        _guardar_control(ruta_control, control)
+        if progreso is not None:
+            progreso(control)
+
+    return {k: control[k] for k in ("leidas", "importadas", "rechazadas")}
+
+
+if __name__ == "__main__":
+    # [CRISTAL_CENTRO=...] python importacion.py historico.csv [historico2.xlsx ...]
+    import sys
+    import streamlit as st
+    from fragmentos import abrir_registro
+    from centros import centros_cli
+
+    destinos = centros_cli(st.secrets["gcp"])
+    if len(destinos) > 1:
+        sys.exit(f"Indique el centro de destino con CRISTAL_CENTRO ({', '.join(destinos)}).")
+    registro = abrir_registro(next(iter(destinos.values())))
+    for ruta in sys.argv[1:]:
+        resumen = importar(ruta, registro, progreso=lambda c: print(
+            f"{ruta}: {c['leidas']} leídas, {c['importadas']} importadas, {c['rechazadas']} rechazadas"))
+        print(f"{ruta} completado: {resumen}")
+        if resumen["rechazadas"]:
+            print(f"Informe de rechazos: {ruta}.rechazadas.csv")
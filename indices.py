@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+
+from utils import CATEGORIAS_RIESGO
+
+# --- ÍNDICES DE BITS (BITMAP) PARA CONSULTAS DE COHORTE ---
+
+# Nº de bits a 1 en cada byte, para contar sin desempaquetar
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+SCORE_MAX = 20
+FRAIL_MAX = 5
+
+
+class Bits:
+    """
+    Conjunto de filas representado como bitmap empaquetado (1 bit por paciente).
+    Se combina con & (Y), | (O) y ~ (NO).
+    """
+
+    def __init__(self, datos, n):
+        self.datos = datos
+        self.n = n
+
+    def __and__(self, otro):
+        return Bits(self.datos & otro.datos, self.n)
+
+    def __or__(self, otro):
+        return Bits(self.datos | otro.datos, self.n)
+
+    def __invert__(self):
+        datos = ~self.datos
+        resto = self.n % 8
+        if resto:
+            # Los bits de relleno del último byte deben quedar a 0
+            datos[-1] &= np.uint8((0xFF << (8 - resto)) & 0xFF)
+        return Bits(datos, self.n)
+
+    def contar(self):
+        """Nº de pacientes que cumplen la consulta."""
+        return int(_POPCOUNT[self.datos].sum(dtype=np.int64))
+
+    def filas(self):
+        """Posiciones (para df.iloc) de los pacientes que cumplen la consulta."""
+        return np.flatnonzero(np.unpackbits(self.datos, count=self.n))
+
+
+class IndiceCohorte:
+    """
+    Índices de bits por factor, por categoría de riesgo, por mes de registro y
+    con codificación por rangos para Score (score >= s) e ítems FRAIL (items >= k).
+
+    Se mantiene incrementalmente con `agregar()` a medida que llegan registros,
+    sin reconstruir los bitmaps existentes.
+    """
+
+    def __init__(self, factores):
+        self.factores = list(factores)
+        self.n = 0
+        self._bitmaps = {}
+
+    @classmethod
+    def desde_cohorte(cls, df, factores=None):
+        if factores is None:
+            factores = [c for c in df.columns if pd.api.types.is_bool_dtype(df[c])]
+        indice = cls(factores)
+        indice.agregar(df)
+        return indice
+
+    # --- MANTENIMIENTO ---
+
+    def _anexar(self, clave, nuevos):
+        """Añade los bits de las filas nuevas al final del bitmap `clave`."""
+        inicio = self.n
+        total = inicio + len(nuevos)
+        actual = self._bitmaps.get(clave)
+        if actual is None:
+            actual = np.zeros(0, dtype=np.uint8)
+
+        necesarios = (total + 7) // 8
+        if len(actual) < necesarios:
+            # Crecimiento geométrico para que las inserciones sean O(1) amortizado
+            ampliado = np.zeros(max(necesarios, 2 * len(actual)), dtype=np.uint8)
+            ampliado[:len(actual)] = actual
+            actual = ampliado
+
+        byte_ini = inicio // 8
+        previos = np.unpackbits(actual[byte_ini:byte_ini + 1], count=inicio % 8)
+        empaquetado = np.packbits(np.concatenate([previos, nuevos.astype(np.uint8)]))
+        actual[byte_ini:byte_ini + len(empaquetado)] = empaquetado
+        self._bitmaps[clave] = actual
+
+    def agregar(self, df):
+        """Indexa las filas nuevas de `df` (en el mismo orden en que se añaden a la cohorte)."""
+        if len(df) == 0:
+            return
+
+        for f in self.factores:
+            self._anexar(("factor", f), df[f].to_numpy(dtype=bool))
+
+        codigos = pd.Categorical(df['Categoria_Riesgo'], categories=CATEGORIAS_RIESGO).codes
+        for c in range(len(CATEGORIAS_RIESGO)):
+            self._anexar(("categoria", c), codigos == c)
+
+        scores = df['Score_CriSTAL'].to_numpy()
+        for s in range(1, SCORE_MAX + 1):
+            self._anexar(("score_min", s), scores >= s)
+
+        if 'Items_FRAIL' in df.columns:
+            items = df['Items_FRAIL'].to_numpy()
+            for k in range(1, FRAIL_MAX + 1):
+                self._anexar(("frail_min", k), items >= k)
+
+        # Los bitmaps de meses sin filas nuevas no se tocan: sus bits ausentes valen 0
+        meses = pd.to_datetime(df['Fecha_Registro']).to_numpy().astype('datetime64[M]')
+        for mes in np.unique(meses):
+            self._anexar(("mes", str(mes)), meses == mes)
+
+        self.n += len(df)
+
+    # --- CONSULTAS ---
+
+    def _bits(self, clave):
+        tam = (self.n + 7) // 8
+        datos = np.zeros(tam, dtype=np.uint8)
+        guardado = self._bitmaps.get(clave)
+        if guardado is not None:
+            m = min(tam, len(guardado))
+            datos[:m] = guardado[:m]
+        return Bits(datos, self.n)
+
+    def todos(self):
+        return ~Bits(np.zeros((self.n + 7) // 8, dtype=np.uint8), self.n)
+
+    def factor(self, nombre):
+        return self._bits(("factor", nombre))
+
+    def categoria(self, codigo):
+        return self._bits(("categoria", codigo))
+
+    def categoria_min(self, codigo):
+        """Pacientes con categoría de riesgo >= codigo (p. ej. 2 = Alto o Crítico)."""
+        resultado = self._bits(("categoria", codigo))
+        for c in range(codigo + 1, len(CATEGORIAS_RIESGO)):
+            resultado = resultado | self._bits(("categoria", c))
+        return resultado
+
+    def score_min(self, s):
+        return self.todos() if s <= 0 else self._bits(("score_min", min(s, SCORE_MAX + 1)))
+
+    def frail_min(self, k):
+        return self.todos() if k <= 0 else self._bits(("frail_min", k))
+
+    def periodo(self, desde, hasta=None):
+        """Pacientes registrados en los meses entre `desde` y `hasta` (ambos incluidos)."""
+        desde = pd.Period(desde, freq='M')
+        hasta = pd.Period(hasta, freq='M') if hasta is not None else None
+        resultado = ~self.todos()
+        for clave in self._bitmaps:
+            if clave[0] != "mes":
+                continue
+            mes = pd.Period(clave[1], freq='M')
+            if mes >= desde and (hasta is None or mes <= hasta):
+                resultado = resultado | self._bits(clave)
+        return resultado
+
+    def consultar(self, todos=(), alguno=(), ninguno=()):
+        """Y de los factores en `todos`, O de los de `alguno` y NO de los de `ninguno`."""
+        resultado = self.todos()
+        for f in todos:
+            resultado = resultado & self.factor(f)
+        if alguno:
+            union = ~self.todos()
+            for f in alguno:
+                union = union | self.factor(f)
+            resultado = resultado & union
+        for f in ninguno:
+            resultado = resultado & ~self.factor(f)
+        return resultado
@@ -0,0 +1,262 @@
+import io
+import os
+import re
+import html
+import base64
+import textwrap
+from string import Template
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.image import imread
+from matplotlib.colors import ListedColormap
+from matplotlib.patches import Rectangle
+from matplotlib.backends.backend_pdf import PdfPages
+
+from utils import calcular_probabilidad_math, obtener_color_riesgo
+from cache_compartida import CACHE
+from prehabilitacion import plan_para_mascara, mascaras_desde_registro
+
+# --- INFORMES DE DECISIÓN COMPARTIDA (HTML / PDF) ---
+# Las imágenes dependen solo del score (0-20), así que se generan una vez por score
+# para todos los procesos (caché compartida en disco), se memorizan en cada proceso
+# (lru_cache) y se reutilizan en la página de Decisión Compartida y en los informes.
+
+COLOR_SUPERVIVENCIA = '#3498db'
+N_PERSONAS = 100
+VERSION_IMAGENES = "1"  # Cambiar al modificar los gráficos para invalidar la caché compartida
+
+
+def resumen_riesgo(score, prob=None):
+    """
+    (probabilidad de mortalidad %, color, nº de muertes de cada 100). Sin `prob`, la
+    probabilidad es la de la fórmula CriSTAL original.
+    """
+    prob = float(calcular_probabilidad_math(score) if prob is None else prob)
+    return prob, obtener_color_riesgo(score), int(round(prob * (N_PERSONAS / 100)))
+
+
+def mensaje_clinico(score):
+    """(estilo de Streamlit, texto) de la Comunicación Clínica Recomendada."""
+    if score < 8:
+        return "success", "El riesgo es bajo. La probabilidad de que la cirugía sea exitosa es muy alta. Proceder con el plan quirúrgico es la mejor opción."
+    elif score < 12:
+        return "warning", "El riesgo es moderado. La mayoría de las personas superan la cirugía, pero hay un riesgo real. Es crucial optimizar su estado físico antes de operar, si es posible."
+    elif score < 14:
+        return "error", "El riesgo es alto. La posibilidad de un desenlace fatal es significativa. Debemos considerar muy seriamente si los beneficios de la cirugía superan los riesgos, o buscar alternativas no quirúrgicas."
+    else:
+        return "error", "El riesgo es crítico. El riesgo de mortalidad supera el 50%. La cirugía solo se debe plantear en casos de extrema urgencia y con el consentimiento informado de un riesgo altísimo."
+
+# --- GRÁFICOS POR SCORE (CACHEADOS) ---
+
+def _figura_pastel(score):
+    prob, color, _ = resumen_riesgo(score)
+    fig = Figure(figsize=(6, 6))
+    ax = fig.subplots()
+    sizes = [100 - prob, prob]
+    labels = [f'Supervivencia ({100 - prob:.1f}%)', f'Mortalidad ({prob:.1f}%)']
+    ax.pie(sizes, explode=(0, 0.1), labels=labels, autopct='%1.1f%%', startangle=90,
+           colors=[COLOR_SUPERVIVENCIA, color], wedgeprops={'edgecolor': 'black', 'linewidth': 1})
+    ax.axis('equal')
+    ax.set_title("Pronóstico a 30 Días", fontsize=16)
+    return fig
+
+
+def _figura_waffle(score):
+    _, color, n_muerte = resumen_riesgo(score)
+    categorias = np.array([1] * n_muerte + [0] * (N_PERSONAS - n_muerte))[:N_PERSONAS]
+    # Semilla fija por score: el mismo pictograma en la página y en los informes
+    np.random.default_rng(score).shuffle(categorias)
+
+    fig = Figure(figsize=(7, 7))
+    ax = fig.subplots()
+    ax.imshow(categorias.reshape((10, 10)), cmap=ListedColormap([COLOR_SUPERVIVENCIA, color]),
+              aspect='auto', vmin=0, vmax=1)
+    for i in range(10):
+        for j in range(10):
+            ax.add_patch(Rectangle((j - 0.5, i - 0.5), 1, 1, fill=False, edgecolor='grey', linewidth=0.5, alpha=0.5))
+    ax.set_title("De cada 100 personas con este perfil...", fontsize=16)
+    ax.axis('off')
+    return fig
+
+
+def _png(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=80, bbox_inches="tight")
+    return buffer.getvalue()
+
+
+@lru_cache(maxsize=None)
+def imagen_pastel(score):
+    """PNG del diagrama de pastel para un score."""
+    return CACHE.obtener(f"pastel_{score}", VERSION_IMAGENES, lambda: _png(_figura_pastel(score)), esperar=True)[1]
+
+
+@lru_cache(maxsize=None)
+def imagen_waffle(score):
+    """PNG del pictograma de 100 personas para un score."""
+    return CACHE.obtener(f"waffle_{score}", VERSION_IMAGENES, lambda: _png(_figura_waffle(score)), esperar=True)[1]
+
+
+@lru_cache(maxsize=None)
+def _imagen_b64(tipo, score):
+    imagen = imagen_pastel(score) if tipo == "pastel" else imagen_waffle(score)
+    return base64.b64encode(imagen).decode("ascii")
+
+# --- PLANTILLAS (COMPILADAS UNA VEZ) ---
+
+PLANTILLA_INFORME = Template("""<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>CriSTAL · $id</title>
+<style>
+  body { font-family: sans-serif; max-width: 900px; margin: 20px auto; color: #222; }
+  .tarjeta { border: 2px solid $color; background: ${color}15; border-radius: 8px; padding: 15px; text-align: center; }
+  .tarjeta h1 { color: $color; margin: 5px 0; font-size: 3em; }
+  .graficos img { width: 48%; }
+  .mensaje { border-radius: 6px; padding: 10px 15px; }
+  .success { background: #e8f8ef; } .warning { background: #fff8e1; } .error { background: #fdecea; } .info { background: #eaf4fc; }
+  .item { border-radius: 6px; padding: 8px 12px; margin: 6px 0; }
+  @media print { .graficos img { width: 45%; } h2 { page-break-after: avoid; } }
+</style>
+</head>
+<body>
+<h2>🤝 Riesgo CriSTAL: Herramienta de Decisión Compartida</h2>
+<p>Paciente: <b>$id</b> · Fecha de valoración: $fecha</p>
+<div class="tarjeta">
+  <p style="color: $color; margin:0; font-weight:bold;">SCORE TOTAL</p>
+  <h1>$score / 20</h1>
+  <p>Probabilidad Estimada de Mortalidad a 30 días: <b>$prob%</b></p>
+</div>
+<div class="graficos">
+  <img alt="Diagrama de pastel" src="data:image/png;base64,$pastel">
+  <img alt="Pictograma" src="data:image/png;base64,$waffle">
+</div>
+<p>De cada <b>100 personas</b> con este perfil de riesgo, estadísticamente <b>$n_muerte</b> no sobrevivirían al mes de la cirugía.</p>
+<h2>Comunicación Clínica Recomendada</h2>
+<div class="mensaje $estilo_mensaje">$mensaje</div>
+<h2>💪 Plan de Prehabilitación</h2>
+$plan
+</body>
+</html>
+""")
+
+PLANTILLA_SECCION = Template('<h3>$titulo</h3>\n$items')
+PLANTILLA_ITEM = Template('<div class="item $estilo">$texto</div>')
+
+
+def _markdown_a_html(texto):
+    """Subconjunto de markdown usado en los textos del plan: **negrita** y viñetas '* '."""
+    texto = re.sub(r"\*\*(.+?)\*\*", r"<b>\1</b>", html.escape(texto.strip()))
+    lineas = [l.strip() for l in texto.splitlines() if l.strip()]
+    if lineas and all(l.startswith("* ") for l in lineas):
+        return "<ul>" + "".join(f"<li>{l[2:]}</li>" for l in lineas) + "</ul>"
+    return " ".join(lineas)
+
+
+def _plan_html(mascara):
+    secciones, actual = [], None
+    for seccion, estilo, texto, _, _ in plan_para_mascara(mascara):
+        if seccion != actual:
+            secciones.append((seccion, []))
+            actual = seccion
+        secciones[-1][1].append(PLANTILLA_ITEM.substitute(estilo=estilo, texto=_markdown_a_html(texto)))
+    return "\n".join(PLANTILLA_SECCION.substitute(titulo=_markdown_a_html(s), items="\n".join(i)) for s, i in secciones)
+
+
+def informe_html(paciente):
+    """HTML autocontenido para un paciente: dict con 'ID', 'Fecha', 'Score_Total' y 'Mascara'."""
+    score = int(paciente['Score_Total'])
+    prob, color, n_muerte = resumen_riesgo(score)
+    estilo, mensaje = mensaje_clinico(score)
+    return PLANTILLA_INFORME.substitute(
+        id=html.escape(str(paciente['ID'])), fecha=html.escape(str(paciente['Fecha'])),
+        score=score, prob=f"{prob:.1f}", color=color, n_muerte=n_muerte,
+        pastel=_imagen_b64("pastel", score), waffle=_imagen_b64("waffle", score),
+        estilo_mensaje=estilo, mensaje=html.escape(mensaje),
+        plan=_plan_html(int(paciente['Mascara'])),
+    )
+
+
+def informe_pdf(paciente, ruta):
+    """PDF de una página (A4) con la tarjeta de riesgo, los gráficos, el mensaje y el plan."""
+    score = int(paciente['Score_Total'])
+    prob, color, n_muerte = resumen_riesgo(score)
+    _, mensaje = mensaje_clinico(score)
+
+    fig = Figure(figsize=(8.27, 11.69))
+    fig.text(0.5, 0.96, "Riesgo CriSTAL: Decisión Compartida", ha="center", fontsize=16, weight="bold")
+    fig.text(0.5, 0.935, f"Paciente: {paciente['ID']}  ·  Fecha: {paciente['Fecha']}", ha="center", fontsize=10)
+    fig.text(0.5, 0.90, f"Score {score} / 20  ·  Mortalidad estimada {prob:.1f}%", ha="center",
+             fontsize=14, color=color, weight="bold")
+
+    for x, imagen in ((0.05, imagen_pastel(score)), (0.52, imagen_waffle(score))):
+        ax = fig.add_axes([x, 0.62, 0.43, 0.26])
+        ax.imshow(imread(io.BytesIO(imagen), format="png"))
+        ax.axis('off')
+
+    texto = [f"De cada 100 personas con este perfil, {n_muerte} no sobrevivirían al mes de la cirugía.", "",
+             "Comunicación clínica recomendada:", *textwrap.wrap(mensaje, 100), "", "Plan de prehabilitación:"]
+    for seccion, _, item, prioridad, servicio in plan_para_mascara(int(paciente['Mascara'])):
+        limpio = re.sub(r"[^\w\s.,:;/()<>%+\-¡!¿?]", "", item.replace("**", "")).strip()
+        for linea in limpio.splitlines():
+            texto += textwrap.wrap(f"- [{prioridad}] {linea.strip().lstrip('* ')}", 100)
+    fig.text(0.06, 0.58, "\n".join(texto), va="top", fontsize=8.5, family="sans-serif")
+
+    with PdfPages(ruta) as pdf:
+        pdf.savefig(fig)
+
+
+# --- GENERACIÓN EN LOTE ---
+
+def _renderizar(trabajo):
+    paciente, directorio, formato = trabajo
+    nombre = re.sub(r"[^\w\-]", "_", str(paciente['ID']))
+    ruta = os.path.join(directorio, f"CriSTAL_{nombre}.{formato}")
+    if formato == "pdf":
+        informe_pdf(paciente, ruta)
+    else:
+        with open(ruta, "w", encoding="utf-8") as f:
+            f.write(informe_html(paciente))
+    return ruta
+
+
+def generar_informes(reg, directorio="informes", formato="html", procesos=None):
+    """
+    Genera un informe por fila de `reg` (registro tipado) repartiendo el trabajo en
+    un pool de procesos. Cada proceso cachea sus imágenes por score, de modo que un
+    listado entero solo genera, como mucho, 21 pastel + 21 pictogramas por proceso.
+    Devuelve la lista de rutas generadas.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    pacientes = reg[['ID', 'Fecha', 'Score_Total']].astype({'Fecha': str}).assign(
+        Mascara=mascaras_desde_registro(reg)
+    ).to_dict("records")
+    trabajos = [(p, directorio, formato) for p in pacientes]
+
+    if procesos == 1 or len(trabajos) < 20:
+        return [_renderizar(t) for t in trabajos]
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        return list(pool.map(_renderizar, trabajos, chunksize=max(1, len(trabajos) // (4 * (os.cpu_count() or 1)))))
+
+
+if __name__ == "__main__":
+    # Informes de la lista de la consulta:  python informes.py ids.csv [html|pdf] [directorio]
+    import sys
+    import pandas as pd
+    from snapshots import abrir_snapshot, registro_desde_tabla
+    from centros import directorio_snapshots
+
+    tabla = abrir_snapshot(directorio=directorio_snapshots())  # Centro de CRISTAL_CENTRO
+    if tabla is None:
+        sys.exit("No hay snapshot del registro. Ejecute antes: python snapshots.py")
+    reg = registro_desde_tabla(tabla)
+    ids = pd.read_csv(sys.argv[1], dtype=str).iloc[:, 0]
+    reg = reg[reg['ID'].astype(str).isin(ids)].sort_values('Fecha').drop_duplicates('ID', keep='last')
+
+    rutas = generar_informes(reg, formato=sys.argv[2] if len(sys.argv) > 2 else "html",
+                             directorio=sys.argv[3] if len(sys.argv) > 3 else "informes")
+    print(f"{len(rutas)} informes generados.")
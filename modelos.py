@@ -0,0 +1,157 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# --- REGISTRO DE MODELOS DE PROBABILIDAD ---
+# Cada modelo tiene nombre, versión y coeficientes (L = intercepto + pendiente * Score).
+# Todos se evalúan a la vez sobre una cohorte con una única operación matricial
+# (n pacientes x m modelos) y en forma numéricamente estable.
+#
+#   "logistico": P = 1 / (1 + exp(-L))            (fórmula CriSTAL)
+#   "tesis":     P = exp(Score) / (1 + exp(L))    (expresión literal de la tesis)
+# La variante tesis supera el 100% desde Score ~1: se calcula en escala logarítmica
+# (sin desbordamiento) y se acota a 100%, indicando qué valores se han acotado.
+
+INTERCEPTO_CRISTAL = -3.844
+PENDIENTE_CRISTAL = 0.285
+
+MODELOS = {
+    "CriSTAL original": {
+        "version": "1.0", "tipo": "logistico",
+        "intercepto": INTERCEPTO_CRISTAL, "pendiente": PENDIENTE_CRISTAL,
+        "descripcion": "L = -3.844 + 0.285 * Score; P = 1 / (1 + e^-L)",
+    },
+    "Tesis literal": {
+        "version": "1.0", "tipo": "tesis",
+        "intercepto": INTERCEPTO_CRISTAL, "pendiente": PENDIENTE_CRISTAL,
+        "descripcion": "P = e^Score / (1 + e^L), acotada a 100%",
+    },
+}
+
+
+def registrar_modelo(nombre, intercepto, pendiente, version=None, tipo="logistico", descripcion="",
+                     registro=None):
+    """Añade (o sustituye) un modelo en el registro (por defecto, MODELOS)."""
+    registro = MODELOS if registro is None else registro
+    if tipo not in ("logistico", "tesis"):
+        raise ValueError(f"Tipo de modelo no soportado: {tipo}")
+    registro[nombre] = {
+        "version": version or date.today().isoformat(), "tipo": tipo,
+        "intercepto": float(intercepto), "pendiente": float(pendiente),
+        "descripcion": descripcion or f"L = {intercepto:.3f} + {pendiente:.3f} * Score",
+    }
+    return registro[nombre]
+
+
+def _sigmoide(x):
+    """1 / (1 + e^-x) sin desbordamiento para |x| grande."""
+    e = np.exp(-np.abs(x))
+    return np.where(x >= 0, 1 / (1 + e), e / (1 + e))
+
+
+def evaluar_modelos(scores, nombres=None, registro=None):
+    """
+    Probabilidad (%) de cada modelo para cada score, en una sola pasada.
+    Devuelve (DataFrame n x m con una columna por modelo, DataFrame booleano
+    de valores acotados a 100%). `registro` permite usar otro registro que MODELOS
+    (p. ej. una copia por sesión con un modelo recalibrado).
+    """
+    registro = MODELOS if registro is None else registro
+    nombres = list(registro) if nombres is None else list(nombres)
+    scores = np.asarray(scores, dtype=np.float64).reshape(-1, 1)
+    intercepto = np.array([registro[m]["intercepto"] for m in nombres])
+    pendiente = np.array([registro[m]["pendiente"] for m in nombres])
+    tesis = np.array([registro[m]["tipo"] == "tesis" for m in nombres])
+
+    logit = intercepto + pendiente * scores  # (n, m)
+    # log(e^Score / (1 + e^L)) = Score - log(1 + e^L); logaddexp evita el desbordamiento
+    log_tesis = scores - np.logaddexp(0, logit)
+    acotado = tesis & (log_tesis > 0)
+    prob = np.where(tesis, np.exp(np.minimum(log_tesis, 0)), _sigmoide(logit)) * 100
+
+    return pd.DataFrame(prob, columns=nombres), pd.DataFrame(acotado, columns=nombres)
+
+
+def probabilidades(score, nombres=None):
+    """Probabilidad (%) de cada modelo para un único score: {nombre: prob}."""
+    prob, _ = evaluar_modelos([score], nombres)
+    return prob.iloc[0].to_dict()
+
+
+# --- RECALIBRACIÓN LOCAL ---
+
+def recalibrar(scores, outcomes, iteraciones=25):
+    """
+    Ajusta intercepto y pendiente por máxima verosimilitud (Newton-Raphson) con los
+    outcomes observados (0/1; NaN se ignora). Devuelve (intercepto, pendiente, n).
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    outcomes = np.asarray(outcomes, dtype=np.float64)
+    conocidos = ~np.isnan(outcomes)
+    x = np.column_stack([np.ones(conocidos.sum()), scores[conocidos]])
+    y = outcomes[conocidos]
+    if len(y) < 2 or y.min() == y.max():
+        raise ValueError("Se necesitan outcomes observados de ambas clases para recalibrar.")
+
+    beta = np.array([INTERCEPTO_CRISTAL, PENDIENTE_CRISTAL])
+    for _ in range(iteraciones):
+        p = _sigmoide(x @ beta)
+        w = p * (1 - p)
+        paso = np.linalg.solve(x.T @ (x * w[:, None]) + 1e-9 * np.eye(2), x.T @ (y - p))
+        beta += paso
+        if np.abs(paso).max() < 1e-8:
+            break
+    return float(beta[0]), float(beta[1]), int(len(y))
+
+
+# --- MÉTRICAS DE VALIDACIÓN ---
+
+def _auc(prob, y):
+    """Área bajo la curva ROC (estadístico de Mann-Whitney con rangos medios)."""
+    n1 = y.sum()
+    n0 = len(y) - n1
+    if n1 == 0 or n0 == 0:
+        return np.nan
+    rangos = pd.Series(prob).rank().to_numpy()
+    return float((rangos[y == 1].sum() - n1 * (n1 + 1) / 2) / (n1 * n0))
+
+
+def metricas_modelos(scores, outcomes, nombres=None, registro=None):
+    """
+    Comparación de los modelos sobre los pacientes con outcome conocido:
+    mortalidad media estimada, observada, razón O/E, Brier, AUC y % de valores acotados.
+    """
+    outcomes = np.asarray(outcomes, dtype=np.float64)
+    conocidos = ~np.isnan(outcomes)
+    y = outcomes[conocidos]
+    registro = MODELOS if registro is None else registro
+    prob, acotado = evaluar_modelos(np.asarray(scores)[conocidos], nombres, registro)
+
+    filas = []
+    for nombre in prob.columns:
+        p = prob[nombre].to_numpy() / 100
+        filas.append({
+            "Modelo": nombre,
+            "Version": registro[nombre]["version"],
+            "Mortalidad_Estimada_%": p.mean() * 100 if len(p) else np.nan,
+            "Mortalidad_Observada_%": y.mean() * 100 if len(y) else np.nan,
+            "O/E": y.sum() / p.sum() if p.sum() else np.nan,
+            "Brier": float(np.mean((p - y) ** 2)) if len(y) else np.nan,
+            "AUC": _auc(p, y),
+            "Acotados_%": acotado[nombre].mean() * 100 if len(p) else 0.0,
+        })
+    return pd.DataFrame(filas)
+
+
+def tabla_calibracion(scores, outcomes, nombres=None, registro=None):
+    """Mortalidad observada frente a la estimada por cada modelo, agrupando por score."""
+    outcomes = np.asarray(outcomes, dtype=np.float64)
+    conocidos = ~np.isnan(outcomes)
+    scores = np.asarray(scores)[conocidos]
+    prob, _ = evaluar_modelos(scores, nombres, registro)
+    prob["Score"] = scores
+    prob["Observada"] = outcomes[conocidos] * 100
+    tabla = prob.groupby("Score").mean()
+    tabla["Pacientes"] = prob.groupby("Score").size()
+    return tabla.reset_index()
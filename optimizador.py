@@ -0,0 +1,178 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from utils import calcular_probabilidad_math
+from codificacion import COLUMNAS_CODIFICADAS, OPCIONES_COMORB, OPCIONES_FRAIL, bit, decodificar_serie
+
+# --- SIMULADOR "WHAT-IF" DE FACTORES MODIFICABLES ---
+# Cada intervención elimina el punto de un factor modificable si está presente.
+# Se evalúan a la vez los 2^k subconjuntos de intervenciones (k = nº de intervenciones).
+
+SCORE_MAX = 20
+
+# (nombre de la intervención, tipo de factor, etiqueta, puntos que elimina)
+INTERVENCIONES = [
+    ("Estabilización fisiológica (V3)", "fisio", None, 1),
+    ("Tratamiento de la fatiga", "frail", "Fatiga", 1),
+    ("Entrenamiento de resistencia", "frail", "Resistencia (Escaleras)", 1),
+    ("Rehabilitación de la marcha", "frail", "Deambulación", 1),
+    ("Soporte nutricional", "frail", "Pérdida Peso >5%", 1),
+    ("Compensación de la insuficiencia cardíaca", "comorb", "ICC", 1),
+    ("Optimización de la EPOC", "comorb", "EPOC", 1),
+]
+NOMBRES_INTERVENCIONES = [i[0] for i in INTERVENCIONES]
+PESOS = np.array([i[3] for i in INTERVENCIONES], dtype=np.int16)
+
+# Matriz (2^k, k) con todos los subconjuntos de intervenciones
+SUBCONJUNTOS = ((np.arange(1 << len(INTERVENCIONES))[:, None] >> np.arange(len(INTERVENCIONES))) & 1).astype(np.int16)
+
+
+def puntos_desde_registro(reg):
+    """Puntos brutos (n,) del registro: suma de las columnas V*_Puntos (Score_Total ya está topado)."""
+    return reg[[c for c in reg.columns if c.endswith('_Puntos')]].sum(axis=1).to_numpy()
+
+
+def activos_desde_contexto(contexto):
+    """Máscara (bit i = INTERVENCIONES[i]) de intervenciones aplicables a un ContextoPaciente."""
+    frag = contexto.etiquetas_frail()
+    comorb = contexto.etiquetas_comorb()
+    activos = 0
+    for i, (_, tipo, etiqueta, _) in enumerate(INTERVENCIONES):
+        if tipo == "fisio":
+            presente = contexto.p_fisiologico > 0
+        elif tipo == "frail":
+            presente = etiqueta in frag
+        else:
+            presente = etiqueta in comorb
+        activos |= presente << i
+    return activos
+
+
+def _codigos(reg, detalle):
+    """
+    Máscaras de la columna codificada de `detalle`; las filas aún sin migrar (código 0
+    o columna ausente) se decodifican del texto.
+    """
+    destino, opciones = COLUMNAS_CODIFICADAS[detalle]
+    codigos = reg[destino].to_numpy() if destino in reg.columns else np.zeros(len(reg), dtype=np.int8)
+    sin_codigo = codigos == 0
+    if sin_codigo.any() and detalle in reg.columns:
+        codigos = codigos.copy()
+        codigos[sin_codigo] = decodificar_serie(reg[detalle].astype(str)[sin_codigo], opciones)[0]
+    return codigos
+
+
+def activos_desde_registro(reg):
+    """Matriz booleana (n, k) de intervenciones aplicables a partir de las columnas codificadas del registro."""
+    frail, comorb = _codigos(reg, 'V9_Fragilidad_Detalle'), _codigos(reg, 'V4_Comorbilidad_Detalle')
+    columnas = []
+    for _, tipo, etiqueta, _ in INTERVENCIONES:
+        if tipo == "fisio":
+            columnas.append(reg['V3_Fisiologico_Puntos'].to_numpy() > 0)
+        elif tipo == "frail":
+            columnas.append(bit(frail, OPCIONES_FRAIL, etiqueta))
+        else:
+            columnas.append(bit(comorb, OPCIONES_COMORB, etiqueta))
+    return np.column_stack(columnas)
+
+
+def evaluar_cohorte(puntos, activos):
+    """
+    Evalúa en una sola pasada vectorizada todos los subconjuntos de intervenciones
+    para n pacientes. `puntos` (n,) son los puntos brutos y `activos` (n, k).
+    Devuelve (scores, probabilidades), ambas de forma (n, 2^k); la columna j
+    corresponde al subconjunto SUBCONJUNTOS[j]. Quitar un factor ausente no reduce nada.
+    """
+    puntos = np.asarray(puntos, dtype=np.int16).reshape(-1, 1)
+    reduccion = activos.astype(np.int16) @ (SUBCONJUNTOS * PESOS).T
+    scores = np.clip(puntos - reduccion, 0, SCORE_MAX)
+    return scores, calcular_probabilidad_math(scores)
+
+
+def mejor_plan_cohorte(puntos, activos, max_intervenciones=None):
+    """
+    Para cada paciente, el subconjunto (con como mucho `max_intervenciones`) que más
+    reduce la mortalidad; a igual reducción, el de menos intervenciones.
+    Devuelve un DataFrame con la probabilidad actual, la optimizada y el plan.
+    """
+    scores, probs = evaluar_cohorte(puntos, activos)
+    tamanos = SUBCONJUNTOS.sum(axis=1)
+    # Penalización infinitesimal por nº de intervenciones para desempatar
+    coste = probs + tamanos * 1e-9
+    if max_intervenciones is not None:
+        coste = np.where(tamanos <= max_intervenciones, coste, np.inf)
+    mejor = coste.argmin(axis=1)
+    filas = np.arange(len(mejor))
+
+    return pd.DataFrame({
+        'Score_Actual': scores[:, 0],
+        'Prob_Actual_%': probs[:, 0],
+        'Score_Optimizado': scores[filas, mejor],
+        'Prob_Optimizada_%': probs[filas, mejor],
+        'Reduccion_%': probs[:, 0] - probs[filas, mejor],
+        'Intervenciones': [_describir(SUBCONJUNTOS[j] & activos[i]) for i, j in zip(filas, mejor)],
+    })
+
+
+def planes_cohorte(reg, max_intervenciones=None):
+    """
+    Mejor plan de cada valoración del registro tipado (mejor_plan_cohorte), con su ID
+    y Fecha, de mayor a menor reducción de la mortalidad.
+    """
+    planes = mejor_plan_cohorte(puntos_desde_registro(reg), activos_desde_registro(reg), max_intervenciones)
+    planes.insert(0, 'ID', reg['ID'].astype(str).to_numpy())
+    planes.insert(1, 'Fecha', reg['Fecha'].to_numpy())
+    return planes.sort_values('Reduccion_%', ascending=False, kind='stable', ignore_index=True)
+
+
+def _describir(subconjunto):
+    return ", ".join(n for n, s in zip(NOMBRES_INTERVENCIONES, subconjunto) if s)
+
+
+@lru_cache(maxsize=1024)
+def ranking_paciente(puntos, activos, top=10):
+    """
+    Tabla ordenada de combinaciones de intervenciones para un paciente: mayor
+    reducción de mortalidad primero y, a igualdad, menos intervenciones.
+    Solo se listan combinaciones formadas por factores presentes. Depende solo de
+    los puntos brutos y de la máscara de intervenciones aplicables, así que se
+    calcula una vez por combinación y se comparte entre sesiones.
+    """
+    activos = (activos >> np.arange(len(INTERVENCIONES)) & 1).astype(bool)
+    scores, probs = evaluar_cohorte([puntos], activos[None, :])
+    scores, probs = scores[0], probs[0]
+
+    # Subconjuntos no vacíos que solo usan factores presentes
+    validos = (SUBCONJUNTOS.sum(axis=1) > 0) & ~(SUBCONJUNTOS.astype(bool) & ~activos).any(axis=1)
+    indices = np.flatnonzero(validos)
+    ranking = pd.DataFrame({
+        'Intervenciones': [_describir(SUBCONJUNTOS[j]) for j in indices],
+        'Nº': SUBCONJUNTOS[indices].sum(axis=1),
+        'Score': scores[indices],
+        'Mortalidad_%': probs[indices],
+        'Reduccion_%': probs[0] - probs[indices],
+    })
+    return ranking.sort_values(['Reduccion_%', 'Nº'], ascending=[False, True]).head(top).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    # Potencial de optimización de la lista de espera (última valoración de cada paciente):
+    #   [CRISTAL_CENTRO=...] python optimizador.py [max_intervenciones] [salida.csv]
+    import sys
+    from snapshots import abrir_snapshot, registro_desde_tabla
+    from centros import directorio_snapshots
+
+    tabla = abrir_snapshot(directorio=directorio_snapshots())
+    if tabla is None:
+        sys.exit("No hay snapshot del registro. Ejecute antes: python snapshots.py")
+    reg = registro_desde_tabla(tabla).sort_values('Fecha').drop_duplicates('ID', keep='last')
+
+    maximo = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    planes = planes_cohorte(reg, maximo)
+    salida = sys.argv[2] if len(sys.argv) > 2 else "planes_optimizacion.csv"
+    planes.to_csv(salida, index=False)
+    mejoran = planes[planes['Reduccion_%'] > 0]
+    print(f"{len(planes)} pacientes, {len(mejoran)} con algún factor modificable "
+          f"(reducción media {mejoran['Reduccion_%'].mean():.1f} puntos porcentuales) -> {salida}")
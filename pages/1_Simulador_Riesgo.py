@@ -2,17 +2,12 @@ import streamlit as st
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-from utils import calcular_probabilidad_math, obtener_color_riesgo
+from utils import calcular_probabilidad_math
+from contexto import ContextoPaciente, CLAVE_SESION
 
 # --- 1. CONFIGURACIÓN E INICIALIZACIÓN ---
 st.set_page_config(page_title="Calculadora CriSTAL", page_icon="🧮", layout="wide")
 
-# Inicializar o recuperar el estado de la sesión
-if 'current_score' not in st.session_state:
-    st.session_state['current_score'] = 10 # Valor por defecto
-if 'current_factors' not in st.session_state:
-    st.session_state['current_factors'] = {}
-
 # Configuración estética de la gráfica
 sns.set_style("whitegrid")
 plt.rcParams['font.family'] = 'sans-serif'
@@ -25,9 +20,6 @@ st.markdown("Marca los factores de riesgo del paciente. El Score y el gráfico s
 with st.container(border=True):
     col_v1_v3, col_v4, col_v9 = st.columns(3)
     
-    puntos = 0
-    factores = {}
-    
     # --- Columna 1: Fisiológico y Edad ---
     with col_v1_v3:
         st.markdown("#### I. Edad y Fisiología")
@@ -35,12 +27,10 @@ with st.container(border=True):
         # V1. Edad
         edad = st.number_input("Edad del Paciente", 18, 110, 75)
         p_edad = 1 if edad > 65 else 0
-        puntos += p_edad; factores['p_edad'] = p_edad
         st.markdown(f"*(Edad > 65 = +{p_edad} pto)*")
 
         # V2. Residencia
         p_residencia = st.checkbox("Vive en Residencia/Asilo (+1)", key="p_residencia")
-        puntos += (1 if p_residencia else 0); factores['p_residencia'] = p_residencia
         
         # V3. Fisiológico (≥2 alteraciones)
         st.markdown("##### Alteraciones Fisiológicas (V3)")
@@ -55,7 +45,6 @@ with st.container(border=True):
         }
         num_fisio_activas = sum(fisio_opts.values())
         p_fisiologico = 1 if num_fisio_activas >= 2 else 0
-        puntos += p_fisiologico; factores['p_fisiologico'] = p_fisiologico
         st.markdown(f"*(≥2 activas = +{p_fisiologico} pto)*")
 
     # --- Columna 2: Comorbilidades y Otros ---
@@ -74,7 +63,6 @@ with st.container(border=True):
             "Hepatopatía": st.checkbox("Hepatopatía Mod/Sev (+1)", key="c_hepato")
         }
         p_comorb = sum(comorb_opts.values())
-        puntos += p_comorb; factores['p_comorb'] = p_comorb; factores['comorb_detalles'] = [k for k, v in comorb_opts.items() if v]
         st.markdown(f"*(Total V4: +{p_comorb} pto(s))*")
 
         # V5-V8. Otros Factores (+1 pto c/u)
@@ -84,16 +72,6 @@ with st.container(border=True):
         p_proteinuria = st.checkbox("Proteinuria (V7) (+1)", key="p_proteinuria")
         p_ecg = st.checkbox("ECG Anormal (V8) (+1)", key="p_ecg")
         
-        puntos += (1 if p_cognitivo else 0)
-        puntos += (1 if p_ingreso else 0)
-        puntos += (1 if p_proteinuria else 0)
-        puntos += (1 if p_ecg else 0)
-        
-        factores['p_cognitivo'] = p_cognitivo
-        factores['p_ingreso'] = p_ingreso
-        factores['p_proteinuria'] = p_proteinuria
-        factores['p_ecg'] = p_ecg
-        
     # --- Columna 3: Fragilidad ---
     with col_v9:
         st.markdown("#### III. Fragilidad (V9)")
@@ -103,18 +81,23 @@ with st.container(border=True):
             key="v9_fragilidad"
         )
         p_fragilidad = len(frag_list)
-        puntos += p_fragilidad; factores['p_fragilidad'] = p_fragilidad; factores['frag_detalles'] = frag_list
         st.markdown(f"*(Total V9: +{p_fragilidad} pto(s))*")
 
 # --- 3. RESULTADO Y ESTADO DE SESIÓN ---
-score_final = min(puntos, 20)
-
-# 💾 Guardar el score y los factores en el estado de sesión para otras páginas
-st.session_state['current_score'] = score_final
-st.session_state['current_factors'] = factores 
-
-prob_final = round(calcular_probabilidad_math(score_final), 1)
-color_actual = obtener_color_riesgo(score_final)
+# 💾 Un único objeto inmutable con los factores empaquetados y los valores derivados,
+# que las páginas de Decisión Compartida y Prehabilitación leen sin recalcular
+contexto = ContextoPaciente.desde_formulario(
+    edad, p_residencia,
+    fisio=[k for k, v in fisio_opts.items() if v],
+    comorb=[k for k, v in comorb_opts.items() if v],
+    frail=frag_list,
+    cognitivo=p_cognitivo, ingreso=p_ingreso, proteinuria=p_proteinuria, ecg=p_ecg,
+)
+st.session_state[CLAVE_SESION] = contexto
+
+score_final = contexto.score
+prob_final = round(contexto.prob, 1)
+color_actual = contexto.color
 
 st.markdown("---")
 
@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
-from utils import obtener_color_riesgo
+from optimizador import ranking_paciente
+from prehabilitacion import plan_para_mascara
+from contexto import ContextoPaciente, CLAVE_SESION
 import numpy as np
 
 # --- CONFIGURACIÓN DE LA PÁGINA ---
@@ -10,25 +12,18 @@ st.title("💪 Plan de Prehabilitación y Optimización Específico")
 st.markdown("Recomendaciones basadas en los factores de riesgo marcados en la Calculadora CriSTAL.")
 
 # --- CONEXIÓN DE SESIÓN Y CÁLCULOS ---
-score_final = st.session_state.get('current_score')
-factores = st.session_state.get('current_factors', {})
+# El contexto de la Calculadora ya trae el score, el color y la máscara del plan
+contexto = st.session_state.get(CLAVE_SESION)
 
 # Fallback si no hay score en la sesión
-if score_final is None:
+if contexto is None:
     st.error("⚠️ **ERROR:** No se ha calculado el Score CriSTAL. Por favor, ve a la página 'Calculadora CriSTAL' primero.")
-    score_final = 0 # Usar 0 para evitar errores de cálculo
-    
-color_final = obtener_color_riesgo(score_final)
+    contexto = ContextoPaciente()  # Sin factores (score 0) para evitar errores de cálculo
+else:
+    contexto = contexto.actualizado()  # Si se recalibró el modelo, mismos factores con los coeficientes nuevos
 
-# Extraer factores relevantes para el plan
-p_edad = factores.get('p_edad', 0) > 0
-p_residencia = factores.get('p_residencia', False)
-p_fisiologico = factores.get('p_fisiologico', 0) > 0
-p_cognitivo = factores.get('p_cognitivo', False)
-p_comorb = factores.get('p_comorb', 0) > 0
-comorb_detalles = factores.get('comorb_detalles', [])
-p_fragilidad = factores.get('p_fragilidad', 0) > 0
-frag_detalles = factores.get('frag_detalles', [])
+score_final = contexto.score
+color_final = contexto.color
 
 # --- RESUMEN Y PLAN ---
 
@@ -59,60 +54,35 @@ with col_resumen:
 with col_plan:
     st.markdown("#### 2. Plan de Optimización Específico")
     
-    plan_generado = False
-    
-    # 1. Optimización Fisiológica Aguda (V3)
-    if p_fisiologico:
-        st.header("1️⃣ Estabilización Fisiológica (V3)")
-        st.error("🚨 **¡NO OPERAR!** Tratar estas alteraciones antes de cualquier cirugía electiva.")
-        st.write("""
-        * **Objetivo:** Estabilizar TA, FR, Pulso y Saturación. Corregir hipoglucemia y trastornos de conciencia.
-        * **Acción:** Monitorización intensiva, reanimación de fluidos si necesario, ajuste de medicación y/o ingreso en UCI.
-        """)
-        plan_generado = True
+    # El plan sale de la tabla de decisión compilada (prehabilitacion.py), la misma
+    # que se usa para generar los planes de toda la lista quirúrgica en lote
+    plan = plan_para_mascara(contexto.mascara_plan)
 
-    # 2. Optimización de Comorbilidades (V4)
-    if p_comorb:
-        st.header("2️⃣ Manejo de Comorbilidades (V4)")
-        st.warning("Se requiere interconsulta especializada y/o intensificación del tratamiento de base.")
-        
-        if any(c in comorb_detalles for c in ["ICC", "IAM Reciente", "ACV Reciente"]):
-             st.info("🩺 **Cardiovascular/Neurológico:** Interconsulta con Cardiología/Neurología. Optimizar TA, control de arritmias, y manejo de anticoagulación.")
-        
-        if "EPOC" in comorb_detalles:
-            st.info("🌬️ **Respiratorio:** Optimizar tratamiento broncodilatador, cese tabáquico, fisioterapia respiratoria.")
-        
-        if "IRC" in comorb_detalles:
-            st.info("🩸 **Renal:** Control de electrolitos y función renal. Evitar nefrotóxicos.")
-        
-        if "Hepatopatía" in comorb_detalles:
-            st.info("💊 **Hepatopatía:** Control estricto de la coagulación y valoración nutricional profunda.")
-        
-        plan_generado = True
+    seccion_actual = None
+    for seccion, estilo, texto, prioridad, servicio in plan:
+        if seccion != seccion_actual:
+            st.header(seccion)
+            seccion_actual = seccion
+        getattr(st, estilo)(texto)
 
-    # 3. Optimización de Fragilidad y Nutrición (V9, V1, V2)
-    if p_fragilidad or p_edad or p_residencia or p_cognitivo:
-        st.header("3️⃣ Fragilidad y Estado Funcional (V9/V5)")
-        st.info("Programa de prehabilitación multimodal: Nutrición, Ejercicio y Soporte Social/Cognitivo.")
-        
-        # Nutrición
-        if "Pérdida Peso >5%" in frag_detalles:
-            st.info("🍎 **Nutrición:** Evaluación por Nutrición. Suplementos proteicos orales (SNO) e hipercalóricos para revertir malnutrición.")
-        else:
-            st.info("🍎 **Nutrición Básica:** Suplementación proteica profiláctica y control de la anemia.")
-            
-        # Ejercicio
-        if any(c in frag_detalles for c in ["Fatiga", "Resistencia (Escaleras)", "Deambulación"]):
-            st.info("🏃 **Ejercicio:** Fisioterapia individualizada. Programa supervisado de ejercicio aeróbico y entrenamiento de fuerza. Objetivo: mejorar la capacidad funcional.")
-        else:
-            st.info("🏃 **Ejercicio Básico:** Fomentar caminata diaria y actividad funcional moderada.")
-            
-        # Cognitivo/Social
-        if p_cognitivo or p_residencia:
-            st.info("🧠 **Neuro/Social:** Valoración cognitiva y social (Trabajo Social). Soporte para el cuidado postoperatorio y gestión de la demencia/delirium.")
-            
-        plan_generado = True
+# --- SIMULACIÓN DE INTERVENCIONES (WHAT-IF) ---
+st.markdown("---")
+st.subheader("📉 Impacto Estimado de las Intervenciones")
 
-    if not plan_generado:
-        st.header("✨ **Medidas Generales**")
-        st.success("Paciente de bajo riesgo. Fomentar cese de tabaco/alcohol y educación preoperatoria estándar.")
+ranking = ranking_paciente(contexto.puntos, contexto.activos)
+if ranking.empty:
+    st.info("El paciente no presenta factores modificables (fisiología aguda, ítems FRAIL tratables, ICC o EPOC).")
+else:
+    st.markdown("Combinaciones de intervenciones ordenadas por la reducción de mortalidad estimada a 30 días que lograrían si corrigen el factor correspondiente.")
+    st.dataframe(
+        ranking,
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            'Intervenciones': st.column_config.TextColumn("Intervención(es)", width="large"),
+            'Nº': st.column_config.NumberColumn("Nº"),
+            'Score': st.column_config.NumberColumn("Score Resultante"),
+            'Mortalidad_%': st.column_config.NumberColumn("Mortalidad (%)", format="%.1f"),
+            'Reduccion_%': st.column_config.NumberColumn("Reducción (puntos %)", format="%.1f"),
+        }
+    )
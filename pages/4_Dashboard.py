@@ -1,18 +1,173 @@
 import streamlit as st
 import pandas as pd
-import altair as alt
-from utils import get_mock_patient_data, obtener_color_riesgo, categorizar_score
+from utils import get_mock_patient_data, CATEGORIAS_RIESGO, CODIGO_ALTO, SERVICIOS
+from indices import IndiceCohorte, FRAIL_MAX, SCORE_MAX
+from tendencias import TendenciasCohorte, FRECUENCIAS
+from snapshots import cargar_cohorte_snapshot, version_actual
+from cache_compartida import CACHE
+from centros import centros, directorio_snapshots, clave_cache, leer_resumen, ResumenCohorte, CENTRO_UNICO, RED
+from triaje import triaje, DESEMPATES
+from graficos import (conteo_categorias, conteo_factores, histograma_score, grafico_categorias,
+                      grafico_factores, grafico_histograma, grafico_tendencias, categoria_seleccionada,
+                      nota_reduccion, MAX_FILAS_GRAFICO)
 
 # --- CONFIGURACIÓN DE LA PÁGINA ---
 st.set_page_config(page_title="Dashboard CriSTAL", page_icon="📊", layout="wide")
 
-# Cargar datos simulados
-df = get_mock_patient_data()
+# Nombres legibles de los factores de la cohorte
+NOMBRES_FACTORES = {
+    'Edad_65+': 'Edad > 65',
+    'Fragilidad': 'Síndrome de Fragilidad',
+    'Comorbilidad_ICC': 'Insuficiencia Cardíaca (ICC)',
+    'Comorbilidad_EPOC': 'EPOC',
+    'Fisiologico_Agudo': 'Alteración Fisiológica Aguda',
+    'Deterioro_Cognitivo': 'Deterioro Cognitivo',
+}
+
+try:
+    CENTROS = centros(st.secrets["gcp"])
+except Exception:
+    CENTROS = centros()  # Sin secrets: un único centro con datos simulados
+
+def construir_cohorte(centro):
+    """Cohorte de un centro (su snapshot si existe; si no, datos simulados) con sus índices y agregados."""
+    df = cargar_cohorte_snapshot(directorio_snapshots(centro))
+    simulados = df is None
+    if simulados:
+        df = get_mock_patient_data()
+    indice = IndiceCohorte.desde_cohorte(df, factores=list(NOMBRES_FACTORES))
+    return df, indice, TendenciasCohorte.desde_cohorte(df), simulados
+
+def version_centro(centro):
+    return version_actual(directorio_snapshots(centro)) or "simulados"
+
+# Un solo proceso del servidor construye la cohorte de cada centro por versión de su
+# snapshot (caché compartida en disco); el resto la lee ya construida. Al publicarse
+# un snapshot nuevo de un centro solo se reconstruye ese centro. No se memoriza con
+# st.cache_resource: la caché compartida ya guarda en cada proceso la versión leída
+# y, mientras otro proceso construye la nueva, sirve la anterior sin fijarla bajo la
+# versión nueva (la siguiente ejecución de la página ya ve la nueva).
+def cargar_cohorte(centro, version):
+    return CACHE.obtener(clave_cache("dashboard", centro), version, lambda: construir_cohorte(centro))[1]
+
+# Resumen aditivo de cada centro (unos cientos de números): la vista de red los combina.
+# Se publica con cada snapshot (centros.exportar_snapshot_centro), así que basta leerlo;
+# la versión forma parte de la clave y el fichero de una versión no cambia nunca.
+@st.cache_resource(show_spinner=False)
+def cargar_resumen(centro, version):
+    resumen = leer_resumen(centro, version) if version != "simulados" else None
+    if resumen is not None:
+        return resumen
+    # Datos simulados o snapshot exportado antes de publicarse los resúmenes
+    def construir():
+        df, _, tendencias, _ = cargar_cohorte(centro, version)
+        return ResumenCohorte.desde_cohorte(df, centro, list(NOMBRES_FACTORES), tendencias)
+    return CACHE.obtener(clave_cache("resumen", centro), version, construir)[1]
+
+# --- SELECCIÓN DE CENTRO ---
+if len(CENTROS) > 1:
+    centro = st.sidebar.selectbox(
+        "🏥 Centro", [*CENTROS, RED], key="centro",
+        format_func=lambda c: "Red (todos los centros)" if c == RED else CENTROS[c]["nombre"],
+    )
+else:
+    centro = next(iter(CENTROS))
+
+metricas_tendencia = ['Score_Medio', 'Mortalidad_Estimada_%', 'Alto_Critico_%', 'Mortalidad_Observada_%']
+
+# --- VISTA DE RED (SOLO AGREGADOS PRECALCULADOS POR CENTRO) ---
+if centro == RED:
+    versiones = {c: version_centro(c) for c in CENTROS}
+    # Los centros sin snapshot solo tienen datos simulados: no se suman a los totales de la red
+    # (salvo que ninguno lo tenga, para que la vista siga sirviendo de demostración)
+    sin_snapshot = [c for c, v in versiones.items() if v == "simulados"]
+    todos_simulados = len(sin_snapshot) == len(CENTROS)
+    incluidos = list(CENTROS) if todos_simulados else [c for c in CENTROS if c not in sin_snapshot]
+    resumenes = [cargar_resumen(c, versiones[c]) for c in incluidos]
+    red = ResumenCohorte.combinar(resumenes)
+    kpis = red.indicadores()
+
+    st.title("📊 Dashboard de la Red de Centros")
+    excluidos = "" if todos_simulados else ", ".join(CENTROS[c]["nombre"] for c in sin_snapshot)
+    if todos_simulados:
+        st.warning("Ningún centro tiene todavía un snapshot del registro: la red muestra datos simulados.")
+    elif excluidos:
+        st.warning(f"Centros sin snapshot del registro, excluidos de los totales: {excluidos}. "
+                   "Exporte su snapshot con `CRISTAL_CENTRO=... python snapshots.py`.")
+    st.caption(f"{kpis['Pacientes']} pacientes en {len(incluidos)} de {len(CENTROS)} centros"
+               + (f" (sin snapshot: {excluidos})" if excluidos else "")
+               + ". Los filtros de cohorte y el triaje están disponibles en la vista de cada centro.")
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Pacientes Registrados", kpis['Pacientes'])
+    col2.metric("Score CriSTAL Promedio", f"{kpis['Score_Medio']:.1f}")
+    col3.metric("Mortalidad Media Estimada", f"{kpis['Mortalidad_Estimada_%']:.1f}%")
+    col4.metric("Riesgo Alto/Crítico", f"{kpis['Alto_Critico']}", delta=f"{kpis['Alto_Critico_%']:.1f}% del total")
+
+    st.markdown("---")
+    st.subheader("Comparación entre Centros")
+    st.dataframe(
+        pd.DataFrame([{"Centro": CENTROS[r.centros[0]]["nombre"], **r.indicadores()} for r in resumenes]),
+        column_config={
+            "Score_Medio": st.column_config.NumberColumn("Score medio", format="%.1f"),
+            "Mortalidad_Estimada_%": st.column_config.NumberColumn("Mortalidad estimada", format="%.1f%%"),
+            "Alto_Critico": st.column_config.NumberColumn("Alto/Crítico"),
+            "Alto_Critico_%": st.column_config.NumberColumn("Alto/Crítico %", format="%.1f%%"),
+            "Mortalidad_Observada_%": st.column_config.NumberColumn("Mortalidad observada", format="%.1f%%"),
+        },
+        hide_index=True,
+        use_container_width=True,
+    )
+
+    st.markdown("---")
+    st.subheader("Distribución de Riesgo CriSTAL")
+    st.altair_chart(grafico_categorias(red.conteo_categorias()), use_container_width=True)
+    st.altair_chart(grafico_histograma(red.histograma_score()), use_container_width=True)
+    st.altair_chart(grafico_factores(red.conteo_factores(NOMBRES_FACTORES)), use_container_width=True)
+
+    st.markdown("---")
+    st.subheader("Evolución Temporal de la Red")
+    freq = st.radio("Agrupación", list(FRECUENCIAS), format_func=FRECUENCIAS.get, horizontal=True)
+    serie = red.tendencias.serie(freq, max_periodos=MAX_FILAS_GRAFICO)
+    if nota_reduccion(serie):
+        st.caption(nota_reduccion(serie))
+    st.altair_chart(grafico_tendencias(serie, metricas_tendencia), use_container_width=True)
+    st.stop()
+
+df_total, indice, tendencias, datos_simulados = cargar_cohorte(centro, version_centro(centro))
+
+# --- CONSULTA DE COHORTE (DRILL-DOWN) ---
+with st.sidebar:
+    st.header("🔎 Filtrar Cohorte")
+    f_todos = st.multiselect("Con todos estos factores (Y)", list(NOMBRES_FACTORES), format_func=NOMBRES_FACTORES.get)
+    f_alguno = st.multiselect("Con alguno de estos (O)", list(NOMBRES_FACTORES), format_func=NOMBRES_FACTORES.get)
+    f_ninguno = st.multiselect("Sin estos factores (NO)", list(NOMBRES_FACTORES), format_func=NOMBRES_FACTORES.get)
+    score_min = st.slider("Score CriSTAL mínimo", 0, SCORE_MAX, 0)
+    frail_min = st.slider("Ítems FRAIL mínimos", 0, FRAIL_MAX, 0)
+    meses_periodo = {"Todo": None, "Último mes": 1, "Último trimestre": 3, "Último año": 12}
+    periodo = st.selectbox("Periodo de registro", list(meses_periodo))
+
+consulta = (
+    indice.consultar(todos=f_todos, alguno=f_alguno, ninguno=f_ninguno)
+    & indice.score_min(score_min)
+    & indice.frail_min(frail_min)
+)
+if meses_periodo[periodo] is not None:
+    ultimo_mes = df_total['Fecha_Registro'].max().to_period('M')
+    consulta = consulta & indice.periodo(ultimo_mes - (meses_periodo[periodo] - 1))
+
+df = df_total.iloc[consulta.filas()]
 
 # --- TÍTULO Y DESCRIPCIÓN ---
 st.title("📊 Dashboard de Cohorte de Pacientes")
-st.markdown("Visualización analítica de los pacientes registrados en el sistema CriSTAL.")
-st.caption(f"Mostrando datos simulados de {len(df)} pacientes.")
+st.markdown("Visualización analítica de los pacientes registrados en el sistema CriSTAL"
+            + ("." if centro == CENTRO_UNICO else f" ({CENTROS[centro]['nombre']})."))
+origen = "datos simulados" if datos_simulados else "el último snapshot del registro"
+st.caption(f"Mostrando {len(df)} de {len(df_total)} pacientes ({origen}).")
+
+if df.empty:
+    st.warning("Ningún paciente cumple los filtros seleccionados.")
+    st.stop()
 
 # --- 1. MÉTRICAS CLAVE (KPIs) ---
 st.subheader("Métricas de Cohorte")
@@ -20,7 +175,8 @@ col1, col2, col3, col4 = st.columns(4)
 
 total_pacientes = len(df)
 avg_score = df['Score_CriSTAL'].mean()
-pacientes_alto_critico = df[df['Categoria_Riesgo'].str.startswith('3') | df['Categoria_Riesgo'].str.startswith('4')]
+# Filtrado sobre los códigos enteros de la categoría (0-3), sin recorrer cadenas
+pacientes_alto_critico = df[df['Categoria_Riesgo'].cat.codes >= CODIGO_ALTO]
 
 col1.metric("Pacientes Registrados", total_pacientes)
 col2.metric("Score CriSTAL Promedio", f"{avg_score:.1f}")
@@ -33,67 +189,76 @@ st.markdown("---")
 # --- 2. DISTRIBUCIÓN DEL RIESGO ---
 st.subheader("Distribución de Riesgo CriSTAL")
 
-# Preparar datos para el gráfico de barras/tarta
-df_dist = df.groupby('Categoria_Riesgo').size().reset_index(name='Cuenta')
-df_dist['Porcentaje'] = (df_dist['Cuenta'] / total_pacientes) * 100
-
-# Obtener colores fijos para las categorías (para consistencia)
-color_map = {
-    '1. Bajo (<8)': obtener_color_riesgo(0),      # Verde
-    '2. Intermedio (8-11)': obtener_color_riesgo(10), # Amarillo
-    '3. Alto (12-13)': obtener_color_riesgo(13),   # Naranja
-    '4. Crítico (>13)': obtener_color_riesgo(15)   # Rojo
-}
+# Los gráficos solo reciben agregados calculados en servidor sobre los índices de bits
+df_dist = conteo_categorias(indice, consulta)
+evento = st.altair_chart(grafico_categorias(df_dist), use_container_width=True,
+                         on_select="rerun", key="chart_categorias")
 
-# Gráfico de barras
-chart_bar = alt.Chart(df_dist).mark_bar().encode(
-    x=alt.X('Categoria_Riesgo', title='Categoría de Riesgo'),
-    y=alt.Y('Cuenta', title='Nº de Pacientes'),
-    tooltip=['Categoria_Riesgo', 'Cuenta', alt.Tooltip('Porcentaje', format='.1f')],
-    color=alt.Color('Categoria_Riesgo', 
-                    scale=alt.Scale(domain=list(color_map.keys()), range=list(color_map.values())),
-                    legend=None
-                   )
-).properties(
-    title='Pacientes por Nivel de Riesgo'
-).interactive() # Habilitar zoom y paneo
-
-st.altair_chart(chart_bar, use_container_width=True)
+st.altair_chart(grafico_histograma(histograma_score(indice, consulta)), use_container_width=True)
 
 st.markdown("---")
 
 # --- 3. ANÁLISIS DE FACTORES DE RIESGO ---
 st.subheader("Frecuencia de Factores Específicos")
 
-# Preparar datos para el gráfico de factores
-factor_cols = ['Edad_65+', 'Fragilidad', 'Comorbilidad_ICC', 'Comorbilidad_EPOC', 
-               'Fisiologico_Agudo', 'Deterioro_Cognitivo']
+st.altair_chart(grafico_factores(conteo_factores(indice, consulta, NOMBRES_FACTORES)), use_container_width=True)
 
-# Contar la frecuencia de los factores activos (True)
-factor_counts = df[factor_cols].sum().reset_index()
-factor_counts.columns = ['Factor', 'Cuenta']
+# Drill-down: al clicar una categoría se piden sus agregados, nunca las filas
+categoria = categoria_seleccionada(evento)
+if categoria is not None:
+    consulta_cat = consulta & indice.categoria(CATEGORIAS_RIESGO.index(categoria))
+    st.altair_chart(
+        grafico_factores(conteo_factores(indice, consulta_cat, NOMBRES_FACTORES),
+                         titulo=f'Factores en la categoría {categoria}'),
+        use_container_width=True
+    )
 
-# Renombrar factores para una mejor visualización en el gráfico
-factor_counts['Factor'] = factor_counts['Factor'].replace({
-    'Edad_65+': 'Edad > 65',
-    'Fragilidad': 'Síndrome de Fragilidad',
-    'Comorbilidad_ICC': 'Insuficiencia Cardíaca (ICC)',
-    'Comorbilidad_EPOC': 'EPOC',
-    'Fisiologico_Agudo': 'Alteración Fisiológica Aguda',
-    'Deterioro_Cognitivo': 'Deterioro Cognitivo',
-})
-
-# Gráfico de barras horizontales
-chart_factors = alt.Chart(factor_counts).mark_bar().encode(
-    x=alt.X('Cuenta', title='Recuento de Pacientes con Factor Activo'),
-    y=alt.Y('Factor', sort='x', title='Factor de Riesgo'),
-    color=alt.value('#3498db'), # Color azul para destacar los factores
-    tooltip=['Factor', 'Cuenta']
-).properties(
-    title='Factores de Riesgo más Prevalentes'
-).interactive()
-
-st.altair_chart(chart_factors, use_container_width=True)
+st.markdown("---")
+
+# --- 4. TENDENCIAS TEMPORALES ---
+st.subheader("Evolución Temporal del Registro")
+st.caption("Calculado sobre el registro completo a partir de agregados por periodo (no depende de los filtros).")
+
+col_freq, col_ventana = st.columns(2)
+freq = col_freq.radio("Agrupación", list(FRECUENCIAS), format_func=FRECUENCIAS.get, horizontal=True)
+ventana = col_ventana.number_input("Ventana móvil (nº de periodos)", 1, 12, 1)
+
+serie = tendencias.serie(freq, ventana=ventana, max_periodos=MAX_FILAS_GRAFICO)
+if nota_reduccion(serie):
+    st.caption(nota_reduccion(serie))
+st.altair_chart(grafico_tendencias(serie, metricas_tendencia), use_container_width=True)
+
+st.markdown("---")
+
+# --- 5. TRIAJE DE LA LISTA DE ESPERA ---
+st.subheader("Triaje de Lista de Espera Quirúrgica")
+st.caption("Pacientes de mayor riesgo según su última valoración (registro completo, independiente de los filtros de la barra lateral).")
+
+col_serv, col_fechas = st.columns(2)
+servicios_triaje = col_serv.multiselect("Servicio", SERVICIOS, placeholder="Todos los servicios")
+fechas_triaje = col_fechas.date_input(
+    "Valorados entre", (df_total['Fecha_Registro'].min().date(), df_total['Fecha_Registro'].max().date())
+)
+col_k, col_desempate = st.columns(2)
+k_triaje = col_k.number_input("Nº de pacientes", 5, 500, 25, step=5)
+desempate = col_desempate.radio("Desempate", list(DESEMPATES), format_func=DESEMPATES.get, horizontal=True)
+
+desde, hasta = (list(fechas_triaje) + [None, None])[:2]
+top = triaje(
+    df_total, k_triaje, servicios=servicios_triaje, desempate=desempate,
+    desde=desde, hasta=None if hasta is None else pd.Timestamp(hasta) + pd.Timedelta(days=1, microseconds=-1),
+)
+st.dataframe(
+    top,
+    column_config={
+        "Fecha_Registro": st.column_config.DatetimeColumn("Fecha valoración", format="YYYY-MM-DD"),
+        "Prob_Mortalidad": st.column_config.NumberColumn("Mortalidad estimada", format="%.1f%%"),
+        "Dias_Espera": st.column_config.NumberColumn("Días en espera"),
+        "Delta_Score": st.column_config.NumberColumn("Δ Score", format="%+d"),
+    },
+    hide_index=True,
+    use_container_width=True,
+)
 
 st.markdown("---")
 st.info("💡 **Conclusión del Dashboard:** El dashboard permite identificar rápidamente si la mayoría de los pacientes se encuentran en riesgo bajo o si existe una alta carga de riesgo, y en qué factores específicos debemos concentrar los esfuerzos de prehabilitación.")
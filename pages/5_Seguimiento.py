@@ -0,0 +1,100 @@
+import streamlit as st
+import pandas as pd
+
+from fragmentos import abrir_registro, hojas_registro
+from centros import centros, config_centro
+from seguimiento import AgendaSeguimiento, OUTCOMES, DIAS_SEGUIMIENTO, VENTANA_SEGUIMIENTO
+
+# --- CONFIGURACIÓN DE LA PÁGINA ---
+st.set_page_config(page_title="Seguimiento a 30 días", page_icon="📅", layout="wide")
+
+st.title("📅 Seguimiento del Outcome a 30 días")
+st.markdown(f"Registros cuya ventana de {DIAS_SEGUIMIENTO} días ha vencido sin outcome registrado.")
+
+# --- AGENDAS COMPARTIDAS (UNA POR HOJA, CENTRO Y SERVIDOR) ---
+@st.cache_resource
+def obtener_registro(centro):
+    """Conecta una vez por proceso y centro. Las agendas (una por hoja o fragmento) se crean bajo demanda."""
+    return abrir_registro(config_centro(st.secrets["gcp"], centro)), {}
+
+try:
+    CENTROS = centros(st.secrets["gcp"])
+    if len(CENTROS) > 1:
+        centro = st.sidebar.selectbox("🏥 Centro", list(CENTROS), format_func=lambda c: CENTROS[c]["nombre"], key="centro")
+    else:
+        centro = next(iter(CENTROS))
+    registro, agendas = obtener_registro(centro)
+    hojas = {}
+    # Con el registro fragmentado solo se abren los fragmentos del último periodo
+    for ws in hojas_registro(registro, desde=pd.Timestamp.now() - VENTANA_SEGUIMIENTO):
+        if ws.title in agendas:
+            agendas[ws.title].actualizar(ws)  # Solo las filas nuevas
+        else:
+            agendas[ws.title] = AgendaSeguimiento.desde_hoja(ws)
+        hojas[ws.title] = ws
+except Exception as e:
+    st.error(f"⚠️ No se pudo conectar a Google Sheets: {e}")
+    st.stop()
+
+if not hojas:
+    st.info("El registro todavía no tiene fragmentos con valoraciones recientes.")
+    st.stop()
+
+# --- LISTA DE TRABAJO ---
+descartados = st.session_state.pop("seguimiento_descartados", None)
+if descartados:
+    st.warning(f"⚠️ No se guardó el outcome de {', '.join(map(str, descartados))}: la hoja se ha "
+               "reordenado o editado y esas filas ya no correspondían a la valoración. "
+               "La lista se ha vuelto a leer; revíselos de nuevo.")
+
+pendientes = pd.concat(
+    [agendas[t].pendientes().assign(Hoja=t) for t in hojas], ignore_index=True
+).sort_values("Vencimiento", ignore_index=True)
+
+col1, col2 = st.columns(2)
+col1.metric("Seguimientos vencidos", len(pendientes))
+col2.metric("Vencen en los próximos 7 días", sum(agendas[t].proximos(7) for t in hojas))
+
+if len(pendientes) == 0:
+    st.success("✅ No hay seguimientos pendientes.")
+    st.stop()
+
+st.markdown("Marque el estado a 30 días y guarde: todos los cambios se escriben en una sola operación.")
+
+editado = st.data_editor(
+    pendientes.assign(Outcome="Pendiente"),
+    column_config={
+        "Outcome": st.column_config.SelectboxColumn(
+            "Outcome a 30 días", options=["Pendiente", *OUTCOMES], required=True
+        ),
+        "Fila_Hoja": None,  # Ocultas: solo identifican la fila a actualizar
+        "Hoja": None,
+        "Fecha": st.column_config.DatetimeColumn("Fecha registro", format="YYYY-MM-DD HH:mm"),
+        "Vencimiento": st.column_config.DatetimeColumn("Vencimiento", format="YYYY-MM-DD"),
+        "Dias_Retraso": st.column_config.NumberColumn("Días de retraso"),
+    },
+    disabled=["ID", "Fecha", "Vencimiento", "Dias_Retraso"],
+    hide_index=True,
+    use_container_width=True,
+    key="editor_seguimiento",
+)
+
+cerrados = editado[editado["Outcome"] != "Pendiente"]
+if st.button(f"💾 Guardar {len(cerrados)} outcome(s)", disabled=len(cerrados) == 0, type="primary"):
+    try:
+        # Un único batch_update por hoja (uno solo salvo que los pendientes crucen periodos)
+        n, descartadas = 0, []
+        for t, grupo in cerrados.groupby("Hoja"):
+            escritas, no_coinciden = agendas[t].registrar_outcomes(
+                hojas[t], dict(zip(grupo["Fila_Hoja"].astype(int), grupo["Outcome"].map(OUTCOMES)))
+            )
+            n += escritas
+            descartadas += grupo[grupo["Fila_Hoja"].isin(no_coinciden)]["ID"].tolist()
+        st.toast(f"{n} seguimiento(s) cerrados.")
+        if descartadas:
+            # Con st.rerun el aviso se perdería: se guarda para la siguiente ejecución
+            st.session_state["seguimiento_descartados"] = descartadas
+        del st.session_state["editor_seguimiento"]
+        st.rerun()
+    except Exception as e:
+        st.error(f"Error al guardar en la nube: {e}")
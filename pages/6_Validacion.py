@@ -0,0 +1,99 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+
+from utils import get_mock_patient_data
+from snapshots import cargar_cohorte_snapshot, version_actual
+from centros import centros, directorio_snapshots, RED
+from modelos import MODELOS, registrar_modelo, recalibrar, metricas_modelos, tabla_calibracion
+from graficos import grafico_calibracion
+
+# --- CONFIGURACIÓN DE LA PÁGINA ---
+st.set_page_config(page_title="Validación de Modelos", page_icon="🧪", layout="wide")
+
+st.title("🧪 Validación y Comparación de Modelos")
+st.markdown("Todos los modelos de probabilidad registrados, evaluados a la vez sobre los pacientes con outcome a 30 días conocido.")
+
+try:
+    CENTROS = centros(st.secrets["gcp"])
+except Exception:
+    CENTROS = centros()
+
+@st.cache_resource(max_entries=len(CENTROS))
+def cargar_validacion(centro, version):
+    """Scores y outcomes de la cohorte de un centro (snapshot vigente o datos simulados)."""
+    df = cargar_cohorte_snapshot(directorio_snapshots(centro))
+    simulados = df is None
+    if simulados:
+        df = get_mock_patient_data()
+    return df['Score_CriSTAL'].to_numpy(), df['Outcome_30dias'].to_numpy(dtype='float64'), simulados
+
+def version_centro(centro):
+    return version_actual(directorio_snapshots(centro)) or "simulados"
+
+if len(CENTROS) > 1:
+    centro = st.sidebar.selectbox(
+        "🏥 Centro", [*CENTROS, RED], key="centro",
+        format_func=lambda c: "Red (todos los centros)" if c == RED else CENTROS[c]["nombre"],
+    )
+else:
+    centro = next(iter(CENTROS))
+
+if centro == RED:
+    # Solo se concatenan los vectores score/outcome ya cargados de cada centro
+    partes = [cargar_validacion(c, version_centro(c)) for c in CENTROS]
+    scores = np.concatenate([p[0] for p in partes])
+    outcomes = np.concatenate([p[1] for p in partes])
+    datos_simulados = any(p[2] for p in partes)
+    version_datos = "red"
+else:
+    scores, outcomes, datos_simulados = cargar_validacion(centro, version_centro(centro))
+    version_datos = version_centro(centro)
+n_conocidos = int((~pd.isna(outcomes)).sum())
+origen = "datos simulados" if datos_simulados else "el último snapshot del registro"
+st.caption(f"{n_conocidos} de {len(scores)} pacientes con outcome conocido ({origen}).")
+
+# --- RECALIBRACIÓN LOCAL ---
+# Copia del registro por sesión: el modelo recalibrado no altera MODELOS para otras sesiones
+registro = dict(MODELOS)
+with st.sidebar:
+    st.header("⚙️ Modelos")
+    if st.checkbox("Incluir modelo recalibrado con la cohorte local", value=True):
+        try:
+            intercepto, pendiente, n = recalibrar(scores, outcomes)
+            registrar_modelo("Recalibrado local", intercepto, pendiente,
+                             version=f"{version_datos} (n={n})", registro=registro)
+        except ValueError as e:
+            st.warning(f"No se pudo recalibrar: {e}")
+    modelos = st.multiselect("Modelos a comparar", list(registro), default=list(registro))
+
+if not modelos:
+    st.info("Seleccione al menos un modelo.")
+    st.stop()
+
+# --- REGISTRO DE MODELOS ---
+st.subheader("Modelos Registrados")
+st.dataframe(
+    pd.DataFrame([{"Modelo": m, **{k: registro[m][k] for k in ("version", "tipo", "descripcion")}} for m in modelos]),
+    hide_index=True, use_container_width=True,
+)
+
+if n_conocidos == 0:
+    st.warning("Todavía no hay outcomes a 30 días registrados para validar los modelos.")
+    st.stop()
+
+# --- MÉTRICAS ---
+st.subheader("Métricas de Validación")
+metricas = metricas_modelos(scores, outcomes, modelos, registro)
+st.dataframe(
+    metricas.style.format({
+        "Mortalidad_Estimada_%": "{:.1f}", "Mortalidad_Observada_%": "{:.1f}", "O/E": "{:.2f}",
+        "Brier": "{:.4f}", "AUC": "{:.3f}", "Acotados_%": "{:.1f}",
+    }),
+    hide_index=True, use_container_width=True,
+)
+st.caption("O/E: muertes observadas / esperadas (1 = bien calibrado). Brier: menor es mejor. "
+           "Acotados: % de pacientes cuya probabilidad superaba el 100% y se ha limitado.")
+
+# --- CALIBRACIÓN ---
+st.altair_chart(grafico_calibracion(tabla_calibracion(scores, outcomes, modelos, registro), modelos), use_container_width=True)
@@ -0,0 +1,165 @@
+import json
+import base64
+import queue
+import threading
+from concurrent.futures import Future
+
+# --- LIBRERÍAS DE CONEXIÓN GSPREAD ---
+import gspread
+from google.oauth2.service_account import Credentials
+# ------------------------------------
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+# --- CONEXIÓN CON GOOGLE SHEETS ---
+
+def abrir_worksheet(gcp):
+    """
+    Abre la hoja de registro a partir de la sección [gcp] de los secrets.
+    Espera las claves service_account_base64, spreadsheet_id y worksheet_name.
+    """
+    json_service_account = base64.b64decode(gcp["service_account_base64"]).decode('utf-8')
+    service_account_info = json.loads(json_service_account)
+
+    credentials = Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
+    gc = gspread.authorize(credentials)
+
+    sh = gc.open_by_key(gcp["spreadsheet_id"])
+    return sh.worksheet(gcp["worksheet_name"])
+
+def asegurar_cabecera(ws, columnas):
+    """
+    Añade al final de la cabecera (fila 1) las columnas de `columnas` que falten,
+    ampliando la hoja si hace falta. Devuelve la cabecera final.
+    """
+    cabecera = ws.row_values(1)
+    faltan = [c for c in columnas if c not in cabecera]
+    if faltan:
+        if ws.col_count < len(cabecera) + len(faltan):
+            ws.add_cols(len(cabecera) + len(faltan) - ws.col_count)
+        ws.update(range_name=gspread.utils.rowcol_to_a1(1, len(cabecera) + 1), values=[faltan])
+        cabecera = cabecera + faltan
+    return cabecera
+
+
+def alinear_filas(filas, columnas, cabecera):
+    """
+    Reordena filas dadas en el orden de `columnas` al de `cabecera` (la de la hoja).
+    Las columnas de la hoja que no están en `columnas` quedan vacías.
+    """
+    if list(cabecera[:len(columnas)]) == list(columnas):
+        return filas  # Mismo orden (columnas ajenas, si las hay, al final)
+    posiciones = [columnas.index(c) if c in columnas else None for c in cabecera]
+    return [[fila[p] if p is not None else "" for p in posiciones] for fila in filas]
+
+
+class HojaAlineada:
+    """
+    Hoja de gspread cuyas escrituras (`append_row(s)`) reciben filas en el orden de
+    `columnas` y las guardan en el de su cabecera real: asegurar_cabecera añade las
+    columnas que faltan al final, así que una hoja antigua puede tener otro orden.
+    El resto de atributos y métodos son los de la hoja envuelta.
+    """
+
+    def __init__(self, ws, columnas):
+        self.ws = ws
+        self.columnas = list(columnas)
+        self.cabecera = asegurar_cabecera(ws, self.columnas)
+
+    def __getattr__(self, nombre):
+        return getattr(self.ws, nombre)
+
+    def append_rows(self, filas, **kwargs):
+        return self.ws.append_rows(alinear_filas(filas, self.columnas, self.cabecera), **kwargs)
+
+    def append_row(self, fila, **kwargs):
+        return self.ws.append_row(alinear_filas([fila], self.columnas, self.cabecera)[0], **kwargs)
+
+# --- ESCRITOR ÚNICO POR SERVIDOR ---
+
+def estado_escritura(futuro):
+    """Estado de una fila encolada: "pendiente", "guardado" o "error"."""
+    if not futuro.done():
+        return "pendiente"
+    return "error" if futuro.exception() is not None else "guardado"
+
+
+def podar_guardados(guardados, maximo):
+    """
+    Olvida los envíos más antiguos ya guardados hasta dejar `maximo` (in situ). Los
+    pendientes y los fallidos se conservan siempre para que el usuario llegue a verlos.
+    Cada elemento es (id_paciente, hora, Future).
+    """
+    sobran = len(guardados) - maximo
+    if sobran <= 0:
+        return guardados
+    confirmados = [i for i, (_, _, futuro) in enumerate(guardados) if estado_escritura(futuro) == "guardado"]
+    descartar = set(confirmados[:sobran])
+    guardados[:] = [g for i, g in enumerate(guardados) if i not in descartar]
+    return guardados
+
+
+class EscritorRegistro:
+    """
+    Hilo escritor único que serializa todas las escrituras al registro.
+
+    Las sesiones encolan filas con `encolar()` y reciben un Future. El hilo
+    agrupa las filas pendientes en una sola llamada `append_rows` por
+    intervalo de vaciado, de modo que una ráfaga de N envíos cuesta
+    ~N / max_lote peticiones HTTP en lugar de N.
+    """
+
+    def __init__(self, ws, intervalo=1.0, max_lote=500):
+        self.ws = ws
+        self.intervalo = intervalo
+        self.max_lote = max_lote
+        self._cola = queue.Queue()
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._bucle, name="EscritorRegistro", daemon=True)
+        self._hilo.start()
+
+    def encolar(self, fila):
+        """Añade una fila (lista de valores) a la cola. Devuelve un Future que se resuelve al guardarse."""
+        futuro = Future()
+        self._cola.put((list(fila), futuro))
+        return futuro
+
+    def cerrar(self, timeout=None):
+        """Detiene el hilo tras vaciar las filas pendientes."""
+        self._parar.set()
+        self._hilo.join(timeout)
+
+    def _recoger_lote(self):
+        """Bloquea hasta el primer elemento y recoge lo acumulado durante el intervalo."""
+        try:
+            lote = [self._cola.get(timeout=self.intervalo)]
+        except queue.Empty:
+            return []
+
+        self._parar.wait(self.intervalo)  # Deja que se acumulen más filas
+        while len(lote) < self.max_lote:
+            try:
+                lote.append(self._cola.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _bucle(self):
+        while not (self._parar.is_set() and self._cola.empty()):
+            lote = self._recoger_lote()
+            if lote:
+                self._escribir(lote)
+
+    def _escribir(self, lote):
+        filas = [fila for fila, _ in lote]
+        try:
+            self.ws.append_rows(filas, value_input_option='USER_ENTERED')
+        except Exception as e:
+            for _, futuro in lote:
+                futuro.set_exception(e)
+        else:
+            for _, futuro in lote:
+                futuro.set_result(len(filas))
@@ -0,0 +1,190 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from codificacion import OPCIONES_COMORB, OPCIONES_FRAIL, COLUMNAS_CODIFICADAS, bit, decodificar_serie
+
+# --- TABLA DE DECISIÓN DEL PLAN DE PREHABILITACIÓN ---
+# Las reglas dependen solo de estos 12 factores; cada combinación se codifica como
+# una máscara de bits y su plan se calcula una única vez (memoizado).
+
+BIT_FISIO, BIT_COMORB, BIT_CARDIO, BIT_EPOC, BIT_IRC, BIT_HEPATO = 0, 1, 2, 3, 4, 5
+BIT_FRAGIL, BIT_EDAD, BIT_RESIDENCIA, BIT_COGNITIVO, BIT_PESO, BIT_EJERCICIO = 6, 7, 8, 9, 10, 11
+
+CARDIO_NEURO = ["ICC", "IAM Reciente", "ACV Reciente"]
+FRAIL_EJERCICIO = ["Fatiga", "Resistencia (Escaleras)", "Deambulación"]
+
+SECCION_FISIO = "1️⃣ Estabilización Fisiológica (V3)"
+SECCION_COMORB = "2️⃣ Manejo de Comorbilidades (V4)"
+SECCION_FRAGIL = "3️⃣ Fragilidad y Estado Funcional (V9/V5)"
+SECCION_GENERAL = "✨ **Medidas Generales**"
+
+PRIORIDADES = ["Urgente", "Alta", "Media", "Baja"]
+
+
+def _tiene(mascara, *bits):
+    return any(mascara >> b & 1 for b in bits)
+
+# (sección, condición sobre la máscara, estilo de Streamlit, texto, prioridad, servicio de derivación)
+REGLAS = [
+    (SECCION_FISIO, lambda m: _tiene(m, BIT_FISIO), "error",
+     "🚨 **¡NO OPERAR!** Tratar estas alteraciones antes de cualquier cirugía electiva.", "Urgente", "UCI / Medicina Interna"),
+    (SECCION_FISIO, lambda m: _tiene(m, BIT_FISIO), "write", """
+        * **Objetivo:** Estabilizar TA, FR, Pulso y Saturación. Corregir hipoglucemia y trastornos de conciencia.
+        * **Acción:** Monitorización intensiva, reanimación de fluidos si necesario, ajuste de medicación y/o ingreso en UCI.
+        """, "Urgente", "UCI / Medicina Interna"),
+
+    (SECCION_COMORB, lambda m: _tiene(m, BIT_COMORB), "warning",
+     "Se requiere interconsulta especializada y/o intensificación del tratamiento de base.", "Alta", ""),
+    (SECCION_COMORB, lambda m: _tiene(m, BIT_CARDIO), "info",
+     "🩺 **Cardiovascular/Neurológico:** Interconsulta con Cardiología/Neurología. Optimizar TA, control de arritmias, y manejo de anticoagulación.", "Alta", "Cardiología / Neurología"),
+    (SECCION_COMORB, lambda m: _tiene(m, BIT_EPOC), "info",
+     "🌬️ **Respiratorio:** Optimizar tratamiento broncodilatador, cese tabáquico, fisioterapia respiratoria.", "Alta", "Neumología"),
+    (SECCION_COMORB, lambda m: _tiene(m, BIT_IRC), "info",
+     "🩸 **Renal:** Control de electrolitos y función renal. Evitar nefrotóxicos.", "Alta", "Nefrología"),
+    (SECCION_COMORB, lambda m: _tiene(m, BIT_HEPATO), "info",
+     "💊 **Hepatopatía:** Control estricto de la coagulación y valoración nutricional profunda.", "Alta", "Digestivo"),
+
+    (SECCION_FRAGIL, lambda m: _tiene(m, BIT_FRAGIL, BIT_EDAD, BIT_RESIDENCIA, BIT_COGNITIVO), "info",
+     "Programa de prehabilitación multimodal: Nutrición, Ejercicio y Soporte Social/Cognitivo.", "Media", ""),
+    (SECCION_FRAGIL, lambda m: _tiene(m, BIT_FRAGIL, BIT_EDAD, BIT_RESIDENCIA, BIT_COGNITIVO) and _tiene(m, BIT_PESO), "info",
+     "🍎 **Nutrición:** Evaluación por Nutrición. Suplementos proteicos orales (SNO) e hipercalóricos para revertir malnutrición.", "Alta", "Nutrición"),
+    (SECCION_FRAGIL, lambda m: _tiene(m, BIT_FRAGIL, BIT_EDAD, BIT_RESIDENCIA, BIT_COGNITIVO) and not _tiene(m, BIT_PESO), "info",
+     "🍎 **Nutrición Básica:** Suplementación proteica profiláctica y control de la anemia.", "Media", ""),
+    (SECCION_FRAGIL, lambda m: _tiene(m, BIT_FRAGIL, BIT_EDAD, BIT_RESIDENCIA, BIT_COGNITIVO) and _tiene(m, BIT_EJERCICIO), "info",
+     "🏃 **Ejercicio:** Fisioterapia individualizada. Programa supervisado de ejercicio aeróbico y entrenamiento de fuerza. Objetivo: mejorar la capacidad funcional.", "Alta", "Rehabilitación / Fisioterapia"),
+    (SECCION_FRAGIL, lambda m: _tiene(m, BIT_FRAGIL, BIT_EDAD, BIT_RESIDENCIA, BIT_COGNITIVO) and not _tiene(m, BIT_EJERCICIO), "info",
+     "🏃 **Ejercicio Básico:** Fomentar caminata diaria y actividad funcional moderada.", "Baja", ""),
+    (SECCION_FRAGIL, lambda m: _tiene(m, BIT_COGNITIVO, BIT_RESIDENCIA), "info",
+     "🧠 **Neuro/Social:** Valoración cognitiva y social (Trabajo Social). Soporte para el cuidado postoperatorio y gestión de la demencia/delirium.", "Media", "Trabajo Social / Geriatría"),
+]
+
+MEDIDAS_GENERALES = (SECCION_GENERAL, "success",
+                     "Paciente de bajo riesgo. Fomentar cese de tabaco/alcohol y educación preoperatoria estándar.", "Baja", "")
+
+# --- CONSTRUCCIÓN DE LA MÁSCARA ---
+
+def mascara_desde_contexto(contexto):
+    """Máscara de 12 bits a partir del ContextoPaciente de la Calculadora (contexto.py)."""
+    comorb = contexto.etiquetas_comorb()
+    frag = contexto.etiquetas_frail()
+    banderas = {
+        BIT_FISIO: contexto.p_fisiologico > 0,
+        BIT_COMORB: contexto.comorb != 0,
+        BIT_CARDIO: any(c in comorb for c in CARDIO_NEURO),
+        BIT_EPOC: "EPOC" in comorb,
+        BIT_IRC: "IRC" in comorb,
+        BIT_HEPATO: "Hepatopatía" in comorb,
+        BIT_FRAGIL: contexto.frail != 0,
+        BIT_EDAD: contexto.edad_65,
+        BIT_RESIDENCIA: contexto.residencia,
+        BIT_COGNITIVO: contexto.cognitivo,
+        BIT_PESO: "Pérdida Peso >5%" in frag,
+        BIT_EJERCICIO: any(c in frag for c in FRAIL_EJERCICIO),
+    }
+    return sum(1 << b for b, activo in banderas.items() if activo)
+
+
+def mascaras_desde_registro(reg):
+    """Versión vectorizada (n,) a partir del registro; usa las columnas codificadas o, si faltan, el texto."""
+    codigos = {}
+    for col, (dest, opciones) in COLUMNAS_CODIFICADAS.items():
+        codigos[dest] = reg[dest].to_numpy() if dest in reg.columns else decodificar_serie(reg[col], opciones)[0]
+    v4, v9 = codigos["V4_Comorbilidad_Codigo"], codigos["V9_Fragilidad_Codigo"]
+
+    banderas = {
+        BIT_FISIO: reg['V3_Fisiologico_Puntos'].to_numpy() > 0,
+        BIT_COMORB: v4 != 0,
+        BIT_CARDIO: np.logical_or.reduce([bit(v4, OPCIONES_COMORB, c) for c in CARDIO_NEURO]),
+        BIT_EPOC: bit(v4, OPCIONES_COMORB, "EPOC"),
+        BIT_IRC: bit(v4, OPCIONES_COMORB, "IRC"),
+        BIT_HEPATO: bit(v4, OPCIONES_COMORB, "Hepatopatía"),
+        BIT_FRAGIL: v9 != 0,
+        BIT_EDAD: reg['V1_Edad_Puntos'].to_numpy() > 0,
+        BIT_RESIDENCIA: reg['V2_Residencia_Puntos'].to_numpy() > 0,
+        BIT_COGNITIVO: reg['V5_Cognitivo_Puntos'].to_numpy() > 0,
+        BIT_PESO: bit(v9, OPCIONES_FRAIL, "Pérdida Peso >5%"),
+        BIT_EJERCICIO: np.logical_or.reduce([bit(v9, OPCIONES_FRAIL, c) for c in FRAIL_EJERCICIO]),
+    }
+    mascaras = np.zeros(len(reg), dtype=np.int32)
+    for b, activo in banderas.items():
+        mascaras |= activo.astype(np.int32) << b
+    return mascaras
+
+# --- PLANES ---
+
+@lru_cache(maxsize=None)
+def plan_para_mascara(mascara):
+    """
+    Plan estructurado (tupla de items) para una combinación de factores. Cada item es
+    (sección, estilo, texto, prioridad, servicio). Memoizado: como mucho 4096 combinaciones.
+    """
+    items = tuple((seccion, estilo, texto, prioridad, servicio)
+                  for seccion, condicion, estilo, texto, prioridad, servicio in REGLAS if condicion(mascara))
+    return items or (MEDIDAS_GENERALES,)
+
+
+def generar_planes(reg, columnas_id=('ID', 'Fecha', 'Score_Total')):
+    """
+    Planes de todo un listado en una llamada: se calcula el plan de cada máscara
+    distinta (memoizado) y se expande a los pacientes con índices vectorizados.
+    Devuelve un DataFrame largo: una fila por paciente e item del plan.
+    """
+    columnas = [c for c in columnas_id if c in reg.columns] + ['Seccion', 'Recomendacion', 'Prioridad', 'Servicio']
+    if len(reg) == 0:
+        # Sin pacientes pendientes (o un filtro de fechas vacío): tabla vacía con las mismas columnas
+        vacia = pd.DataFrame({c: reg[c] if c in reg.columns else pd.Series(dtype=object) for c in columnas})
+        vacia['Prioridad'] = pd.Categorical([], categories=PRIORIDADES, ordered=True)
+        return vacia.reset_index(drop=True)
+
+    mascaras = mascaras_desde_registro(reg)
+    unicas, inversa = np.unique(mascaras, return_inverse=True)
+
+    planes = [plan_para_mascara(int(m)) for m in unicas]
+    tam = np.array([len(p) for p in planes], dtype=np.int64)
+    items = pd.DataFrame([item for p in planes for item in p],
+                         columns=['Seccion', 'Estilo', 'Recomendacion', 'Prioridad', 'Servicio'])
+    inicio = np.concatenate([[0], np.cumsum(tam)[:-1]])
+
+    # Para cada paciente, los índices de los items de su plan dentro de `items`
+    n_items = tam[inversa]
+    paciente = np.repeat(np.arange(len(reg)), n_items)
+    desplazamiento = np.arange(n_items.sum()) - np.repeat(np.cumsum(n_items) - n_items, n_items)
+    fila_item = inicio[inversa][paciente] + desplazamiento
+
+    salida = reg.iloc[paciente][[c for c in columnas_id if c in reg.columns]].reset_index(drop=True)
+    salida = pd.concat([salida, items.iloc[fila_item].drop(columns='Estilo').reset_index(drop=True)], axis=1)[columnas]
+    # Texto en una sola línea para la exportación (las viñetas multilínea son para Streamlit)
+    salida['Recomendacion'] = salida['Recomendacion'].str.strip().str.replace(r"\s*\n\s*", " ", regex=True)
+    salida['Prioridad'] = pd.Categorical(salida['Prioridad'], categories=PRIORIDADES, ordered=True)
+    return salida
+
+
+def resumen_derivaciones(planes):
+    """Nº de pacientes por servicio de derivación (para organizar las agendas)."""
+    con_servicio = planes[planes['Servicio'] != ""]
+    return (con_servicio.groupby('Servicio')['ID'].nunique()
+            .sort_values(ascending=False).rename('Pacientes').reset_index())
+
+
+if __name__ == "__main__":
+    # Generación nocturna:  python prehabilitacion.py [ids_lista_quirurgica.csv] [planes.csv]
+    import sys
+    from snapshots import abrir_snapshot, registro_desde_tabla
+    from centros import directorio_snapshots
+
+    tabla = abrir_snapshot(directorio=directorio_snapshots())  # Centro de CRISTAL_CENTRO
+    if tabla is None:
+        sys.exit("No hay snapshot del registro. Ejecute antes: python snapshots.py")
+    reg = registro_desde_tabla(tabla)
+
+    if len(sys.argv) > 1:
+        ids = pd.read_csv(sys.argv[1], dtype=str).iloc[:, 0]
+        # Última valoración de cada paciente de la lista
+        reg = reg[reg['ID'].astype(str).isin(ids)].sort_values('Fecha').drop_duplicates('ID', keep='last')
+
+    planes = generar_planes(reg)
+    salida = sys.argv[2] if len(sys.argv) > 2 else "planes_prehabilitacion.csv"
+    planes.to_csv(salida, index=False)
+    print(f"{reg['ID'].nunique()} pacientes, {len(planes)} recomendaciones -> {salida}")
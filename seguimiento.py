@@ -0,0 +1,196 @@
+import heapq
+import threading
+
+import pandas as pd
+from gspread.utils import rowcol_to_a1
+
+# --- SEGUIMIENTO DEL OUTCOME A 30 DÍAS ---
+# Montículo por fecha de vencimiento (Fecha + 30 días) de los registros sin outcome.
+# Los que ya han vencido pasan a la lista de trabajo; los outcomes se escriben en
+# la hoja con un único batch_update, sea cual sea el nº de pacientes cerrados.
+# La hoja se ordena y edita a mano: antes de escribir se comprueba (en una sola
+# lectura) que cada fila sigue siendo la misma valoración (ID y Fecha).
+
+DIAS_SEGUIMIENTO = 30
+# Con el registro fragmentado, solo se buscan pendientes en los fragmentos de este último periodo
+VENTANA_SEGUIMIENTO = pd.Timedelta(days=365)
+COLUMNAS_SEGUIMIENTO = ["Fecha", "ID", "Outcome_30dias"]
+
+# Valores que se escriben en Outcome_30dias
+OUTCOMES = {"Vivo": 0, "Fallecido": 1}
+
+
+def _letra(columna):
+    """Letra de una columna (1 -> "A") para rangos abiertos tipo "A2:A"."""
+    return rowcol_to_a1(1, columna)[:-1]
+
+
+class AgendaSeguimiento:
+    """
+    Agenda de seguimientos pendientes, indexada por fecha de vencimiento.
+
+    Cada entrada se identifica por su nº de fila en la hoja, así el mismo
+    paciente con varias valoraciones tiene un seguimiento por valoración.
+    `actualizar()` solo lee las filas añadidas desde la última lectura (y el
+    outcome de las pendientes). Es seguro compartirla entre sesiones.
+    """
+
+    def __init__(self, dias=DIAS_SEGUIMIENTO):
+        self.dias = dias
+        self._monticulo = []      # (vencimiento, fila_hoja, id, fecha) aún no vencidos
+        self._vencidos = {}       # fila_hoja -> (vencimiento, id, fecha), en orden de vencimiento
+        self._ultima_fila = 1     # Última fila de la hoja ya leída (1 = cabecera)
+        self._cabecera = None
+        self._cerrojo = threading.Lock()          # Montículo y lista de trabajo
+        self._cerrojo_lectura = threading.Lock()  # Una sola lectura de la hoja a la vez
+
+    @classmethod
+    def desde_hoja(cls, ws, **kwargs):
+        agenda = cls(**kwargs)
+        agenda.actualizar(ws)
+        return agenda
+
+    # --- MANTENIMIENTO ---
+
+    def agregar(self, fila_hoja, id_paciente, fecha, outcome=""):
+        """Programa el seguimiento de una valoración si todavía no tiene outcome."""
+        if str(outcome).strip() != "":
+            return
+        fecha = pd.to_datetime(fecha, errors='coerce')
+        if pd.isna(fecha):
+            return
+        vencimiento = fecha + pd.Timedelta(days=self.dias)
+        with self._cerrojo:
+            heapq.heappush(self._monticulo, (vencimiento, fila_hoja, str(id_paciente), fecha))
+
+    def actualizar(self, ws):
+        """
+        Lee de la hoja (en una sola petición) las filas nuevas y las programa. En la
+        misma petición relee el outcome de los seguimientos abiertos y retira los que
+        se han cerrado directamente en la hoja. Devuelve el nº de filas nuevas.
+        """
+        # Lectura y avance de _ultima_fila en exclusiva: dos sesiones que refrescan a
+        # la vez no leen el mismo rango ni programan dos veces las mismas filas
+        with self._cerrojo_lectura:
+            if self._cabecera is None:
+                self._cabecera = ws.row_values(1)
+            col_fecha, col_id, col_outcome = [self._cabecera.index(c) + 1 for c in COLUMNAS_SEGUIMIENTO]
+            inicio = self._ultima_fila + 1
+            with self._cerrojo:
+                abiertas = [fila for _, fila, *_ in self._monticulo] + list(self._vencidos)
+            desde = min(abiertas, default=inicio)  # Outcomes desde el seguimiento abierto más antiguo
+            fechas, ids, outcomes = ws.batch_get([
+                f"{rowcol_to_a1(inicio, col_fecha)}:{_letra(col_fecha)}",
+                f"{rowcol_to_a1(inicio, col_id)}:{_letra(col_id)}",
+                f"{rowcol_to_a1(desde, col_outcome)}:{_letra(col_outcome)}",
+            ])
+
+            celda = lambda valores, i: str(valores[i][0]) if i < len(valores) and valores[i] else ""
+            self._retirar({fila for fila in abiertas if celda(outcomes, fila - desde).strip() != ""})
+            n = max(len(fechas), len(ids))
+            for i in range(n):
+                self.agregar(inicio + i, celda(ids, i), celda(fechas, i), celda(outcomes, inicio - desde + i))
+            self._ultima_fila += n
+            return n
+
+    def _retirar(self, filas):
+        """Quita de la agenda los seguimientos de `filas` (outcome ya registrado)."""
+        if not filas:
+            return
+        with self._cerrojo:
+            for fila in filas:
+                self._vencidos.pop(fila, None)
+            self._monticulo = [e for e in self._monticulo if e[1] not in filas]
+            heapq.heapify(self._monticulo)
+
+    # --- LISTA DE TRABAJO ---
+
+    def _mover_vencidos(self, hoy):
+        while self._monticulo and self._monticulo[0][0] <= hoy:
+            vencimiento, fila, id_paciente, fecha = heapq.heappop(self._monticulo)
+            self._vencidos[fila] = (vencimiento, id_paciente, fecha)
+
+    def pendientes(self, hoy=None, limite=None):
+        """Seguimientos vencidos sin outcome, del más antiguo al más reciente."""
+        hoy = pd.Timestamp.now() if hoy is None else pd.Timestamp(hoy)
+        with self._cerrojo:
+            self._mover_vencidos(hoy)
+            elementos = list(self._vencidos.items())
+        elementos.sort(key=lambda e: e[1][0])
+        if limite is not None:
+            elementos = elementos[:limite]
+        return pd.DataFrame(
+            [(fila, id_paciente, fecha, vencimiento, (hoy - vencimiento).days)
+             for fila, (vencimiento, id_paciente, fecha) in elementos],
+            columns=["Fila_Hoja", "ID", "Fecha", "Vencimiento", "Dias_Retraso"],
+        )
+
+    def proximos(self, dias=7, hoy=None):
+        """Nº de seguimientos que vencerán en los próximos `dias` días."""
+        hoy = pd.Timestamp.now() if hoy is None else pd.Timestamp(hoy)
+        limite = hoy + pd.Timedelta(days=dias)
+        with self._cerrojo:
+            return sum(1 for v, *_ in self._monticulo if hoy < v <= limite)
+
+    def _esperada(self, fila):
+        """(id, fecha) de la valoración que la agenda tiene en `fila`, o None."""
+        with self._cerrojo:
+            if fila in self._vencidos:
+                return self._vencidos[fila][1:]
+            return next(((id_paciente, fecha) for _, f, id_paciente, fecha in self._monticulo if f == fila), None)
+
+    def reiniciar(self):
+        """Olvida lo leído: la siguiente actualizar() vuelve a leer la hoja entera."""
+        with self._cerrojo_lectura, self._cerrojo:
+            self._monticulo, self._vencidos = [], {}
+            self._ultima_fila, self._cabecera = 1, None
+
+    def registrar_outcomes(self, ws, outcomes):
+        """
+        Escribe los outcomes {fila_hoja: 0/1} con una sola llamada batch_update
+        y los retira de la lista de trabajo. Antes relee (una petición) ID, Fecha y
+        Outcome de esas filas: las que ya no contienen la valoración esperada (hoja
+        reordenada o editada) o que ya tienen outcome no se escriben y la agenda se
+        reinicia para localizarlas de nuevo. Devuelve (nº de filas escritas, filas descartadas).
+        """
+        if not outcomes:
+            return 0, []
+        if self._cabecera is None:
+            self._cabecera = ws.row_values(1)
+        col_fecha, col_id, col_outcome = [self._cabecera.index(c) + 1 for c in COLUMNAS_SEGUIMIENTO]
+
+        filas = list(outcomes)
+        celdas = ws.batch_get([rowcol_to_a1(fila, c) for fila in filas for c in (col_fecha, col_id, col_outcome)])
+        valor = lambda i: str(celdas[i][0][0]) if i < len(celdas) and celdas[i] and celdas[i][0] else ""
+        validas, descartadas = [], []
+        for n, fila in enumerate(filas):
+            fecha, id_paciente, outcome = valor(3 * n), valor(3 * n + 1), valor(3 * n + 2)
+            esperada = self._esperada(fila)
+            coincide = (esperada is not None and id_paciente.strip() == esperada[0]
+                        and pd.to_datetime(fecha, errors='coerce') == esperada[1] and outcome.strip() == "")
+            (validas if coincide else descartadas).append(fila)
+
+        if validas:
+            ws.batch_update(
+                [{"range": rowcol_to_a1(fila, col_outcome), "values": [[int(outcomes[fila])]]} for fila in validas],
+                value_input_option='USER_ENTERED',
+            )
+            self._retirar(set(validas))
+        if descartadas:
+            self.reiniciar()
+        return len(validas), descartadas
+
+
+if __name__ == "__main__":
+    # Lista de trabajo del día:  [CRISTAL_CENTRO=...] python seguimiento.py
+    import streamlit as st
+    from fragmentos import abrir_registro, hojas_registro
+    from centros import centros_cli
+
+    for config in centros_cli(st.secrets["gcp"]).values():
+        for ws in hojas_registro(abrir_registro(config), desde=pd.Timestamp.now() - VENTANA_SEGUIMIENTO):
+            agenda = AgendaSeguimiento.desde_hoja(ws)
+            pendientes = agenda.pendientes()
+            print(f"--- {config['nombre']}: {ws.title} ---")
+            print(pendientes.to_string(index=False) if len(pendientes) else "Sin seguimientos pendientes.")
+            print(f"{agenda.proximos()} seguimientos vencen en los próximos 7 días.")
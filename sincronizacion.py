@@ -0,0 +1,280 @@
+import hashlib
+import threading
+
+from gspread.utils import numericise_all, rowcol_to_a1
+
+from utils import cargar_registro_tipado, cohorte_desde_registro
+
+# --- SINCRONIZACIÓN INCREMENTAL CON LA HOJA (DETECCIÓN DE CAMBIOS) ---
+# El personal edita la hoja a mano (Outcome_30dias, IDs corregidos...), así que la
+# copia local no puede suponer que las filas solo se anexan. Google Sheets no ofrece
+# huellas de contenido en el servidor, por lo que:
+#   1. Se consulta la fecha de modificación del documento (Drive): si no cambió, no se lee nada.
+#   2. Si cambió, se leen las columnas vigiladas (por defecto, todas) y las filas nuevas
+#      (un único batch_get).
+#   3. Se compara la huella de cada bloque de filas con la guardada y solo se descargan
+#      completos los bloques distintos (un segundo batch_get), que se aplican fila a fila
+#      a la copia local y a los agregados suscritos.
+# Las filas cambiadas se tipan antes de tocar la copia local: si falla, la copia y los
+# agregados siguen como estaban y la siguiente sincronización lo vuelve a intentar.
+
+TAM_BLOQUE = 500
+# None vigila la fila completa. Una lista (p. ej. ["ID", "Outcome_30dias"]) abarata la
+# lectura, pero entonces las ediciones de las demás columnas no se detectan.
+COLUMNAS_VIGILADAS = None
+
+
+def _letra(columna):
+    return rowcol_to_a1(1, columna)[:-1]
+
+
+def _huella(filas):
+    """Huella (blake2b de 128 bits) de un bloque de filas."""
+    h = hashlib.blake2b(digest_size=16)
+    for fila in filas:
+        h.update("\x1f".join(fila).encode("utf-8"))
+        h.update(b"\x1e")
+    return h.digest()
+
+
+class SincronizadorRegistro:
+    """
+    Copia local de una hoja del registro que se mantiene al día con coste
+    proporcional a las filas que cambian, no al tamaño de la hoja.
+
+    Los agregados se enganchan con `suscribir(funcion)`; la función recibe
+    (anteriores, nuevas), dos DataFrames tipados del registro con las versiones
+    previa y actual de las filas cambiadas (anteriores vacío para filas nuevas).
+    """
+
+    def __init__(self, ws, tam_bloque=TAM_BLOQUE, columnas_vigiladas=COLUMNAS_VIGILADAS):
+        self.ws = ws
+        self.tam_bloque = tam_bloque
+        self.columnas_vigiladas = columnas_vigiladas
+        self.cabecera = None
+        self._indices_vigilados = None
+        self._filas = []          # Valores en bruto; la fila i corresponde a la fila i + 2 de la hoja
+        self._huellas = []        # Huella de las columnas vigiladas (o filas completas) de cada bloque
+        self._modificado = None   # Última fecha de modificación vista en Drive
+        self._suscriptores = []
+        self._cerrojo = threading.Lock()
+
+    def suscribir(self, funcion):
+        self._suscriptores.append(funcion)
+
+    def __len__(self):
+        return len(self._filas)
+
+    # --- COPIA LOCAL ---
+
+    def registros(self):
+        """Copia local como lista de dicts (mismo formato que ws.get_all_records())."""
+        with self._cerrojo:
+            return [self._registro(fila) for fila in self._filas]
+
+    def registro(self):
+        """Copia local como DataFrame tipado del registro."""
+        return cargar_registro_tipado(self.registros())
+
+    def _registro(self, fila):
+        # Misma conversión de números que aplica get_all_records()
+        return dict(zip(self.cabecera, numericise_all(fila)))
+
+    def _tipar(self, filas):
+        return cargar_registro_tipado([self._registro(fila) for fila in filas])
+
+    def _normalizar(self, fila):
+        fila = [str(v) for v in fila[:len(self.cabecera)]]
+        return fila + [""] * (len(self.cabecera) - len(fila))
+
+    # --- SINCRONIZACIÓN ---
+
+    def _modificacion_remota(self):
+        try:
+            return self.ws.spreadsheet.get_lastUpdateTime()
+        except Exception:
+            return None  # Sin acceso a la API de Drive: se comprueban las huellas siempre
+
+    def _vigiladas(self, fila):
+        if self._indices_vigilados is None:
+            return fila
+        return [fila[i] for i in self._indices_vigilados]
+
+    def sincronizar(self, modificado=None, forzar=False):
+        """
+        Trae los cambios de la hoja. `modificado` permite pasar la fecha de
+        modificación ya consultada (p. ej. una sola vez para todos los fragmentos).
+        Devuelve un dict con el nº de filas editadas, nuevas y bloques descargados.
+        """
+        resultado = {"editadas": 0, "nuevas": 0, "bloques": 0}
+        modificado = self._modificacion_remota() if modificado is None else modificado
+        if not forzar and modificado is not None and modificado == self._modificado:
+            return resultado
+
+        with self._cerrojo:
+            if self.cabecera is None:
+                self.cabecera = self.ws.row_values(1)
+                self._indices_vigilados = (None if self.columnas_vigiladas is None
+                                           else [self.cabecera.index(c) for c in self.columnas_vigiladas])
+            ultima = _letra(len(self.cabecera))
+            n = len(self._filas)
+
+            # 1. Columnas vigiladas de las filas conocidas + filas nuevas completas
+            if self._indices_vigilados is None:
+                rangos = [f"A2:{ultima}{n + 1}"] if n else []
+            else:
+                rangos = [f"{rowcol_to_a1(2, i + 1)}:{rowcol_to_a1(n + 1, i + 1)}"
+                          for i in self._indices_vigilados] if n else []
+            rangos.append(f"A{n + 2}:{ultima}")
+            *vigiladas, nuevas = self.ws.batch_get(rangos)
+
+            if n:
+                if self._indices_vigilados is None:
+                    actuales = [self._normalizar(f) for f in vigiladas[0]]
+                    actuales += [[""] * len(self.cabecera)] * (n - len(actuales))
+                else:
+                    # El API omite las celdas vacías finales de cada columna
+                    columnas = [[v[0] if v else "" for v in col] + [""] * (n - len(col)) for col in vigiladas]
+                    actuales = [list(f) for f in zip(*columnas)]
+                if not any(actuales[-1]) and any(self._vigiladas(self._filas[-1])):
+                    # Se han borrado o movido filas: la posición ya no identifica la fila
+                    return self._recargar(modificado)
+
+                cambiados = [
+                    b for b in range(len(self._huellas))
+                    if _huella(actuales[b * self.tam_bloque:(b + 1) * self.tam_bloque]) != self._huellas[b]
+                ]
+                if cambiados:
+                    resultado["bloques"] = len(cambiados)
+                    resultado["editadas"] = self._aplicar_bloques(cambiados, ultima)
+
+            # 2. Filas anexadas
+            nuevas = [self._normalizar(f) for f in nuevas]
+            if nuevas:
+                cambios = self._tipar_cambios([], nuevas)
+                self._filas.extend(nuevas)
+                self._recalcular_huellas(range(n // self.tam_bloque, self._num_bloques()))
+                self._notificar(cambios)
+                resultado["nuevas"] = len(nuevas)
+
+            self._modificado = modificado
+        return resultado
+
+    def _num_bloques(self):
+        return (len(self._filas) + self.tam_bloque - 1) // self.tam_bloque
+
+    def _recalcular_huellas(self, bloques):
+        del self._huellas[min(bloques, default=len(self._huellas)):]
+        for b in bloques:
+            filas = self._filas[b * self.tam_bloque:(b + 1) * self.tam_bloque]
+            self._huellas.append(_huella([self._vigiladas(f) for f in filas]))
+
+    def _aplicar_bloques(self, bloques, ultima):
+        """Descarga completos los bloques cambiados (una petición) y aplica las filas distintas."""
+        n = len(self._filas)
+        rangos = [f"A{b * self.tam_bloque + 2}:{ultima}{min((b + 1) * self.tam_bloque, n) + 1}" for b in bloques]
+        posiciones, nuevas = [], []
+        for b, valores in zip(bloques, self.ws.batch_get(rangos)):
+            inicio = b * self.tam_bloque
+            fin = min(inicio + self.tam_bloque, n)
+            valores = [self._normalizar(f) for f in valores]
+            valores += [[""] * len(self.cabecera)] * (fin - inicio - len(valores))
+            for pos, fila in zip(range(inicio, fin), valores):
+                if fila != self._filas[pos]:
+                    posiciones.append(pos)
+                    nuevas.append(fila)
+
+        cambios = self._tipar_cambios([self._filas[pos] for pos in posiciones], nuevas)
+        for pos, fila in zip(posiciones, nuevas):
+            self._filas[pos] = fila
+        for b in bloques:
+            self._huellas[b] = _huella([self._vigiladas(f) for f in
+                                        self._filas[b * self.tam_bloque:(b + 1) * self.tam_bloque]])
+        if nuevas:
+            self._notificar(cambios)
+        return len(nuevas)
+
+    def _recargar(self, modificado):
+        """Relectura completa (solo si se han borrado filas de la hoja)."""
+        filas = [self._normalizar(f) for f in self.ws.get_all_values()[1:]]
+        cambios = self._tipar_cambios(self._filas, filas)
+        self._filas = filas
+        self._huellas = []
+        self._recalcular_huellas(range(self._num_bloques()))
+        self._notificar(cambios)
+        self._modificado = modificado
+        return {"editadas": len(self._filas), "nuevas": 0, "bloques": self._num_bloques()}
+
+    def _tipar_cambios(self, anteriores, nuevas):
+        """(anteriores, nuevas) tipados para los suscriptores; None si no hay ninguno."""
+        if not self._suscriptores:
+            return None
+        return self._tipar(anteriores), self._tipar(nuevas)
+
+    def _notificar(self, cambios):
+        if cambios is None:
+            return
+        for funcion in self._suscriptores:
+            funcion(*cambios)
+
+
+# --- AGREGADOS SUSCRITOS ---
+
+def actualizar_tendencias(tendencias):
+    """Suscriptor que mantiene una TendenciasCohorte al día con las filas editadas y nuevas."""
+    def aplicar(anteriores, nuevas):
+        if len(anteriores):
+            tendencias.quitar(cohorte_desde_registro(anteriores))
+        if len(nuevas):
+            tendencias.agregar(cohorte_desde_registro(nuevas))
+    return aplicar
+
+
+def actualizar_triaje(triaje):
+    """
+    Suscriptor que añade a un TriajeTopK las filas anexadas (las ediciones manuales
+    no cambian la valoración). Si `triaje.completo` pasa a False hay que reconstruirlo.
+    """
+    def aplicar(anteriores, nuevas):
+        if len(anteriores) == 0 and len(nuevas):
+            triaje.agregar(cohorte_desde_registro(nuevas))
+    return aplicar
+
+
+if __name__ == "__main__":
+    # Sincronización continua que republica el snapshot de cada centro solo si hubo cambios:
+    #   [CRISTAL_CENTRO=...] python sincronizacion.py [segundos]
+    import sys
+    import time
+    import streamlit as st
+    from fragmentos import abrir_registro, hojas_registro
+    from snapshots import limpiar_versiones
+    from centros import centros_cli, directorio_snapshots, exportar_snapshot_centro
+
+    intervalo = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+    registros = {centro: abrir_registro(config) for centro, config in centros_cli(st.secrets["gcp"]).items()}
+    sincronizadores = {centro: {} for centro in registros}
+    while True:
+        for centro, registro in registros.items():
+            hojas = hojas_registro(registro)
+            try:
+                # Una sola consulta a Drive para todos los fragmentos (comparten documento)
+                modificado = hojas[0].spreadsheet.get_lastUpdateTime()
+            except Exception:
+                modificado = None
+            cambios = 0
+            for ws in hojas:
+                if ws.title not in sincronizadores[centro]:
+                    sincronizadores[centro][ws.title] = SincronizadorRegistro(ws)
+                r = sincronizadores[centro][ws.title].sincronizar(modificado=modificado)
+                cambios += r["editadas"] + r["nuevas"]
+                if r["editadas"] or r["nuevas"]:
+                    print(f"{centro}/{ws.title}: {r['editadas']} editadas ({r['bloques']} bloques), {r['nuevas']} nuevas")
+            if cambios:
+                # Solo se republica el snapshot (y el resumen) del centro que ha cambiado
+                version = exportar_snapshot_centro(
+                    [r for ws in hojas for r in sincronizadores[centro][ws.title].registros()], centro
+                )
+                limpiar_versiones(directorio=directorio_snapshots(centro))
+                print(f"{centro}: snapshot publicado {version}")
+        time.sleep(intervalo)
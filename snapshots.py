@@ -0,0 +1,156 @@
+import os
+import shutil
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils import (COLUMNAS_REGISTRO, COLUMNAS_COHORTE, ESQUEMA_REGISTRO, aplicar_esquema,
+                   cargar_registro_tipado, cohorte_desde_registro)
+
+# --- SNAPSHOTS DEL REGISTRO EN DISCO (ARROW / PARQUET) ---
+# Estructura:  <directorio>/<version>/Mes=AAAA-MM/registro.arrow
+#              <directorio>/ACTUAL   -> nombre de la versión vigente
+# Los ficheros Arrow IPC se escriben sin compresión para poder abrirlos con
+# memory-map: varios procesos de Streamlit comparten las mismas páginas del
+# sistema operativo en lugar de tener cada uno su copia del registro en RAM.
+
+DIRECTORIO_SNAPSHOTS = os.environ.get("CRISTAL_SNAPSHOTS", "snapshots")
+PUNTERO = "ACTUAL"
+
+
+def exportar_snapshot(registros, directorio=DIRECTORIO_SNAPSHOTS, formato="arrow", complementos=None):
+    """
+    Escribe el registro (lista de dicts de get_all_records() o DataFrame) particionado
+    por mes de registro. `complementos(df, carpeta)`, si se indica, añade ficheros a la
+    versión con el registro ya tipado (p. ej. el resumen del centro, ver centros.py).
+    La versión nueva solo se publica al terminar de escribirse. Devuelve su nombre.
+    """
+    df = registros if isinstance(registros, pd.DataFrame) else cargar_registro_tipado(registros)
+    df = df[[c for c in COLUMNAS_REGISTRO if c in df.columns]]
+
+    version = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    destino = os.path.join(directorio, version)
+    temporal = destino + ".tmp"
+    os.makedirs(temporal)
+
+    meses = pd.to_datetime(df['Fecha']).dt.strftime("%Y-%m").fillna("sin_fecha")
+    for mes, parte in df.groupby(meses, sort=True):
+        carpeta = os.path.join(temporal, f"Mes={mes}")
+        os.makedirs(carpeta)
+        tabla = pa.Table.from_pandas(parte, preserve_index=False)
+        if formato == "parquet":
+            pq.write_table(tabla, os.path.join(carpeta, "registro.parquet"))
+        else:
+            with pa.OSFile(os.path.join(carpeta, "registro.arrow"), "wb") as f:
+                with pa.ipc.new_file(f, tabla.schema) as escritor:
+                    escritor.write_table(tabla)
+
+    if complementos is not None:
+        complementos(df, temporal)
+    os.rename(temporal, destino)
+    _publicar(directorio, version)
+    return version
+
+
+def _publicar(directorio, version):
+    """Actualiza el puntero ACTUAL de forma atómica (os.replace)."""
+    tmp = os.path.join(directorio, PUNTERO + ".tmp")
+    with open(tmp, "w") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(directorio, PUNTERO))
+
+
+def version_actual(directorio=DIRECTORIO_SNAPSHOTS):
+    """Nombre de la versión publicada, o None si aún no hay snapshot."""
+    try:
+        with open(os.path.join(directorio, PUNTERO)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _particiones(ruta, desde=None, hasta=None):
+    """Carpetas Mes=AAAA-MM dentro del rango pedido (poda de particiones)."""
+    for nombre in sorted(os.listdir(ruta)):
+        if not nombre.startswith("Mes="):
+            continue
+        mes = nombre[4:]
+        if desde is not None and mes < desde:
+            continue
+        if hasta is not None and mes > hasta:
+            continue
+        yield os.path.join(ruta, nombre)
+
+
+def abrir_snapshot(columnas=None, desde=None, hasta=None, directorio=DIRECTORIO_SNAPSHOTS):
+    """
+    Abre la versión vigente como pyarrow.Table, leyendo solo `columnas` y los
+    meses entre `desde` y `hasta` ("AAAA-MM"). Los ficheros Arrow se abren con
+    memory-map y sin copia; los Parquet se leen por columnas.
+    """
+    version = version_actual(directorio)
+    if version is None:
+        return None
+
+    tablas = []
+    for carpeta in _particiones(os.path.join(directorio, version), desde, hasta):
+        ruta_arrow = os.path.join(carpeta, "registro.arrow")
+        if os.path.exists(ruta_arrow):
+            tabla = pa.ipc.open_file(pa.memory_map(ruta_arrow, "r")).read_all()
+            # Las versiones antiguas pueden no tener las columnas añadidas después
+            tablas.append(tabla.select([c for c in columnas if c in tabla.column_names]) if columnas else tabla)
+        else:
+            ruta_parquet = os.path.join(carpeta, "registro.parquet")
+            if columnas:
+                presentes = pq.read_schema(ruta_parquet).names
+                columnas_parte = [c for c in columnas if c in presentes]
+            else:
+                columnas_parte = None
+            tablas.append(pq.read_table(ruta_parquet, columns=columnas_parte, memory_map=True))
+
+    if not tablas:
+        return None
+    return pa.concat_tables(tablas, promote_options="permissive")
+
+
+def registro_desde_tabla(tabla):
+    """
+    Registro tipado a partir de una tabla de abrir_snapshot() sin copiarla al heap:
+    split_blocks deja cada columna numérica sin nulos como vista del fichero mapeado,
+    los textos siguen en buffers Arrow y aplicar_esquema no toca las columnas que ya
+    tienen su tipo (el snapshot se escribió con el esquema compacto).
+    """
+    return aplicar_esquema(tabla.to_pandas(split_blocks=True, self_destruct=True), ESQUEMA_REGISTRO)
+
+
+def cargar_cohorte_snapshot(directorio=DIRECTORIO_SNAPSHOTS):
+    """Cohorte del Dashboard construida desde el snapshot vigente (solo las columnas necesarias), o None."""
+    tabla = abrir_snapshot(columnas=COLUMNAS_COHORTE, directorio=directorio)
+    if tabla is None:
+        return None
+    return cohorte_desde_registro(registro_desde_tabla(tabla))
+
+
+def limpiar_versiones(conservar=2, directorio=DIRECTORIO_SNAPSHOTS):
+    """Borra versiones antiguas, dejando las `conservar` más recientes (los lectores abiertos conservan su mmap)."""
+    actual = version_actual(directorio)
+    versiones = sorted(v for v in os.listdir(directorio)
+                       if os.path.isdir(os.path.join(directorio, v)) and not v.endswith(".tmp"))
+    for v in versiones[:-conservar]:
+        if v != actual:
+            shutil.rmtree(os.path.join(directorio, v), ignore_errors=True)
+
+
+if __name__ == "__main__":
+    # Exportación manual o programada (cron):  [CRISTAL_CENTRO=...] python snapshots.py
+    import streamlit as st
+    from fragmentos import abrir_registro
+    from centros import centros_cli, directorio_snapshots, exportar_snapshot_centro
+
+    # Cada centro en su propia carpeta: su crecimiento no afecta a los demás
+    for centro, config in centros_cli(st.secrets["gcp"]).items():
+        version = exportar_snapshot_centro(abrir_registro(config).get_all_records(), centro)
+        limpiar_versiones(directorio=directorio_snapshots(centro))
+        print(f"{config['nombre']}: snapshot publicado {version}")
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+from utils import CODIGO_ALTO, CATEGORIAS_RIESGO
+
+# --- AGREGADOS TEMPORALES INCREMENTALES ---
+
+FRECUENCIAS = {"W": "Semanal", "M": "Mensual"}
+
+# Sumas que se guardan por cubo temporal; las medias se derivan de ellas
+_SUMAS = ['n', 'suma_score', 'suma_prob', 'n_alto', 'n_outcome', 'n_muertes']
+
+
+class TendenciasCohorte:
+    """
+    Sumas por cubo temporal (semana y mes) del score, la mortalidad estimada,
+    la proporción de riesgo Alto/Crítico y la mortalidad observada.
+
+    `agregar()` solo agrupa las filas nuevas y las suma a los cubos existentes,
+    de modo que la serie nunca exige recorrer de nuevo todo el registro.
+    Las ventanas móviles se calculan sobre los cubos, no sobre las filas.
+    """
+
+    def __init__(self, columna_fecha='Fecha_Registro'):
+        self.columna_fecha = columna_fecha
+        self._cubos = {f: pd.DataFrame(columns=_SUMAS, dtype='float64') for f in FRECUENCIAS}
+
+    @classmethod
+    def desde_cohorte(cls, df, **kwargs):
+        tendencias = cls(**kwargs)
+        tendencias.agregar(df)
+        return tendencias
+
+    @classmethod
+    def combinar(cls, lista):
+        """Tendencias conjuntas de varias cohortes (p. ej. centros), sumando sus cubos."""
+        tendencias = cls(columna_fecha=lista[0].columna_fecha if lista else 'Fecha_Registro')
+        for otra in lista:
+            for freq in FRECUENCIAS:
+                cubos = otra._cubos[freq]
+                if len(cubos):
+                    actuales = tendencias._cubos[freq]
+                    tendencias._cubos[freq] = cubos.add(actuales, fill_value=0) if len(actuales) else cubos.copy()
+        return tendencias
+
+    def agregar(self, df):
+        """Suma las filas nuevas a los cubos semanales y mensuales."""
+        self._acumular(df, 1.0)
+
+    def quitar(self, df):
+        """Resta filas ya agregadas (p. ej. la versión anterior de una fila editada)."""
+        self._acumular(df, -1.0)
+        for freq in FRECUENCIAS:
+            cubos = self._cubos[freq]
+            self._cubos[freq] = cubos[cubos['n'] > 0]
+
+    def _acumular(self, df, signo):
+        if len(df) == 0:
+            return
+
+        codigos = pd.Categorical(df['Categoria_Riesgo'], categories=CATEGORIAS_RIESGO).codes
+        # Outcome desconocido (NaN) no cuenta en el denominador de la tasa observada
+        if 'Outcome_30dias' in df.columns:
+            outcome = pd.to_numeric(df['Outcome_30dias'], errors='coerce').to_numpy(dtype='float64')
+        else:
+            outcome = np.full(len(df), np.nan)
+
+        valores = pd.DataFrame({
+            'n': 1.0,
+            'suma_score': df['Score_CriSTAL'].astype('float64').to_numpy(),
+            'suma_prob': df['Prob_Mortalidad'].astype('float64').to_numpy(),
+            'n_alto': (codigos >= CODIGO_ALTO).astype('float64'),
+            'n_outcome': (~np.isnan(outcome)).astype('float64'),
+            'n_muertes': np.nan_to_num(outcome),
+        })
+        fechas = pd.to_datetime(df[self.columna_fecha]).to_numpy()
+
+        for freq in FRECUENCIAS:
+            periodos = pd.PeriodIndex(fechas, freq=freq)
+            nuevos = valores.groupby(periodos).sum() * signo
+            self._cubos[freq] = nuevos.add(self._cubos[freq], fill_value=0) if len(self._cubos[freq]) else nuevos
+
+    def serie(self, freq="W", ventana=1, max_periodos=None):
+        """
+        Serie temporal con las medias por cubo. Con `ventana` > 1 se aplica una
+        ventana móvil de ese nº de cubos (sumas móviles, no medias de medias).
+        Si hay más de `max_periodos` cubos, se suman en grupos de cubos consecutivos
+        (periodo más grueso, medias exactas); el tamaño del grupo queda en
+        serie.attrs['periodos_por_punto'] y la ventana pasa a contarse en grupos.
+        """
+        cubos = self._cubos[freq].sort_index()
+        if len(cubos) == 0:
+            return pd.DataFrame(columns=['Periodo', 'Pacientes', 'Score_Medio', 'Mortalidad_Estimada_%',
+                                         'Alto_Critico_%', 'Mortalidad_Observada_%'])
+
+        # Rellenar cubos vacíos para que la ventana móvil cuente periodos reales
+        cubos = cubos.reindex(pd.period_range(cubos.index.min(), cubos.index.max(), freq=freq), fill_value=0)
+        periodos = cubos.index.to_timestamp()
+        por_punto = 1
+        if max_periodos and len(cubos) > max_periodos:
+            por_punto = -(-len(cubos) // max_periodos)
+            grupos = np.arange(len(cubos)) // por_punto
+            periodos = periodos[::por_punto]
+            cubos = cubos.groupby(grupos).sum()
+            ventana = -(-ventana // por_punto)
+        sumas = cubos.rolling(ventana, min_periods=1).sum()
+
+        n = sumas['n'].where(sumas['n'] > 0)
+        serie = pd.DataFrame({
+            'Periodo': periodos,
+            'Pacientes': cubos['n'].astype(int).to_numpy(),
+            'Score_Medio': (sumas['suma_score'] / n).to_numpy(),
+            'Mortalidad_Estimada_%': (sumas['suma_prob'] / n).to_numpy(),
+            'Alto_Critico_%': (sumas['n_alto'] / n * 100).to_numpy(),
+            'Mortalidad_Observada_%': (sumas['n_muertes'] / sumas['n_outcome'].where(sumas['n_outcome'] > 0) * 100).to_numpy(),
+        })
+        serie.attrs['periodos_por_punto'] = por_punto
+        return serie
@@ -0,0 +1,188 @@
+import os
+import re
+import sys
+
+import gspread
+import numpy as np
+import pandas as pd
+import pytest
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
+
+# Los módulos de la app están en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import (aplicar_esquema, calcular_probabilidad_math, categorizar_scores, colores_scores,
+                   ESQUEMA_COHORTE, SERVICIOS)
+
+
+@pytest.fixture
+def cohorte():
+    """Fábrica de cohortes sintéticas con el esquema del Dashboard (una valoración por día)."""
+    def crear(n=200, semilla=0, inicio="2024-01-01", pacientes=None):
+        rng = np.random.default_rng(semilla)
+        scores = rng.integers(0, 21, n)
+        outcome = np.where(rng.random(n) < 0.3, np.nan, rng.random(n) < 0.2)
+        df = pd.DataFrame({
+            'ID_Paciente': [f'P{i % (pacientes or n):05d}' for i in range(n)],
+            'Fecha_Registro': pd.date_range(inicio, periods=n, freq='D'),
+            'Score_CriSTAL': scores,
+            'Prob_Mortalidad': calcular_probabilidad_math(scores),
+            'Categoria_Riesgo': categorizar_scores(scores),
+            'Color': colores_scores(scores),
+            'Edad_65+': rng.random(n) < 0.7,
+            'Fragilidad': rng.random(n) < 0.5,
+            'Comorbilidad_ICC': rng.random(n) < 0.3,
+            'Comorbilidad_EPOC': rng.random(n) < 0.25,
+            'Fisiologico_Agudo': rng.random(n) < 0.05,
+            'Deterioro_Cognitivo': rng.random(n) < 0.15,
+            'Items_FRAIL': rng.integers(0, 6, n),
+            'Outcome_30dias': outcome,
+            'Servicio': rng.choice(SERVICIOS, n),
+        })
+        df['Total_Factores'] = df[['Edad_65+', 'Fragilidad', 'Comorbilidad_ICC', 'Comorbilidad_EPOC',
+                                   'Fisiologico_Agudo', 'Deterioro_Cognitivo']].sum(axis=1)
+        return aplicar_esquema(df, ESQUEMA_COHORTE)
+    return crear
+
+
+# --- HOJAS DE GOOGLE SHEETS EN MEMORIA ---
+
+def _numero(valor):
+    """Conversión de get_all_records: enteros y decimales como números, el resto como texto."""
+    for tipo in (int, float):
+        try:
+            return tipo(valor)
+        except (TypeError, ValueError):
+            pass
+    return valor
+
+
+def a1_columna(columna):
+    return rowcol_to_a1(1, columna)[:-1]
+
+
+class HojaFalsa:
+    """Worksheet en memoria con la parte de la API de gspread que usa la app. Cuenta las peticiones."""
+
+    def __init__(self, documento=None, title="Registro", filas=None):
+        self.spreadsheet = documento
+        self.title = title
+        self.datos = [[str(v) for v in f] for f in (filas or [])]
+        self.col_count = 26
+        self.peticiones = 0
+
+    # Lectura
+    def row_values(self, fila):
+        self.peticiones += 1
+        return list(self.datos[fila - 1]) if fila <= len(self.datos) else []
+
+    def get_all_values(self):
+        self.peticiones += 1
+        return [list(f) for f in self.datos]
+
+    def get_all_records(self):
+        self.peticiones += 1
+        cabecera = self.datos[0] if self.datos else []
+        return [dict(zip(cabecera, [_numero(v) for v in f] + [""] * (len(cabecera) - len(f))))
+                for f in self.datos[1:]]
+
+    def batch_get(self, rangos):
+        self.peticiones += 1
+        return [self._leer(r) for r in rangos]
+
+    def _leer(self, rango):
+        inicio, _, fin = rango.partition(":")
+        fila_ini, col_ini = a1_to_rowcol(inicio)
+        if re.fullmatch(r"[A-Z]+", fin):  # Columna completa ("C2:C")
+            fila_fin, col_fin = len(self.datos), a1_to_rowcol(fin + "1")[1]
+        else:
+            fila_fin, col_fin = a1_to_rowcol(fin or inicio)
+        valores = []
+        for fila in self.datos[fila_ini - 1:fila_fin]:
+            v = fila[col_ini - 1:col_fin]
+            while v and v[-1] == "":
+                v.pop()
+            valores.append(v)
+        while valores and not valores[-1]:
+            valores.pop()
+        return valores
+
+    # Escritura
+    def append_row(self, fila, **kwargs):
+        return self.append_rows([fila])
+
+    def append_rows(self, filas, **kwargs):
+        """Como values_append: añade tras la última fila con datos y devuelve el rango escrito."""
+        self.peticiones += 1
+        while self.datos and not any(self.datos[-1]):
+            self.datos.pop()
+        inicio = len(self.datos) + 1
+        self.datos.extend([str(v) for v in f] for f in filas)
+        ancho = max((len(f) for f in filas), default=1)
+        return {"updates": {
+            "updatedRange": f"'{self.title}'!A{inicio}:{a1_columna(ancho)}{len(self.datos)}",
+            "updatedRows": len(filas),
+        }}
+
+    def update(self, range_name, values, **kwargs):
+        self.batch_update([{"range": range_name, "values": values}])
+
+    def batch_update(self, datos, **kwargs):
+        self.peticiones += 1
+        for bloque in datos:
+            fila_ini, col_ini = a1_to_rowcol(bloque["range"].split(":")[0])
+            for i, valores in enumerate(bloque["values"]):
+                while len(self.datos) < fila_ini + i:
+                    self.datos.append([])
+                fila = self.datos[fila_ini + i - 1]
+                for j, v in enumerate(valores):
+                    while len(fila) < col_ini + j:
+                        fila.append("")
+                    fila[col_ini + j - 1] = str(v)
+
+    def add_cols(self, n):
+        self.peticiones += 1
+        self.col_count += n
+
+
+class _RespuestaError:
+    """Respuesta HTTP mínima para construir un gspread.exceptions.APIError."""
+
+    def __init__(self, codigo, mensaje):
+        self.text = mensaje
+        self._json = {"error": {"code": codigo, "message": mensaje, "status": "INVALID_ARGUMENT"}}
+
+    def json(self):
+        return self._json
+
+
+class DocumentoFalso:
+    """Spreadsheet en memoria (varias hojas por título)."""
+
+    def __init__(self):
+        self.hojas = {}
+
+    def worksheet(self, titulo):
+        if titulo not in self.hojas:
+            raise gspread.WorksheetNotFound(titulo)
+        return self.hojas[titulo]
+
+    def worksheets(self):
+        return list(self.hojas.values())
+
+    def add_worksheet(self, title, rows=1000, cols=26):
+        if title in self.hojas:
+            raise gspread.exceptions.APIError(_RespuestaError(
+                400, f'A sheet with the name "{title}" already exists. Please enter another name.'))
+        self.hojas[title] = HojaFalsa(self, title)
+        return self.hojas[title]
+
+
+@pytest.fixture
+def hoja():
+    """Fábrica de hojas en memoria: hoja(filas) -> HojaFalsa dentro de su propio documento."""
+    def crear(filas=None, titulo="Registro"):
+        documento = DocumentoFalso()
+        documento.hojas[titulo] = HojaFalsa(documento, titulo, filas)
+        return documento.hojas[titulo]
+    return crear
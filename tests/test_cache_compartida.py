@@ -0,0 +1,50 @@
+import fcntl
+import os
+
+from cache_compartida import CacheCompartida
+
+
+def test_construye_una_vez_por_version(tmp_path):
+    cache = CacheCompartida(str(tmp_path))
+    llamadas = []
+    construir = lambda: llamadas.append(1) or len(llamadas)
+
+    assert cache.obtener("cohorte", "v1", construir) == ("v1", 1)
+    assert cache.obtener("cohorte", "v1", construir) == ("v1", 1)
+    assert CacheCompartida(str(tmp_path)).obtener("cohorte", "v1", construir) == ("v1", 1)  # Otro proceso
+    assert cache.obtener("cohorte", "v2", construir) == ("v2", 2)
+    assert os.listdir(tmp_path / "cohorte").count("v1.pkl") == 0  # Versiones anteriores borradas
+
+
+def _ocupado(tmp_path, clave):
+    """Simula otro proceso reconstruyendo `clave` (cerrojo tomado por otro descriptor)."""
+    f = open(tmp_path / clave / ".lock", "a")
+    fcntl.flock(f, fcntl.LOCK_EX)
+    return f
+
+
+def test_sirve_la_anterior_indicando_la_version(tmp_path):
+    cache = CacheCompartida(str(tmp_path))
+    cache.obtener("cohorte", "v1", lambda: "antigua")
+
+    ocupado = _ocupado(tmp_path, "cohorte")
+    try:
+        # Mientras otro proceso construye v2 se sirve v1, y la versión servida lo dice
+        version, valor = cache.obtener("cohorte", "v2", lambda: "nueva")
+        assert (version, valor) == ("v1", "antigua")
+    finally:
+        ocupado.close()
+
+    assert cache.obtener("cohorte", "v2", lambda: "nueva") == ("v2", "nueva")
+
+
+def test_esperar_no_sirve_la_anterior(tmp_path):
+    cache = CacheCompartida(str(tmp_path))
+    cache.obtener("imagen", "v1", lambda: b"png antiguo")
+
+    ocupado = _ocupado(tmp_path, "imagen")
+    fcntl.flock(ocupado, fcntl.LOCK_UN)  # El otro proceso termina sin publicar (p. ej. falla)
+    try:
+        assert cache.obtener("imagen", "v2", lambda: b"png nuevo", esperar=True) == ("v2", b"png nuevo")
+    finally:
+        ocupado.close()
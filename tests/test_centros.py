@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from centros import (CENTRO_UNICO, RESUMEN, ResumenCohorte, centros, clave_cache, directorio_snapshots,
+                     exportar_snapshot_centro, leer_resumen)
+from snapshots import version_actual
+from tendencias import FRECUENCIAS
+from utils import FACTORES_COHORTE, cargar_registro_tipado, cohorte_desde_registro
+
+NOMBRES = {f: f for f in FACTORES_COHORTE}
+
+
+def _iguales(a, b):
+    pd.testing.assert_series_equal(a.sumas, b.sumas)
+    np.testing.assert_array_equal(a.categorias, b.categorias)
+    np.testing.assert_array_equal(a.scores, b.scores)
+    pd.testing.assert_series_equal(a.factores, b.factores)
+    for freq in FRECUENCIAS:
+        pd.testing.assert_frame_equal(a.tendencias.serie(freq), b.tendencias.serie(freq), check_freq=False)
+    assert a.indicadores() == pytest.approx(b.indicadores(), nan_ok=True)
+
+
+def test_combinar_igual_que_la_cohorte_conjunta(cohorte):
+    # Centros con periodos solapados y uno que empieza más tarde
+    partes = {"A": cohorte(400, semilla=1), "B": cohorte(250, semilla=2, inicio="2024-06-15"),
+              "C": cohorte(30, semilla=3, inicio="2025-03-01")}
+    red = ResumenCohorte.combinar([ResumenCohorte.desde_cohorte(df, c, FACTORES_COHORTE)
+                                   for c, df in partes.items()])
+    conjunta = ResumenCohorte.desde_cohorte(pd.concat(partes.values(), ignore_index=True), "red", FACTORES_COHORTE)
+
+    assert red.centros == ["A", "B", "C"]
+    _iguales(red, conjunta)
+    pd.testing.assert_frame_equal(red.conteo_categorias(), conjunta.conteo_categorias())
+    pd.testing.assert_frame_equal(red.conteo_factores(NOMBRES), conjunta.conteo_factores(NOMBRES))
+    assert red.histograma_score()["Cuenta"].sum() == 680
+
+
+def test_indicadores_sin_outcomes(cohorte):
+    df = cohorte(20).assign(Outcome_30dias=np.nan)
+    kpis = ResumenCohorte.desde_cohorte(df, "A", FACTORES_COHORTE).indicadores()
+    assert kpis["Pacientes"] == 20 and np.isnan(kpis["Mortalidad_Observada_%"])
+
+
+def test_resumen_publicado_con_el_snapshot(tmp_path, monkeypatch):
+    from test_snapshots import _registros
+
+    monkeypatch.chdir(tmp_path)  # DIRECTORIO_SNAPSHOTS es relativo
+    registros = _registros(900, meses=2)
+    version = exportar_snapshot_centro(registros, "HUVR")
+
+    assert version_actual(directorio_snapshots("HUVR")) == version
+    assert os.path.exists(os.path.join(directorio_snapshots("HUVR"), version, RESUMEN))
+    esperado = ResumenCohorte.desde_cohorte(cohorte_desde_registro(cargar_registro_tipado(registros)),
+                                            "HUVR", FACTORES_COHORTE)
+    _iguales(leer_resumen("HUVR", version), esperado)
+    assert leer_resumen("HUVR", "otra-version") is None
+
+
+def test_particiones_por_centro():
+    assert centros({"nombre": "Único"}) == {CENTRO_UNICO: {"nombre": "Único"}}
+    red = centros({"service_account_base64": "x", "centros": {"A": {"spreadsheet_id": "1"}}})
+    assert red["A"] == {"service_account_base64": "x", "nombre": "A", "spreadsheet_id": "1"}
+    assert directorio_snapshots(CENTRO_UNICO, "snap") == "snap"
+    assert directorio_snapshots("A", "snap") == os.path.join("snap", "A")
+    assert clave_cache("dashboard", CENTRO_UNICO) == "dashboard" and clave_cache("dashboard", "A") == "dashboard-A"
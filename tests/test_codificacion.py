@@ -0,0 +1,86 @@
+import pandas as pd
+
+from codificacion import (OPCIONES_COMORB, OPCIONES_FISIO, OPCIONES_FRAIL, codificar, decodificar_serie,
+                          etiquetas, migrar_codigos)
+
+CABECERA = ["Fecha", "ID", "V3_Fisiologico_Detalle", "V4_Comorbilidad_Detalle", "V9_Fragilidad_Detalle"]
+
+
+def test_codificar_y_etiquetas_son_inversas():
+    assert codificar(["ICC", "EPOC"], OPCIONES_COMORB) == 0b0001100
+    assert etiquetas(0b0001100, OPCIONES_COMORB) == ["ICC", "EPOC"]
+    assert codificar([], OPCIONES_FRAIL) == 0
+
+
+def test_alias_de_la_etiqueta_antigua():
+    assert codificar(["Consciencia (GCS desc >2)"], OPCIONES_FISIO) == 1
+    codigos, desconocidas = decodificar_serie(pd.Series(["Consciencia (GCS desc >2), TAS < 90 mmHg"]), OPCIONES_FISIO)
+    assert codigos.tolist() == [0b11] and not desconocidas
+
+
+def test_decodificar_serie_informa_de_etiquetas_desconocidas():
+    codigos, desconocidas = decodificar_serie(pd.Series(["ICC", "Ninguna", "ICC, Gota", None]), OPCIONES_COMORB)
+    assert codigos.tolist() == [4, 0, 4, 0]
+    assert desconocidas == {"Gota"}
+
+
+def test_migrar_codigos_por_bloques(hoja):
+    filas = [CABECERA] + [
+        ["2025-01-01", f"P{i}", "TAS < 90 mmHg, Oliguria (<15ml/h)" if i % 2 else "Ninguna",
+         ["Ninguna", "ICC, EPOC", "IRC, Gota"][i % 3], "Fatiga" if i % 4 else "No Frágil"]
+        for i in range(25)
+    ]
+    ws = hoja(filas)
+    progreso = []
+
+    total, desconocidas = migrar_codigos(ws, tam_bloque=10, progreso=progreso.append)
+
+    assert total == 25 and progreso == [10, 20, 25]
+    assert desconocidas == {"Gota"}
+    cabecera = ws.datos[0]
+    assert cabecera[:5] == CABECERA
+    assert cabecera[5:] == ["V3_Fisiologico_Codigo", "V4_Comorbilidad_Codigo", "V9_Fragilidad_Codigo"]
+    for i, fila in enumerate(ws.datos[1:]):
+        assert int(fila[5]) == (0b1000010 if i % 2 else 0)
+        assert int(fila[6]) == [0, 0b0001100, 0b0000010][i % 3]
+        assert int(fila[7]) == (1 if i % 4 else 0)
+
+
+def test_migrar_codigos_es_repetible(hoja):
+    ws = hoja([CABECERA, ["2025-01-01", "P1", "Ninguna", "ICC", "Fatiga"]])
+    migrar_codigos(ws)
+    copia = [list(f) for f in ws.datos]
+    migrar_codigos(ws)
+    assert ws.datos == copia
+
+
+def test_migrar_codigos_no_para_en_un_bloque_con_detalles_vacios(hoja):
+    # Las últimas filas del primer bloque no tienen detalles: batch_get las omite
+    filas = [CABECERA] + [["2025-01-01", f"P{i}", "", "", ""] if 6 <= i < 10 else
+                          ["2025-01-01", f"P{i}", "Ninguna", "ICC", "Fatiga"] for i in range(15)]
+    ws = hoja(filas)
+
+    total, _ = migrar_codigos(ws, tam_bloque=10)
+
+    assert total == 15
+    assert [int(f[6]) for f in ws.datos[1:]] == [0 if 6 <= i < 10 else 0b100 for i in range(15)]
+
+
+def test_registro_con_codigos_vacios(tmp_path):
+    # Filas antiguas tras añadir las cabeceras de código y antes de migrar, y celdas editadas a mano
+    from snapshots import cargar_cohorte_snapshot, exportar_snapshot
+    from test_snapshots import _registros
+    from utils import cargar_registro_tipado
+
+    registros = _registros(3)
+    codigos = [("", "", ""), (3, "x", 1), (0, 4, "")]
+    for r, (fisio, comorb, frail) in zip(registros, codigos):
+        r.update(V3_Fisiologico_Codigo=fisio, V4_Comorbilidad_Codigo=comorb, V9_Fragilidad_Codigo=frail)
+
+    reg = cargar_registro_tipado(registros)
+    assert reg["V3_Fisiologico_Codigo"].tolist() == [0, 3, 0] and reg["V3_Fisiologico_Codigo"].dtype == "int8"
+    assert reg["V4_Comorbilidad_Codigo"].tolist() == [0, 0, 4]
+    assert reg["V9_Fragilidad_Codigo"].tolist() == [0, 1, 0]
+
+    exportar_snapshot(registros, directorio=str(tmp_path))
+    assert len(cargar_cohorte_snapshot(str(tmp_path))) == 3
@@ -0,0 +1,71 @@
+import dataclasses
+
+import pytest
+
+from codificacion import OPCIONES_COMORB, OPCIONES_FISIO, OPCIONES_FRAIL
+from contexto import MODELO_CONTEXTO, SCORE_MAX, ContextoPaciente
+from informes import resumen_riesgo
+from modelos import MODELOS, probabilidades
+from optimizador import activos_desde_contexto
+from prehabilitacion import mascara_desde_contexto
+
+
+def test_empaquetado_de_factores():
+    contexto = ContextoPaciente.desde_formulario(
+        70, True, ["TAS < 90 mmHg", "Oliguria (<15ml/h)"], ["IRC", "EPOC"], ["Fatiga", "Pérdida Peso >5%"],
+        cognitivo=True, ecg=True,
+    )
+    assert contexto.edad_65 and contexto.residencia and contexto.cognitivo and contexto.ecg
+    assert not contexto.ingreso and not contexto.proteinuria
+    assert contexto.fisio == 1 << 1 | 1 << 6 and contexto.p_fisiologico == 1
+    assert contexto.etiquetas_comorb() == ["IRC", "EPOC"]
+    assert contexto.etiquetas_frail() == ["Fatiga", "Pérdida Peso >5%"]
+    # Edad + residencia + fisiológico + 2 comorbilidades + cognitivo + ECG + 2 FRAIL
+    assert contexto.puntos == contexto.score == 9
+
+
+def test_derivados_iguales_que_resumen_riesgo():
+    contexto = ContextoPaciente.desde_formulario(66, False, [], ["ICC"], ["Fatiga"], proteinuria=True)
+    assert (contexto.prob, contexto.color, contexto.n_muerte) == resumen_riesgo(contexto.score)
+    assert contexto.mascara_plan == mascara_desde_contexto(contexto)
+    assert contexto.activos == activos_desde_contexto(contexto)
+
+
+def test_todos_los_factores():
+    contexto = ContextoPaciente.desde_formulario(90, True, OPCIONES_FISIO, OPCIONES_COMORB, OPCIONES_FRAIL,
+                                                 cognitivo=True, ingreso=True, proteinuria=True, ecg=True)
+    assert contexto.bits == (1 << 25) - 1
+    # Las alteraciones fisiológicas puntúan 1 en bloque: 6 binarias + 1 + 7 + 5
+    assert contexto.puntos == contexto.score == 19 <= SCORE_MAX
+
+
+def test_instancia_compartida_e_inmutable():
+    a = ContextoPaciente.desde_formulario(70, False, [], ["ICC"], [])
+    b = ContextoPaciente.desde_formulario(80, False, [], ["ICC"], [])  # Misma combinación de factores
+    assert a is b
+    assert a is not ContextoPaciente.desde_formulario(60, False, [], ["ICC"], [])
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        a.score = 0
+    assert not hasattr(a, "__dict__")  # slots: sin diccionario por instancia
+
+
+def test_sin_factores():
+    contexto = ContextoPaciente()
+    assert contexto.bits == 0 and contexto.score == 0
+    assert contexto == ContextoPaciente.desde_formulario(50, False, [], [], [])
+
+
+def test_vigente_segun_la_version_del_modelo(monkeypatch):
+    contexto = ContextoPaciente.desde_formulario(70, True, [], [], [])
+    assert contexto.vigente() and contexto.prob == pytest.approx(probabilidades(contexto.score)[MODELO_CONTEXTO])
+
+    # Recalibración: coeficientes y versión nuevos
+    monkeypatch.setitem(MODELOS, MODELO_CONTEXTO, {**MODELOS[MODELO_CONTEXTO], "version": "2.0",
+                                                   "intercepto": 0.5, "pendiente": 0.0})
+    assert not contexto.vigente()
+    # La Calculadora obtiene una instancia nueva calculada con los coeficientes nuevos
+    nuevo = ContextoPaciente.desde_formulario(70, True, [], [], [])
+    assert nuevo is not contexto and nuevo.vigente() and nuevo.version == "2.0"
+    assert nuevo.prob == pytest.approx(probabilidades(nuevo.score)[MODELO_CONTEXTO]) != contexto.prob
+    assert nuevo.n_muerte == 62
+    assert contexto.actualizado() is nuevo and nuevo.actualizado() is nuevo
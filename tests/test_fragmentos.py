@@ -0,0 +1,156 @@
+import threading
+
+import gspread
+import pytest
+
+from conftest import _RespuestaError
+from fragmentos import HojaFragmentada, periodo_de, ultima_fila_anexada
+from utils import COLUMNAS_REGISTRO
+
+
+def _fila(fecha, id_paciente="P1"):
+    fila = [""] * len(COLUMNAS_REGISTRO)
+    fila[0], fila[1], fila[2] = fecha, id_paciente, 5
+    return fila
+
+
+@pytest.fixture
+def base(hoja):
+    return hoja([COLUMNAS_REGISTRO])
+
+
+def _filas_manifiesto(documento, base="Registro"):
+    return documento.worksheet(f"{base}_manifiesto").get_all_records()
+
+
+def _filas_fragmento(documento, periodo, base="Registro"):
+    return len(documento.worksheet(f"{base}_{periodo}").datos) - 1
+
+
+def test_periodos():
+    assert periodo_de("2025-05-03") == "2025"
+    assert periodo_de("2025-05-03", "Q") == "2025Q2"
+    assert ultima_fila_anexada({"updates": {"updatedRange": "'Registro 2025'!A10:AA12"}}) == 12
+
+
+def test_reparte_por_periodo_y_anota_el_manifiesto(base):
+    registro = HojaFragmentada(base, "Y")
+    registro.append_rows([_fila("2024-12-31 10:00"), _fila("2025-01-01 09:00"), _fila("2025-02-01 09:00")])
+
+    documento = base.spreadsheet
+    assert _filas_fragmento(documento, "2024") == 1 and _filas_fragmento(documento, "2025") == 2
+    manifiesto = {r["Periodo"]: r for r in _filas_manifiesto(documento)}
+    assert manifiesto[2024]["Filas"] == 1 and manifiesto[2025]["Filas"] == 2
+    assert [r["Fecha"] for r in registro.leer(desde="2025-01-01")] == ["2025-01-01 09:00", "2025-02-01 09:00"]
+
+
+def test_dos_procesos_en_un_periodo_nuevo(base):
+    # Dos instancias sobre el mismo documento, como dos procesos del servidor
+    uno = HojaFragmentada(base, "Y")
+    otro = HojaFragmentada(base, "Y")
+    uno.append_rows([_fila("2025-01-01 09:00", "A")])
+    otro.append_rows([_fila("2025-01-02 09:00", "B"), _fila("2025-01-03 09:00", "C")])
+    uno.append_rows([_fila("2025-01-04 09:00", "D")])
+
+    documento = base.spreadsheet
+    manifiesto = _filas_manifiesto(documento)
+    assert len(manifiesto) == 1  # Una sola fila para el periodo
+    # Recuento tomado de la hoja, no de lo que ha escrito cada proceso
+    assert manifiesto[0]["Filas"] == 4 == _filas_fragmento(documento, "2025")
+    assert documento.worksheet("Registro_2025").datos[0] == COLUMNAS_REGISTRO
+
+
+def test_hoja_creada_por_otro_proceso_sin_anotar(base):
+    registro = HojaFragmentada(base, "Y")
+    documento = base.spreadsheet
+    # Otro proceso creó el fragmento, pero todavía no lo ha anotado en el manifiesto
+    documento.add_worksheet("Registro_2025").update(range_name="A1", values=[COLUMNAS_REGISTRO])
+
+    registro.append_rows([_fila("2025-01-01 09:00")])  # add_worksheet choca: reabre la existente
+    assert _filas_fragmento(documento, "2025") == 1
+    assert _filas_manifiesto(documento) == []
+
+    documento.worksheet("Registro_manifiesto").append_row(["2025", "Registro_2025", "2025-01-01", "2025-12-31", 0])
+    registro.append_rows([_fila("2025-01-02 09:00")])
+    assert _filas_manifiesto(documento)[0]["Filas"] == 2
+
+
+def test_fila_del_manifiesto_segun_la_hoja(base):
+    registro = HojaFragmentada(base, "Y")
+    registro.append_rows([_fila("2024-06-01 09:00")])
+    # Otro proceso anota un periodo entre medias: la fila de 2025 ya no es len(entradas) + 2
+    otro = HojaFragmentada(base, "Y")
+    otro.append_rows([_fila("2023-06-01 09:00")])
+    registro.append_rows([_fila("2025-06-01 09:00"), _fila("2025-06-02 09:00")])
+
+    manifiesto = {r["Periodo"]: r["Filas"] for r in _filas_manifiesto(base.spreadsheet)}
+    assert manifiesto == {2024: 1, 2023: 1, 2025: 2}
+
+
+def test_fragmento_antiguo_sin_servicio(base):
+    # Fragmento anterior a "Servicio" y con una columna añadida a mano: Servicio queda detrás
+    antiguas = [c for c in COLUMNAS_REGISTRO if c != "Servicio"]
+    registro = HojaFragmentada(base, "Y")
+    documento = base.spreadsheet
+    documento.add_worksheet("Registro_2024").update(range_name="A1", values=[antiguas + ["Notas"]])
+    documento.worksheet("Registro_manifiesto").append_row(["2024", "Registro_2024", "2024-01-01", "2024-12-31", 0])
+
+    fila = _fila("2024-03-01 09:00")
+    fila[COLUMNAS_REGISTRO.index("Servicio")] = "Cardiología"
+    registro.append_rows([fila])
+
+    escrita = documento.worksheet("Registro_2024").get_all_records()[0]
+    assert escrita["Servicio"] == "Cardiología" and escrita["Notas"] == ""
+    assert escrita["ID"] == "P1" and escrita["Score_Total"] == 5
+
+
+def test_creacion_concurrente_en_el_mismo_proceso(base):
+    registro = HojaFragmentada(base, "Y")
+    hilos = [threading.Thread(target=registro.append_rows, args=([_fila(f"2025-01-0{i + 1} 09:00")],))
+             for i in range(5)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    assert len(_filas_manifiesto(base.spreadsheet)) == 1
+    assert _filas_fragmento(base.spreadsheet, "2025") == 5
+
+
+def test_periodos_para_solapan_el_rango(base):
+    registro = HojaFragmentada(base, "Q")
+    registro.append_rows([_fila(f"2025-{m:02d}-15 09:00") for m in (1, 4, 7, 10)])
+    assert registro.periodos_para("2025-05-01", "2025-08-01") == ["2025Q2", "2025Q3"]
+    assert list(registro.manifiesto()["Periodo"]) == ["2025Q1", "2025Q2", "2025Q3", "2025Q4"]
+
+
+def test_error_de_la_api_al_crear_un_fragmento_no_reabre(base, monkeypatch):
+    registro = HojaFragmentada(base, "Y")
+    documento = base.spreadsheet
+
+    def cuota_agotada(title, rows=1000, cols=26):
+        raise gspread.exceptions.APIError(_RespuestaError(429, "Quota exceeded for quota metric 'Write requests'"))
+
+    monkeypatch.setattr(documento, "add_worksheet", cuota_agotada)
+    with pytest.raises(gspread.exceptions.APIError) as error:
+        registro.append_rows([_fila("2025-01-01 09:00")])
+    assert error.value.code == 429
+    assert "Registro_2025" not in documento.hojas and "2025" not in registro._hojas
+
+    # Pasado el error, el mismo registro crea y anota el fragmento
+    monkeypatch.undo()
+    registro.append_rows([_fila("2025-01-01 09:00")])
+    assert _filas_fragmento(documento, "2025") == 1 and len(_filas_manifiesto(documento)) == 1
+
+
+def test_archivar_devuelve_las_filas_sin_fecha(base, hoja):
+    origen = hoja([COLUMNAS_REGISTRO, _fila("2024-05-01 10:00", "A"), _fila("", "B"), _fila("31/02/2025", "C"),
+                   _fila("2025-01-01 09:00", "D"), _fila("pendiente", "E")], titulo="Antigua")
+    registro = HojaFragmentada(base, "Y")
+    avances = []
+
+    n, descartadas = registro.archivar(origen, tam_lote=1, progreso=avances.append)
+    assert n == 2 and avances == [1, 2]
+    assert descartadas == [(3, ""), (4, "31/02/2025"), (6, "pendiente")]
+    assert [r["ID"] for r in registro.leer()] == ["A", "D"]
+    assert registro.archivar(hoja([COLUMNAS_REGISTRO])) == (0, [])
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from graficos import MAX_FILAS_GRAFICO, _acotado, grafico_tendencias, nota_reduccion
+from tendencias import TendenciasCohorte
+
+METRICAS = ['Score_Medio', 'Mortalidad_Estimada_%', 'Alto_Critico_%', 'Mortalidad_Observada_%']
+
+
+def test_acotado_reduce_en_vez_de_fallar():
+    datos = pd.DataFrame({'x': range(2000)})
+    reducidos = _acotado(datos)
+    assert len(reducidos) <= MAX_FILAS_GRAFICO
+    assert reducidos['x'].iloc[0] == 0
+    assert "1 de cada 4" in nota_reduccion(reducidos)
+
+
+def test_acotado_no_toca_tablas_pequenas():
+    datos = pd.DataFrame({'x': range(10)})
+    assert _acotado(datos) is datos
+    assert nota_reduccion(datos) is None
+
+
+def test_serie_larga_se_agrupa_en_periodos_mas_gruesos(cohorte):
+    df = cohorte(n=7 * 600)  # ~600 semanas
+    tendencias = TendenciasCohorte.desde_cohorte(df)
+
+    serie = tendencias.serie("W", max_periodos=MAX_FILAS_GRAFICO)
+    assert len(serie) <= MAX_FILAS_GRAFICO
+    assert serie.attrs['periodos_por_punto'] == 2
+    assert "2 periodos" in nota_reduccion(serie)
+    # Las medias se recalculan con las sumas: nada se pierde al agrupar
+    assert serie['Pacientes'].sum() == len(df)
+    assert np.isclose((serie['Score_Medio'] * serie['Pacientes']).sum(), df['Score_CriSTAL'].sum())
+
+    grafico_tendencias(serie, METRICAS).to_dict()
+
+
+def test_serie_sin_limite_no_cambia(cohorte):
+    tendencias = TendenciasCohorte.desde_cohorte(cohorte(n=7 * 600))
+    serie = tendencias.serie("W")
+    assert len(serie) > MAX_FILAS_GRAFICO
+    assert serie.attrs['periodos_por_punto'] == 1
+    grafico_tendencias(serie, METRICAS).to_dict()  # Se reduce dentro del gráfico
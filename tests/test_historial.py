@@ -0,0 +1,39 @@
+from concurrent.futures import Future
+
+import pandas as pd
+
+from historial import HistorialPacientes
+
+
+def _valoracion(id_paciente, fecha, score):
+    return {"Fecha": fecha, "ID": id_paciente, "Score_Total": score, "Prob_Mortalidad_Mat_%": 10.0}
+
+
+def test_historial_ordenado_con_deltas():
+    historial = HistorialPacientes.desde_registros([
+        _valoracion("A", "2025-03-01 10:00", 9),
+        _valoracion("B", "2025-01-15 10:00", 4),
+        _valoracion("A", "2025-01-01 10:00", 6),
+    ])
+    previas = historial.historial("A")
+    assert previas["Score_Total"].tolist() == [6, 9]
+    assert previas["Delta_Score"].iloc[-1] == 3
+    assert historial.num_valoraciones("B") == 1
+
+
+def test_agregar_al_guardarse_espera_a_la_confirmacion():
+    historial = HistorialPacientes()
+    futuro = Future()
+    historial.agregar_al_guardarse(futuro, pd.DataFrame([_valoracion("A", "2025-01-01 10:00", 6)]))
+    assert len(historial) == 0  # Todavía en la cola del escritor
+
+    futuro.set_result(1)
+    assert historial.num_valoraciones("A") == 1
+
+
+def test_agregar_al_guardarse_descarta_las_escrituras_fallidas():
+    historial = HistorialPacientes()
+    futuro = Future()
+    historial.agregar_al_guardarse(futuro, [_valoracion("A", "2025-01-01 10:00", 6)])
+    futuro.set_exception(RuntimeError("APIError 429"))
+    assert len(historial) == 0 and historial.historial("A").empty
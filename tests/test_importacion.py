@@ -0,0 +1,141 @@
+import json
+
+import gspread
+import pandas as pd
+import pytest
+
+import importacion
+from conftest import _RespuestaError
+from fragmentos import HojaFragmentada
+from importacion import EscrituraConCuota, importar, leer_fechas
+from utils import COLUMNAS_REGISTRO
+
+
+def _error(codigo):
+    return gspread.exceptions.APIError(_RespuestaError(codigo, "error simulado"))
+
+
+def _csv(ruta, fechas, **columnas):
+    filas = [{
+        "Fecha": f, "ID": f"P{i}", "V1_Edad_Valor": "70", "V2_Residencia_Valor": "No",
+        "V3_Fisiologico_Detalle": "Ninguna", "V4_Comorbilidad_Detalle": "ICC",
+        "V5_Cognitivo_Detalle": "No", "V6_IngresoPrevio_Valor": "No", "V7_Proteinuria_Valor": "No",
+        "V8_ECG_Valor": "No", "V9_Fragilidad_Detalle": "Fatiga", "Outcome_30dias": "",
+    } for i, f in enumerate(fechas)]
+    pd.DataFrame(filas).assign(**columnas).to_csv(ruta, index=False)
+    return str(ruta)
+
+
+@pytest.fixture
+def sin_esperas(monkeypatch):
+    esperas = []
+    monkeypatch.setattr(importacion.time, "sleep", esperas.append)
+    return esperas
+
+
+@pytest.fixture
+def fragmentado(hoja):
+    return HojaFragmentada(hoja([COLUMNAS_REGISTRO]), "Y")
+
+
+def _ids(registro):
+    return [r["ID"] for r in registro.leer()]
+
+
+def _fallar(ws, veces, codigo):
+    """Hace que los próximos `veces` append_rows de `ws` fallen con `codigo` (sin escribir)."""
+    original = ws.append_rows
+
+    def append_rows(filas, **kwargs):
+        if fallos[0] < veces:
+            fallos[0] += 1
+            ws.peticiones += 1
+            raise _error(codigo)
+        return original(filas, **kwargs)
+    fallos = [0]
+    ws.append_rows = append_rows
+
+
+def test_cuenta_las_peticiones_reales(fragmentado, sin_esperas):
+    escritura = EscrituraConCuota(fragmentado, intervalo=1.0)
+    antes = fragmentado.peticiones
+    escritura.anexar([["2024-05-01 10:00", "A"], ["2025-05-01 10:00", "B"]])
+
+    # Dos periodos nuevos: hojas, cabeceras y manifiesto, no dos peticiones
+    assert escritura.peticiones == fragmentado.peticiones - antes > 2
+    coste_segundo = fragmentado.peticiones
+    escritura.anexar([["2025-06-01 10:00", "C"]])
+    coste_segundo = fragmentado.peticiones - coste_segundo
+    # Antes de la tercera escritura se espera un intervalo por cada petición de la segunda
+    escritura.anexar([["2025-07-01 10:00", "D"]])
+    assert sin_esperas[-1] == pytest.approx(coste_segundo, abs=0.05)
+
+
+def test_hoja_unica_una_peticion_por_lote(hoja, sin_esperas):
+    ws = hoja([COLUMNAS_REGISTRO])
+    escritura = EscrituraConCuota(ws, intervalo=1.0)
+    escritura.anexar([["2025-01-01 10:00", "A"]])
+    escritura.anexar([["2025-01-02 10:00", "B"]])
+    assert escritura.peticiones == 2
+    assert ws.peticiones == 2
+
+
+def test_reintento_parcial_no_duplica(fragmentado, sin_esperas):
+    escritura = EscrituraConCuota(fragmentado, intervalo=0)
+    fragmentado.hoja("2025")  # El fragmento 2025 existe y su primer append fallará con 429
+    _fallar(fragmentado.hoja("2025")._objeto, 1, 429)
+
+    escritura.anexar([["2024-05-01 10:00", "A"], ["2025-05-01 10:00", "B"]])
+    assert sorted(_ids(fragmentado)) == ["A", "B"]
+
+
+def test_reanudar_tras_fallo_parcial_no_duplica(tmp_path, fragmentado, sin_esperas):
+    ruta = _csv(tmp_path / "historico.csv", ["2024-03-01 10:00", "2024-04-01 10:00", "2025-03-01 10:00"])
+    fragmentado.hoja("2025")
+    _fallar(fragmentado.hoja("2025")._objeto, 1, 403)  # No reintentable: la importación se interrumpe
+
+    with pytest.raises(gspread.exceptions.APIError):
+        importar(ruta, fragmentado)
+    control = json.load(open(ruta + ".checkpoint.json"))
+    assert control["leidas"] == 0 and control["escritos"] == ["2024"]
+
+    resumen = importar(ruta, fragmentado)
+    assert resumen == {"leidas": 3, "importadas": 3, "rechazadas": 0}
+    assert sorted(_ids(fragmentado)) == ["P0", "P1", "P2"]
+
+
+def test_importar_rechaza_y_reanuda(tmp_path, hoja, sin_esperas):
+    ruta = _csv(tmp_path / "historico.csv", ["2025-01-01 10:00", "no es fecha", "2025-01-03 10:00"])
+    ws = hoja([COLUMNAS_REGISTRO])
+
+    assert importar(ruta, ws, tam_bloque=2) == {"leidas": 3, "importadas": 2, "rechazadas": 1}
+    assert [f[1] for f in ws.datos[1:]] == ["P0", "P2"]
+    rechazos = pd.read_csv(ruta + ".rechazadas.csv")
+    assert rechazos["Fila"].tolist() == [3] and "Fecha" in rechazos["Motivo"].iloc[0]
+
+    # Con el punto de control completo, volver a ejecutar no escribe nada
+    assert importar(ruta, ws, tam_bloque=2)["importadas"] == 2
+    assert len(ws.datos) == 3
+
+
+def test_fechas_en_formato_espanol():
+    fechas = leer_fechas(pd.Series(["01/02/2020", "13/02/2020 09:30", "2020-02-01 10:00", "2020-13-01", ""]))
+    assert fechas.iloc[:3].tolist() == [pd.Timestamp("2020-02-01"), pd.Timestamp("2020-02-13 09:30"),
+                                        pd.Timestamp("2020-02-01 10:00")]
+    assert fechas.iloc[3:].isna().all()
+
+
+def test_importar_valida_outcome_y_servicio(tmp_path, hoja, sin_esperas):
+    ruta = _csv(tmp_path / "historico.csv", ["01/02/2020", "13/02/2020", "14/02/2020", "15/02/2020", "16/02/2020"],
+                Outcome_30dias=["1", "", "2", "0", "0"],
+                Servicio=["Urología", "", "Urología", "Dermatología", "Traumatología"])
+    ws = hoja([COLUMNAS_REGISTRO])
+
+    assert importar(ruta, ws) == {"leidas": 5, "importadas": 3, "rechazadas": 2}
+    filas = ws.get_all_records()
+    assert [(f["ID"], f["Fecha"], f["Outcome_30dias"], f["Servicio"]) for f in filas] == [
+        ("P0", "2020-02-01 00:00", 1, "Urología"), ("P1", "2020-02-13 00:00", "", ""),
+        ("P4", "2020-02-16 00:00", 0, "Traumatología"),
+    ]
+    motivos = pd.read_csv(ruta + ".rechazadas.csv")["Motivo"].tolist()
+    assert motivos == ["Outcome_30dias no es 0, 1 o vacío", "Servicio desconocido"]
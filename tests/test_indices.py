@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indices import Bits, IndiceCohorte
+
+FACTORES = ['Edad_65+', 'Fragilidad', 'Comorbilidad_ICC', 'Comorbilidad_EPOC',
+            'Fisiologico_Agudo', 'Deterioro_Cognitivo']
+
+
+def _filas(bits):
+    return bits.filas().tolist()
+
+
+def _mascara(serie):
+    return np.flatnonzero(serie.to_numpy()).tolist()
+
+
+@pytest.mark.parametrize("n", [1, 8, 13, 203])
+def test_invertir_no_activa_los_bits_de_relleno(n):
+    vacio = Bits(np.zeros((n + 7) // 8, dtype=np.uint8), n)
+    todos = ~vacio
+    assert todos.contar() == n and _filas(todos) == list(range(n))
+    assert (~todos).contar() == 0
+
+
+def test_consultas_igual_que_mascaras_de_pandas(cohorte):
+    df = cohorte(203, semilla=5)  # 203 no es múltiplo de 8: el último byte tiene relleno
+    indice = IndiceCohorte.desde_cohorte(df, FACTORES)
+
+    assert _filas(indice.consultar(todos=["Edad_65+", "Fragilidad"])) == _mascara(df['Edad_65+'] & df['Fragilidad'])
+    assert _filas(indice.consultar(alguno=["Comorbilidad_ICC", "Comorbilidad_EPOC"], ninguno=["Edad_65+"])) == \
+        _mascara((df['Comorbilidad_ICC'] | df['Comorbilidad_EPOC']) & ~df['Edad_65+'])
+    ninguno = indice.consultar(ninguno=["Fisiologico_Agudo"])
+    assert ninguno.contar() == int((~df['Fisiologico_Agudo']).sum())
+    assert _filas(~indice.factor("Fragilidad")) == _mascara(~df['Fragilidad'])
+
+    for s in (0, 1, 12, 20, 25):
+        assert _filas(indice.score_min(s)) == _mascara(df['Score_CriSTAL'] >= s)
+    for k in (0, 3, 5):
+        assert _filas(indice.frail_min(k)) == _mascara(df['Items_FRAIL'] >= k)
+    codigos = df['Categoria_Riesgo'].cat.codes
+    assert _filas(indice.categoria(1)) == _mascara(codigos == 1)
+    assert _filas(indice.categoria_min(2)) == _mascara(codigos >= 2)
+
+    mes = df['Fecha_Registro'].dt.to_period('M')
+    assert _filas(indice.periodo("2024-02", "2024-04")) == \
+        _mascara((mes >= pd.Period("2024-02")) & (mes <= pd.Period("2024-04")))
+    assert _filas(indice.periodo("2024-06")) == _mascara(mes >= pd.Period("2024-06"))
+
+
+def test_agregar_incremental_igual_que_reconstruir(cohorte):
+    df = cohorte(300, semilla=6)
+    completo = IndiceCohorte.desde_cohorte(df, FACTORES)
+    incremental = IndiceCohorte(FACTORES)
+    for inicio, fin in [(0, 5), (5, 8), (8, 8), (8, 131), (131, 300)]:  # Lotes que cortan bytes por la mitad
+        incremental.agregar(df.iloc[inicio:fin])
+
+    assert incremental.n == completo.n == 300
+    for consulta in (lambda i: i.consultar(todos=["Fragilidad"], ninguno=["Comorbilidad_EPOC"]),
+                     lambda i: i.score_min(10) & i.categoria_min(1),
+                     lambda i: i.periodo("2024-09") | i.frail_min(4),
+                     lambda i: ~i.factor("Deterioro_Cognitivo")):
+        assert _filas(consulta(incremental)) == _filas(consulta(completo))
+
+
+def test_mes_nuevo_tras_otras_filas(cohorte):
+    # Un mes que aparece por primera vez en un lote posterior no marca las filas anteriores
+    df = cohorte(20, semilla=7)
+    indice = IndiceCohorte.desde_cohorte(df.iloc[:10], FACTORES)
+    indice.agregar(df.iloc[10:].assign(Fecha_Registro=pd.Timestamp("2030-01-15")))
+    assert _filas(indice.periodo("2030-01", "2030-01")) == list(range(10, 20))
@@ -0,0 +1,105 @@
+import base64
+import contextlib
+import re
+
+import pytest
+
+import informes
+from cache_compartida import CacheCompartida
+from informes import generar_informes, imagen_pastel, imagen_waffle, informe_html, informe_pdf, resumen_riesgo
+from prehabilitacion import BIT_EPOC, plan_para_mascara
+from utils import calcular_probabilidad_math, cargar_registro_tipado
+
+PNG = b"\x89PNG\r\n\x1a\n"
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    """Caché de imágenes en un directorio temporal y sin memorizar entre tests."""
+    monkeypatch.setattr(informes, "CACHE", CacheCompartida(str(tmp_path / "cache")))
+    for f in (imagen_pastel, imagen_waffle, informes._imagen_b64):
+        f.cache_clear()
+    yield informes.CACHE
+    for f in (imagen_pastel, imagen_waffle, informes._imagen_b64):
+        f.cache_clear()
+
+
+def _paciente(score=13, mascara=1 << BIT_EPOC, id="H<1>"):
+    return {"ID": id, "Fecha": "2025-03-01 09:30", "Score_Total": score, "Mascara": mascara}
+
+
+def test_resumen_riesgo():
+    prob, _, n_muerte = resumen_riesgo(13)
+    assert prob == pytest.approx(float(calcular_probabilidad_math(13)))
+    assert n_muerte == round(prob)
+    assert resumen_riesgo(13, prob=40.0)[0::2] == (40.0, 40)
+
+
+def test_informe_html_contiene_score_y_probabilidad():
+    pagina = informe_html(_paciente())
+    prob, color, n_muerte = resumen_riesgo(13)
+
+    assert "<h1>13 / 20</h1>" in pagina
+    assert f"<b>{prob:.1f}%</b>" in pagina
+    assert f"estadísticamente <b>{n_muerte}</b>" in pagina
+    assert color in pagina
+    assert "H&lt;1&gt;" in pagina and "H<1>" not in pagina  # El ID se escapa
+
+    # Las imágenes embebidas son las del score del paciente
+    imagenes = re.findall(r'src="data:image/png;base64,([^"]+)"', pagina)
+    assert [base64.b64decode(i) for i in imagenes] == [imagen_pastel(13), imagen_waffle(13)]
+    # Una sección por cada apartado del plan (EPOC + medidas generales)
+    secciones = {s for s, *_ in plan_para_mascara(1 << BIT_EPOC)}
+    assert pagina.count("<h3>") == len(secciones)
+
+
+def test_imagenes_cacheadas_por_score(cache):
+    pastel = imagen_pastel(5)
+    assert pastel.startswith(PNG) and imagen_waffle(5).startswith(PNG)
+    assert cache.version("pastel_5") == informes.VERSION_IMAGENES
+    assert imagen_pastel(5) is pastel
+
+    # Otro proceso (sin lru_cache) lee el mismo PNG de la caché compartida en disco
+    imagen_pastel.cache_clear()
+    otra = CacheCompartida(cache.directorio)
+    assert otra.leer("pastel_5", informes.VERSION_IMAGENES) == pastel
+    assert imagen_pastel(6) != pastel
+
+
+def test_informe_pdf(tmp_path, monkeypatch):
+    ruta = tmp_path / "informe.pdf"
+    informe_pdf(_paciente(score=16), str(ruta))
+    assert ruta.read_bytes().startswith(b"%PDF")
+
+    figuras = []
+
+    @contextlib.contextmanager
+    def capturar(_):
+        class Pdf:
+            savefig = staticmethod(figuras.append)
+        yield Pdf
+
+    monkeypatch.setattr(informes, "PdfPages", capturar)
+    informe_pdf(_paciente(score=16), str(ruta))
+    textos = "\n".join(t.get_text() for t in figuras[0].texts)
+    prob, _, n_muerte = resumen_riesgo(16)
+    assert f"Score 16 / 20  ·  Mortalidad estimada {prob:.1f}%" in textos
+    assert f"De cada 100 personas con este perfil, {n_muerte} no sobrevivirían" in textos
+    assert "Paciente: H<1>" in textos
+
+
+@pytest.mark.parametrize("procesos", [1, 2])
+def test_generar_informes_en_lote(tmp_path, procesos):
+    reg = cargar_registro_tipado([{
+        "ID": f"H/{i}", "Fecha": "2025-01-01 10:00", "Score_Total": [4, 15][i % 2],  # Pocos scores: pocas imágenes
+        "V1_Edad_Puntos": 1, "V2_Residencia_Puntos": 0, "V3_Fisiologico_Puntos": 0, "V3_Fisiologico_Detalle": "Ninguna",
+        "V4_Comorbilidad_Detalle": "EPOC", "V5_Cognitivo_Puntos": 0, "V9_Fragilidad_Detalle": "No Frágil",
+    } for i in range(24)])
+
+    rutas = generar_informes(reg, directorio=str(tmp_path / "informes"), procesos=procesos)
+    assert [r.rsplit("/", 1)[-1] for r in rutas] == [f"CriSTAL_H_{i}.html" for i in range(24)]
+    for i, ruta in enumerate(rutas):
+        with open(ruta, encoding="utf-8") as f:
+            pagina = f.read()
+        score = [4, 15][i % 2]
+        assert f"<h1>{score} / 20</h1>" in pagina and f"<b>{resumen_riesgo(score)[0]:.1f}%</b>" in pagina
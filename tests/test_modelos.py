@@ -0,0 +1,103 @@
+import itertools
+import warnings
+
+import numpy as np
+import pytest
+
+from modelos import (INTERCEPTO_CRISTAL, PENDIENTE_CRISTAL, MODELOS, _auc, _sigmoide, evaluar_modelos,
+                     metricas_modelos, probabilidades, recalibrar, registrar_modelo, tabla_calibracion)
+from utils import calcular_probabilidad_math
+
+
+def _outcomes(n, intercepto, pendiente, semilla=0):
+    rng = np.random.default_rng(semilla)
+    scores = rng.integers(0, 21, n)
+    outcomes = (rng.random(n) < _sigmoide(intercepto + pendiente * scores)).astype(float)
+    return scores, outcomes
+
+
+def test_cristal_original_igual_que_la_formula():
+    scores = np.arange(21)
+    prob, acotado = evaluar_modelos(scores, ["CriSTAL original"])
+    np.testing.assert_allclose(prob["CriSTAL original"], calcular_probabilidad_math(scores), rtol=1e-6)
+    assert not acotado.to_numpy().any()
+
+
+def test_tesis_literal_estable_y_acotada():
+    scores = np.array([0, 1, 5, 20, 200, 1000, -1000])
+    with warnings.catch_warnings(), np.errstate(over="raise", invalid="raise", divide="raise"):
+        warnings.simplefilter("error")
+        prob, acotado = evaluar_modelos(scores)
+
+    tesis = prob["Tesis literal"].to_numpy()
+    logit = INTERCEPTO_CRISTAL + PENDIENTE_CRISTAL * scores[:2]
+    np.testing.assert_allclose(tesis[:2], np.minimum(np.exp(scores[:2]) / (1 + np.exp(logit)), 1) * 100)
+    assert np.isfinite(prob.to_numpy()).all() and (prob.to_numpy() >= 0).all() and (prob.to_numpy() <= 100).all()
+    assert (tesis[2:6] == 100).all() and acotado["Tesis literal"].tolist() == [False, True, True, True, True, True, False]
+    assert prob["CriSTAL original"].iloc[-2] == 100 and prob["CriSTAL original"].iloc[-1] == pytest.approx(0)
+    assert not acotado["CriSTAL original"].any()
+
+
+def test_recalibrar_recupera_los_coeficientes():
+    scores, outcomes = _outcomes(50000, -2.0, 0.15)
+    outcomes[::10] = np.nan  # Outcomes desconocidos: se ignoran
+    intercepto, pendiente, n = recalibrar(scores, outcomes)
+
+    assert n == 45000
+    assert intercepto == pytest.approx(-2.0, abs=0.1) and pendiente == pytest.approx(0.15, abs=0.01)
+    # Máximo de la verosimilitud: el gradiente se anula
+    conocidos = ~np.isnan(outcomes)
+    x = np.column_stack([np.ones(n), scores[conocidos]])
+    gradiente = x.T @ (outcomes[conocidos] - _sigmoide(x @ [intercepto, pendiente]))
+    np.testing.assert_allclose(gradiente, 0, atol=1e-6)
+
+
+def test_recalibrar_exige_ambas_clases():
+    with pytest.raises(ValueError):
+        recalibrar([1, 2, 3], [0, 0, np.nan])
+
+
+def test_auc_igual_que_comparar_todos_los_pares():
+    rng = np.random.default_rng(1)
+    prob = rng.integers(0, 5, 60) / 4  # Con empates
+    y = (rng.random(60) < prob).astype(float)
+    pares = [(1.0 if p1 > p0 else 0.5 if p1 == p0 else 0.0)
+             for (p1, y1), (p0, y0) in itertools.product(zip(prob, y), repeat=2) if y1 == 1 and y0 == 0]
+    assert _auc(prob, y) == pytest.approx(np.mean(pares))
+    assert np.isnan(_auc(prob, np.zeros(60)))
+
+
+def test_metricas_modelos():
+    scores, outcomes = _outcomes(5000, INTERCEPTO_CRISTAL, PENDIENTE_CRISTAL, semilla=2)
+    outcomes[:100] = np.nan
+    registro = dict(MODELOS)
+    registrar_modelo("Local", *recalibrar(scores, outcomes)[:2], version="test", registro=registro)
+    metricas = metricas_modelos(scores, outcomes, registro=registro).set_index("Modelo")
+
+    conocidos = ~np.isnan(outcomes)
+    y = outcomes[conocidos]
+    p = calcular_probabilidad_math(scores[conocidos]) / 100
+    original = metricas.loc["CriSTAL original"]
+    assert original["Mortalidad_Observada_%"] == pytest.approx(y.mean() * 100)
+    assert original["O/E"] == pytest.approx(y.sum() / p.sum(), rel=1e-5)
+    assert original["Brier"] == pytest.approx(np.mean((p - y) ** 2), rel=1e-5)
+    assert original["AUC"] == pytest.approx(metricas.loc["Local", "AUC"])  # Misma ordenación de los scores
+    assert metricas.loc["Local", "O/E"] == pytest.approx(1, abs=1e-6)  # La MV iguala muertes esperadas y observadas
+    assert metricas.loc["Local", "Version"] == "test"
+    assert metricas.loc["Tesis literal", "Acotados_%"] > 90
+    assert "Local" not in MODELOS
+
+
+def test_tabla_calibracion():
+    scores = np.array([2, 2, 2, 9, 9, 15])
+    outcomes = np.array([0, 1, np.nan, 0, 0, 1])
+    tabla = tabla_calibracion(scores, outcomes, ["CriSTAL original"])
+
+    assert tabla["Score"].tolist() == [2, 9, 15]
+    assert tabla["Pacientes"].tolist() == [2, 2, 1]
+    assert tabla["Observada"].tolist() == [50, 0, 100]
+    np.testing.assert_allclose(tabla["CriSTAL original"], calcular_probabilidad_math(np.array([2, 9, 15])), rtol=1e-6)
+
+
+def test_probabilidades_de_un_score():
+    assert probabilidades(10, ["CriSTAL original"]) == {"CriSTAL original": pytest.approx(float(calcular_probabilidad_math(10)))}
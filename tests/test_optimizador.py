@@ -0,0 +1,76 @@
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+from optimizador import (INTERVENCIONES, SCORE_MAX, SUBCONJUNTOS, activos_desde_registro, evaluar_cohorte,
+                         mejor_plan_cohorte, planes_cohorte, puntos_desde_registro, ranking_paciente)
+from test_snapshots import _registros
+from utils import calcular_probabilidad_math, cargar_registro_tipado
+
+K = len(INTERVENCIONES)
+
+
+def _fuerza_bruta(puntos, activos, max_intervenciones=K):
+    """Mejor plan re-puntuando cada combinación de factores presentes por separado."""
+    presentes = [i for i in range(K) if activos[i]]
+    mejor = None
+    for tam in range(min(len(presentes), max_intervenciones) + 1):
+        for plan in combinations(presentes, tam):
+            score = min(max(puntos - len(plan), 0), SCORE_MAX)
+            clave = (calcular_probabilidad_math(score), tam)
+            if mejor is None or clave < mejor[0]:
+                mejor = (clave, score, plan)
+    return mejor[1], mejor[0][0], mejor[2]
+
+
+def _cohorte(n=300, semilla=0):
+    rng = np.random.default_rng(semilla)
+    return rng.integers(0, 25, n), rng.random((n, K)) < 0.4
+
+
+def test_evaluar_cohorte_todas_las_combinaciones():
+    puntos, activos = _cohorte(50)
+    scores, probs = evaluar_cohorte(puntos, activos)
+    assert scores.shape == probs.shape == (50, 1 << K)
+    for i in range(50):
+        for j in (0, 5, 77, (1 << K) - 1):
+            quitados = int((SUBCONJUNTOS[j].astype(bool) & activos[i]).sum())
+            assert scores[i, j] == min(max(puntos[i] - quitados, 0), SCORE_MAX)
+    np.testing.assert_allclose(probs, calcular_probabilidad_math(scores))
+
+
+@pytest.mark.parametrize("maximo", [None, 2])
+def test_mejor_plan_igual_que_fuerza_bruta(maximo):
+    puntos, activos = _cohorte()
+    planes = mejor_plan_cohorte(puntos, activos, maximo)
+    for i in range(len(puntos)):
+        score, prob, plan = _fuerza_bruta(puntos[i], activos[i], maximo or K)
+        fila = planes.iloc[i]
+        assert fila['Score_Optimizado'] == score and fila['Prob_Optimizada_%'] == pytest.approx(prob)
+        assert fila['Intervenciones'] == ", ".join(INTERVENCIONES[j][0] for j in plan)
+
+
+def test_ranking_paciente():
+    activos = 0b0100011  # Fisiológico, fatiga e ICC
+    ranking = ranking_paciente(15, activos)
+    assert len(ranking) == 7  # Combinaciones no vacías de 3 factores
+    assert ranking.iloc[0]['Nº'] == 3 and ranking.iloc[0]['Score'] == 12
+    assert ranking['Reduccion_%'].is_monotonic_decreasing
+    assert ranking_paciente(15, activos) is ranking  # Memorizado por combinación
+
+
+def test_planes_desde_el_registro():
+    registros = _registros(40)
+    registros[0].update(V9_Fragilidad_Detalle="Fatiga, Deambulación", V9_Fragilidad_Codigo="")  # Sin migrar
+    reg = cargar_registro_tipado(registros)
+
+    activos = activos_desde_registro(reg)
+    assert activos[0].tolist() == [False, True, False, True, False, False, False]
+    assert activos[1].tolist()[5:] == [True, True]  # "ICC, EPOC"
+    fila = registros[0]
+    assert puntos_desde_registro(reg)[0] == sum(v for c, v in fila.items() if c.endswith("_Puntos"))
+
+    planes = planes_cohorte(reg)
+    assert len(planes) == 40 and planes['Reduccion_%'].is_monotonic_decreasing
+    assert set(planes['ID']) == set(reg['ID'].astype(str))
@@ -0,0 +1,113 @@
+from concurrent.futures import Future
+
+from persistencia import EscritorRegistro, HojaAlineada, alinear_filas, estado_escritura, podar_guardados
+
+
+def _futuro(estado):
+    futuro = Future()
+    if estado == "guardado":
+        futuro.set_result(1)
+    elif estado == "error":
+        futuro.set_exception(RuntimeError("cuota"))
+    return futuro
+
+
+def _guardados(estados):
+    return [(f"P{i}", "10:00", _futuro(e)) for i, e in enumerate(estados)]
+
+
+def test_estado_escritura():
+    assert [estado_escritura(_futuro(e)) for e in ("pendiente", "guardado", "error")] == \
+        ["pendiente", "guardado", "error"]
+
+
+def test_podar_guardados_conserva_pendientes_y_fallidos():
+    guardados = _guardados(["error", "pendiente", "guardado", "guardado", "guardado", "guardado"])
+    podar_guardados(guardados, 3)
+    # Se descartan los guardados más antiguos; el error y el pendiente siguen
+    assert [g[0] for g in guardados] == ["P0", "P1", "P5"]
+
+
+def test_podar_guardados_puede_superar_el_maximo_sin_perder_errores():
+    guardados = _guardados(["error"] * 4 + ["guardado"])
+    podar_guardados(guardados, 2)
+    assert [g[0] for g in guardados] == ["P0", "P1", "P2", "P3"]
+
+
+def test_podar_guardados_por_debajo_del_maximo():
+    guardados = _guardados(["guardado", "guardado"])
+    podar_guardados(guardados, 10)
+    assert len(guardados) == 2
+
+
+def test_filas_en_el_orden_de_una_cabecera_antigua(hoja):
+    # Hoja anterior a "Servicio" con una columna propia del centro: la nueva va al final
+    ws = hoja([["Fecha", "ID", "Notas", "Score_Total"], ["2024-01-01", "P0", "x", 3]])
+    alineada = HojaAlineada(ws, ["Fecha", "ID", "Score_Total", "Servicio"])
+    assert alineada.cabecera == ["Fecha", "ID", "Notas", "Score_Total", "Servicio"]
+
+    alineada.append_rows([["2025-01-01", "P1", 7, "Cardiología"]])
+    assert ws.get_all_records()[-1] == {"Fecha": "2025-01-01", "ID": "P1", "Notas": "",
+                                        "Score_Total": 7, "Servicio": "Cardiología"}
+    assert alineada.title == ws.title  # El resto de la interfaz es la de la hoja
+
+
+def test_alinear_filas_mismo_orden_no_copia():
+    filas = [[1, 2]]
+    assert alinear_filas(filas, ["A", "B"], ["A", "B", "Extra"]) is filas
+
+
+# --- ESCRITOR ÚNICO ---
+
+def test_escritor_agrupa_cada_vaciado_en_un_append_rows(hoja):
+    ws = hoja([["Fecha", "ID"]])
+    escritor = EscritorRegistro(ws, intervalo=0.2)
+    futuros = [escritor.encolar(["2025-01-01", f"P{i}"]) for i in range(30)]
+
+    assert [f.result(timeout=5) for f in futuros] == [30] * 30  # Todas en el mismo lote
+    assert ws.peticiones == 1
+    assert [f[1] for f in ws.datos[1:]] == [f"P{i}" for i in range(30)]
+    escritor.cerrar(timeout=5)
+
+
+def test_escritor_respeta_el_tamano_maximo_del_lote(hoja):
+    ws = hoja([["Fecha", "ID"]])
+    escritor = EscritorRegistro(ws, intervalo=0.2, max_lote=10)
+    futuros = [escritor.encolar(["2025-01-01", f"P{i}"]) for i in range(25)]
+    assert sorted({f.result(timeout=5) for f in futuros}) == [5, 10]
+    assert ws.peticiones == 3
+    escritor.cerrar(timeout=5)
+
+
+def test_escritor_propaga_el_error_a_su_lote(hoja):
+    ws = hoja([["Fecha", "ID"]])
+    original = ws.append_rows
+    llamadas = []
+
+    def append_rows(filas, **kwargs):
+        llamadas.append(len(filas))
+        if len(llamadas) == 1:
+            raise RuntimeError("cuota")
+        return original(filas, **kwargs)
+    ws.append_rows = append_rows
+
+    escritor = EscritorRegistro(ws, intervalo=0.1)
+    fallidos = [escritor.encolar(["2025-01-01", "P1"]), escritor.encolar(["2025-01-01", "P2"])]
+    assert all(isinstance(f.exception(timeout=5), RuntimeError) for f in fallidos)
+    assert estado_escritura(fallidos[0]) == "error"
+
+    # El hilo sigue vivo: los envíos siguientes se guardan
+    assert escritor.encolar(["2025-01-02", "P3"]).result(timeout=5) == 1
+    assert [f[1] for f in ws.datos[1:]] == ["P3"]
+    escritor.cerrar(timeout=5)
+
+
+def test_cerrar_vacia_la_cola(hoja):
+    ws = hoja([["Fecha", "ID"]])
+    escritor = EscritorRegistro(ws, intervalo=0.5)
+    futuros = [escritor.encolar(["2025-01-01", f"P{i}"]) for i in range(5)]
+    escritor.cerrar(timeout=5)
+
+    assert not escritor._hilo.is_alive()
+    assert all(f.done() and f.exception() is None for f in futuros)
+    assert len(ws.datos) == 6
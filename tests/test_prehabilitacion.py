@@ -0,0 +1,43 @@
+from prehabilitacion import (BIT_EDAD, BIT_EPOC, BIT_FISIO, MEDIDAS_GENERALES, PRIORIDADES, generar_planes,
+                             mascaras_desde_registro, plan_para_mascara, resumen_derivaciones)
+from utils import cargar_registro_tipado
+
+COLUMNAS = ['ID', 'Fecha', 'Score_Total', 'Seccion', 'Recomendacion', 'Prioridad', 'Servicio']
+
+
+def _registro(filas):
+    base = {"Fecha": "2025-01-01 10:00", "Score_Total": 3, "V1_Edad_Puntos": 0, "V2_Residencia_Puntos": 0,
+            "V3_Fisiologico_Puntos": 0, "V3_Fisiologico_Detalle": "Ninguna",
+            "V4_Comorbilidad_Detalle": "Ninguna", "V5_Cognitivo_Puntos": 0, "V9_Fragilidad_Detalle": "No Frágil"}
+    return cargar_registro_tipado([{**base, **f} for f in filas])
+
+
+def test_mascaras_desde_registro():
+    reg = _registro([{"ID": "A", "V1_Edad_Puntos": 1, "V4_Comorbilidad_Detalle": "EPOC"},
+                     {"ID": "B", "V3_Fisiologico_Puntos": 1}])
+    mascaras = mascaras_desde_registro(reg)
+    assert mascaras[0] >> BIT_EDAD & 1 and mascaras[0] >> BIT_EPOC & 1
+    assert mascaras[1] == 1 << BIT_FISIO
+
+
+def test_sin_factores_medidas_generales():
+    assert plan_para_mascara(0) == (MEDIDAS_GENERALES,)
+
+
+def test_generar_planes_expande_cada_plan():
+    reg = _registro([{"ID": "A", "V4_Comorbilidad_Detalle": "EPOC"}, {"ID": "B"}, {"ID": "C", "V4_Comorbilidad_Detalle": "EPOC"}])
+    planes = generar_planes(reg)
+    assert list(planes.columns) == COLUMNAS
+    assert planes.groupby('ID').size().to_dict() == {"A": 2, "B": 1, "C": 2}
+    assert (planes.loc[planes['ID'] == "A", 'Recomendacion'].to_numpy()
+            == planes.loc[planes['ID'] == "C", 'Recomendacion'].to_numpy()).all()
+    assert resumen_derivaciones(planes).set_index('Servicio')['Pacientes'].to_dict() == {"Neumología": 2}
+
+
+def test_generar_planes_sin_pacientes():
+    reg = _registro([{"ID": "A"}]).iloc[:0]
+    planes = generar_planes(reg)
+    assert len(planes) == 0
+    assert list(planes.columns) == COLUMNAS
+    assert list(planes['Prioridad'].cat.categories) == PRIORIDADES
+    assert len(resumen_derivaciones(planes)) == 0
@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pandas as pd
+
+from seguimiento import AgendaSeguimiento
+
+CABECERA = ["Fecha", "ID", "Score_Total", "Outcome_30dias"]
+HOY = pd.Timestamp("2025-03-01")
+
+
+def _filas(n, dia0="2025-01-01", outcome=""):
+    inicio = pd.Timestamp(dia0)
+    return [[(inicio + pd.Timedelta(days=i)).strftime("%Y-%m-%d %H:%M"), f"P{i}", 5, outcome] for i in range(n)]
+
+
+def test_pendientes_y_proximos(hoja):
+    ws = hoja([CABECERA] + _filas(40))
+    ws.datos[3][3] = "1"  # Fila 4 ya cerrada
+    agenda = AgendaSeguimiento.desde_hoja(ws)
+
+    pendientes = agenda.pendientes(hoy=HOY)
+    # Vencidas: fechas hasta el 30 de enero (30 filas) menos la cerrada
+    assert len(pendientes) == 29 and 4 not in set(pendientes["Fila_Hoja"])
+    assert pendientes["Vencimiento"].is_monotonic_increasing
+    assert agenda.proximos(7, hoy=HOY) == 7
+
+
+def test_actualizar_solo_lee_filas_nuevas(hoja):
+    ws = hoja([CABECERA] + _filas(5))
+    agenda = AgendaSeguimiento.desde_hoja(ws)
+    ws.append_rows(_filas(3, dia0="2025-01-10"))
+    assert agenda.actualizar(ws) == 3
+    assert agenda.actualizar(ws) == 0
+    assert len(agenda.pendientes(hoy=HOY)) == 8
+
+
+def test_outcomes_cerrados_en_la_hoja_salen_de_la_agenda(hoja):
+    ws = hoja([CABECERA] + _filas(10))
+    agenda = AgendaSeguimiento.desde_hoja(ws)
+    agenda.pendientes(hoy=HOY)  # Pasan a la lista de trabajo
+    ws.datos[2][3] = "0"        # Cerradas a mano en la hoja: una vencida...
+    ws.datos[10][3] = "1"       # ...y otra que aún estaba en el montículo
+
+    agenda.actualizar(ws)
+    filas = set(agenda.pendientes(hoy=pd.Timestamp("2025-06-01"))["Fila_Hoja"])
+    assert filas == set(range(2, 12)) - {3, 11}
+
+
+def test_registrar_outcomes(hoja):
+    ws = hoja([CABECERA] + _filas(5))
+    agenda = AgendaSeguimiento.desde_hoja(ws)
+    assert agenda.registrar_outcomes(ws, {2: 0, 3: 1}) == (2, [])
+    assert [f[3] for f in ws.datos[1:4]] == ["0", "1", ""]
+    assert set(agenda.pendientes(hoy=HOY)["Fila_Hoja"]) == {4, 5, 6}
+
+
+def test_registrar_outcomes_tras_reordenar_la_hoja(hoja):
+    ws = hoja([CABECERA] + _filas(5))
+    agenda = AgendaSeguimiento.desde_hoja(ws)
+    agenda.pendientes(hoy=HOY)
+    ws.datos[1], ws.datos[2] = ws.datos[2], ws.datos[1]  # Alguien ordena la hoja: P0 y P1 intercambian filas
+    ws.datos[4][3] = "1"                                 # y cierra a mano el de P3
+
+    assert agenda.registrar_outcomes(ws, {2: 1, 4: 0, 5: 0}) == (1, [2, 5])
+    assert [(f[1], f[3]) for f in ws.datos[1:]] == [("P1", ""), ("P0", ""), ("P2", "0"), ("P3", "1"), ("P4", "")]
+
+    # La agenda se reinicia y vuelve a localizar cada valoración en su fila actual
+    agenda.actualizar(ws)
+    pendientes = agenda.pendientes(hoy=HOY).set_index("ID")["Fila_Hoja"].to_dict()
+    assert pendientes == {"P1": 2, "P0": 3, "P4": 6}
+    assert agenda.registrar_outcomes(ws, {3: 1}) == (1, [])
+    assert ws.datos[2][1:4:2] == ["P0", "1"]
+
+
+def test_actualizaciones_concurrentes_no_duplican(hoja):
+    ws = hoja([CABECERA] + _filas(5))
+    agenda = AgendaSeguimiento.desde_hoja(ws)
+    ws.append_rows(_filas(20, dia0="2025-01-06"))
+
+    leer = ws.batch_get
+    def lento(rangos):
+        time.sleep(0.05)  # Ambas sesiones dentro de la lectura a la vez
+        return leer(rangos)
+    ws.batch_get = lento
+
+    hilos = [threading.Thread(target=agenda.actualizar, args=(ws,)) for _ in range(4)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    # Cada valoración programada una sola vez (también en el montículo, no solo en la lista)
+    assert agenda.proximos(365, hoy=pd.Timestamp("2025-01-01")) == 25
+    assert len(agenda.pendientes(hoy=pd.Timestamp("2025-06-01"))) == 25
@@ -0,0 +1,97 @@
+import pandas as pd
+import pytest
+
+from sincronizacion import SincronizadorRegistro, actualizar_tendencias
+from tendencias import TendenciasCohorte
+from test_snapshots import _registros
+from utils import COLUMNAS_REGISTRO, cargar_registro_tipado, cohorte_desde_registro
+
+
+def _filas(n, desde=0):
+    registros = _registros(desde + n, meses=3)[desde:]
+    return [[r.get(c, "") for c in COLUMNAS_REGISTRO] for r in registros]
+
+
+@pytest.fixture
+def ws(hoja):
+    return hoja([COLUMNAS_REGISTRO] + _filas(25))
+
+
+def _sincronizador(ws, **kwargs):
+    sincronizador = SincronizadorRegistro(ws, tam_bloque=10, **kwargs)
+    tendencias = TendenciasCohorte()
+    sincronizador.suscribir(actualizar_tendencias(tendencias))
+    sincronizador.sincronizar()
+    return sincronizador, tendencias
+
+
+def _comprobar(sincronizador, tendencias, ws):
+    """La copia local y los agregados suscritos coinciden con la hoja."""
+    assert sincronizador.registros() == ws.get_all_records()
+    completas = TendenciasCohorte.desde_cohorte(cohorte_desde_registro(cargar_registro_tipado(ws.get_all_records())))
+    for freq in ("W", "M"):
+        pd.testing.assert_frame_equal(tendencias.serie(freq), completas.serie(freq))
+
+
+def test_carga_inicial_y_filas_nuevas(ws):
+    sincronizador, tendencias = _sincronizador(ws)
+    assert len(sincronizador) == 25
+
+    ws.append_rows(_filas(7, desde=25))
+    assert sincronizador.sincronizar() == {"editadas": 0, "nuevas": 7, "bloques": 0}
+    _comprobar(sincronizador, tendencias, ws)
+
+
+def test_ediciones_en_cualquier_columna_solo_bajan_su_bloque(ws):
+    sincronizador, tendencias = _sincronizador(ws)
+    col = {c: COLUMNAS_REGISTRO.index(c) for c in ("Fecha", "Servicio", "Outcome_30dias", "Score_Total")}
+    ws.datos[3][col["Fecha"]] = "2024-12-01 10:00"  # Bloque 0
+    ws.datos[4][col["Servicio"]] = "Traumatología"  # Bloque 0
+    ws.datos[22][col["Score_Total"]] = "20"         # Bloque 2
+    ws.datos[23][col["Outcome_30dias"]] = "1"       # Bloque 2
+
+    assert sincronizador.sincronizar() == {"editadas": 4, "nuevas": 0, "bloques": 2}
+    _comprobar(sincronizador, tendencias, ws)
+    assert sincronizador.sincronizar() == {"editadas": 0, "nuevas": 0, "bloques": 0}
+
+
+def test_columnas_vigiladas_no_detectan_el_resto(ws):
+    sincronizador, _ = _sincronizador(ws, columnas_vigiladas=["ID", "Outcome_30dias"])
+    ws.datos[4][COLUMNAS_REGISTRO.index("Servicio")] = "Traumatología"
+    assert sincronizador.sincronizar()["editadas"] == 0  # Limitación documentada
+    ws.datos[4][COLUMNAS_REGISTRO.index("Outcome_30dias")] = "0"
+    assert sincronizador.sincronizar()["editadas"] == 1
+    assert sincronizador.registros()[3]["Servicio"] == "Traumatología"  # La fila se baja entera
+
+
+def test_filas_borradas_recargan_la_hoja(ws):
+    sincronizador, tendencias = _sincronizador(ws)
+    del ws.datos[5:8]
+    resultado = sincronizador.sincronizar()
+    assert resultado["editadas"] == 22 and len(sincronizador) == 22
+    _comprobar(sincronizador, tendencias, ws)
+
+
+def test_un_fallo_al_tipar_no_desajusta_la_copia(ws, monkeypatch):
+    sincronizador, tendencias = _sincronizador(ws)
+    ws.append_rows(_filas(5, desde=25))
+
+    def fallo(filas):
+        raise ValueError("celda imposible")
+    monkeypatch.setattr(sincronizador, "_tipar", fallo)
+    with pytest.raises(ValueError):
+        sincronizador.sincronizar()
+    assert len(sincronizador) == 25  # Ni la copia ni los agregados han cambiado
+
+    monkeypatch.undo()
+    assert sincronizador.sincronizar()["nuevas"] == 5
+    _comprobar(sincronizador, tendencias, ws)
+
+
+def test_sin_cambios_en_drive_no_lee(ws):
+    sincronizador, _ = _sincronizador(ws)
+    sincronizador.sincronizar(modificado="2025-01-01T00:00:00Z")
+    antes = ws.peticiones
+    ws.append_rows(_filas(1, desde=25))
+    assert sincronizador.sincronizar(modificado="2025-01-01T00:00:00Z")["nuevas"] == 0
+    assert ws.peticiones == antes + 1  # Solo el append_rows de la prueba
@@ -0,0 +1,48 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from snapshots import abrir_snapshot, cargar_cohorte_snapshot, exportar_snapshot, registro_desde_tabla
+from utils import COLUMNAS_COHORTE, cargar_registro_tipado, cohorte_desde_registro
+
+
+def _registros(n, meses=1):
+    rng = np.random.default_rng(0)
+    fechas = pd.date_range("2025-01-01", periods=n, freq=f"{28 * meses * 24 * 60 // n}min")
+    return [{
+        "Fecha": f.strftime("%Y-%m-%d %H:%M"), "ID": f"H{i % 300}", "Score_Total": int(s),
+        "Prob_Mortalidad_Mat_%": 10.5, "V1_Edad_Valor": 70, "V1_Edad_Puntos": 1,
+        "V3_Fisiologico_Puntos": 0, "V4_Comorbilidad_Detalle": ["Ninguna", "ICC, EPOC", "IRC"][i % 3],
+        "V5_Cognitivo_Puntos": int(s) % 2, "V9_Fragilidad_Puntos": int(s) % 5,
+        "Outcome_30dias": ["", 0, 1][i % 3], "Servicio": "Urología",
+    } for i, (f, s) in enumerate(zip(fechas, rng.integers(0, 21, n)))]
+
+
+def test_cohorte_del_snapshot_igual_que_desde_el_registro(tmp_path):
+    registros = _registros(3000, meses=3)
+    exportar_snapshot(registros, directorio=str(tmp_path))
+
+    desde_snapshot = cargar_cohorte_snapshot(str(tmp_path))
+    esperada = cohorte_desde_registro(cargar_registro_tipado(registros))
+    pd.testing.assert_frame_equal(desde_snapshot, esperada, check_dtype=False, check_categorical=False)
+
+
+def test_registro_desde_tabla_sin_copia(tmp_path):
+    exportar_snapshot(_registros(20000), directorio=str(tmp_path))  # Una sola partición
+    tabla = abrir_snapshot(columnas=COLUMNAS_COHORTE, directorio=str(tmp_path))
+    inicial = pa.total_allocated_bytes()
+
+    tracemalloc.start()
+    try:
+        reg = registro_desde_tabla(tabla)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # Las columnas se leen del fichero mapeado; solo Outcome_30dias (con nulos -> NaN)
+    # se materializa: 4 bytes por fila. Una copia completa pasaría de 400 KB.
+    assert pico < 50_000
+    assert pa.total_allocated_bytes() - inicial <= 20000 * 4 + 4096
+    assert reg["Score_Total"].dtype == "int8" and len(reg) == 20000
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tendencias import TendenciasCohorte
+
+
+def _iguales(a, b, freq="W", **kwargs):
+    pd.testing.assert_frame_equal(a.serie(freq, **kwargs), b.serie(freq, **kwargs), check_dtype=False)
+
+
+@pytest.mark.parametrize("freq", ["W", "M"])
+def test_agregar_quitar_y_combinar_igual_que_reconstruir(cohorte, freq):
+    df = cohorte(240, semilla=8)
+    completo = TendenciasCohorte.desde_cohorte(df)
+
+    incremental = TendenciasCohorte()
+    for inicio, fin in [(0, 17), (17, 17), (17, 100), (100, 240)]:
+        incremental.agregar(df.iloc[inicio:fin])
+    _iguales(incremental, completo, freq)
+    _iguales(incremental, completo, freq, ventana=4)
+
+    # Editar una fila: quitar la versión anterior y agregar la nueva
+    editada = df.iloc[[50]].assign(Score_CriSTAL=np.int8(20))
+    incremental.quitar(df.iloc[[50]])
+    incremental.agregar(editada)
+    _iguales(incremental, TendenciasCohorte.desde_cohorte(pd.concat([df.drop(df.index[50]), editada])), freq)
+
+    # Quitar todas las filas de los primeros periodos elimina sus cubos
+    incremental = TendenciasCohorte.desde_cohorte(df)
+    incremental.quitar(df.iloc[:70])
+    _iguales(incremental, TendenciasCohorte.desde_cohorte(df.iloc[70:]), freq)
+
+    combinadas = TendenciasCohorte.combinar([TendenciasCohorte.desde_cohorte(df.iloc[::2]),
+                                             TendenciasCohorte.desde_cohorte(df.iloc[1::2]),
+                                             TendenciasCohorte()])
+    _iguales(combinadas, completo, freq, ventana=3)
+
+
+def test_serie_agrupa_cubos_con_medias_exactas(cohorte):
+    df = cohorte(200, semilla=9)  # ~29 semanas
+    tendencias = TendenciasCohorte.desde_cohorte(df)
+    semanal = tendencias.serie("W")
+    agrupada = tendencias.serie("W", max_periodos=10)
+
+    por_punto = agrupada.attrs['periodos_por_punto']
+    assert por_punto == -(-len(semanal) // 10) and len(agrupada) <= 10
+    assert agrupada['Pacientes'].sum() == len(df)
+    assert agrupada['Periodo'].tolist() == semanal['Periodo'].iloc[::por_punto].tolist()
+
+    # Medias calculadas directamente sobre las filas de cada grupo de semanas
+    semana = df['Fecha_Registro'].dt.to_period('W')
+    grupo = (semana - semana.min()).apply(lambda d: d.n) // por_punto
+    esperado = df.groupby(grupo.to_numpy()).agg(n=('Score_CriSTAL', 'size'), score=('Score_CriSTAL', 'mean'))
+    assert agrupada['Pacientes'].tolist() == esperado['n'].tolist()
+    np.testing.assert_allclose(agrupada['Score_Medio'], esperado['score'])
+
+    # La ventana se cuenta en grupos: 2*por_punto semanas equivalen a 2 puntos
+    movil = tendencias.serie("W", ventana=2 * por_punto, max_periodos=10)
+    esperado_movil = esperado.assign(suma=esperado['score'] * esperado['n']).rolling(2, min_periods=1).sum()
+    np.testing.assert_allclose(movil['Score_Medio'], esperado_movil['suma'] / esperado_movil['n'])
+
+
+def test_serie_vacia():
+    serie = TendenciasCohorte().serie("M")
+    assert serie.empty and 'Score_Medio' in serie.columns
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+from triaje import TriajeTopK, triaje
+
+
+def _referencia(df, k, servicios=None, desde=None, hasta=None, desempate="espera"):
+    """Top-k ordenando la cohorte entera: lo que triaje() evita hacer."""
+    df = df.assign(Delta_Score=df.groupby("ID_Paciente")["Score_CriSTAL"].diff().fillna(0).astype(int),
+                   _orden=range(len(df)))
+    if desde is not None:
+        df = df[df["Fecha_Registro"] >= pd.Timestamp(desde)]
+    if hasta is not None:
+        df = df[df["Fecha_Registro"] <= pd.Timestamp(hasta)]
+    df = df.drop_duplicates("ID_Paciente", keep="last")
+    if servicios:
+        df = df[df["Servicio"].isin(servicios)]
+    segundo = "Fecha_Registro" if desempate == "espera" else "Delta_Score"
+    df = df.sort_values(["Prob_Mortalidad", segundo, "_orden"], ascending=[False, desempate == "espera", True],
+                        kind="stable")
+    return df["ID_Paciente"].head(k).tolist()
+
+
+@pytest.mark.parametrize("desempate", ["espera", "delta"])
+def test_top_k_igual_que_ordenar(cohorte, desempate):
+    df = cohorte(3000, semilla=1, pacientes=900)  # Revaloraciones y empates masivos de score
+    top = triaje(df, 25, desempate=desempate)
+    assert top["ID_Paciente"].tolist() == _referencia(df, 25, desempate=desempate)
+    assert top["Prioridad"].tolist() == list(range(1, 26))
+    assert top["Prob_Mortalidad"].is_monotonic_decreasing
+
+
+def test_filtros_de_servicio_y_fechas(cohorte):
+    df = cohorte(2000, semilla=2, pacientes=700)
+    servicios = sorted(df["Servicio"].unique())[:2]
+    top = triaje(df, 10, servicios=servicios, desde="2024-06-01", hasta="2025-12-31")
+    assert top["ID_Paciente"].tolist() == _referencia(df, 10, servicios, "2024-06-01", "2025-12-31")
+    assert top["Servicio"].isin(servicios).all()
+
+
+def test_por_bloques_con_revaloraciones(cohorte):
+    df = cohorte(3000, semilla=3, pacientes=400)
+    incremental = TriajeTopK(20).agregar(df, tam_bloque=250)
+    assert incremental.completo  # El margen basta para las bajas por revaloración
+    assert incremental.top()["ID_Paciente"].tolist() == _referencia(df, 20)
+    # Ningún paciente aparece dos veces y solo con su última valoración
+    top = incremental.top()
+    assert top["ID_Paciente"].is_unique
+    ultima = df.drop_duplicates("ID_Paciente", keep="last").set_index("ID_Paciente")["Fecha_Registro"]
+    assert (top.set_index("ID_Paciente")["Fecha_Registro"] == ultima[top["ID_Paciente"]]).all()
+
+
+def test_revaloracion_a_la_baja_saca_al_paciente(cohorte):
+    df = cohorte(50, semilla=4)
+    triado = TriajeTopK(3).agregar(df)
+    primero = triado.top()["ID_Paciente"].iloc[0]
+    baja = df[df["ID_Paciente"] == primero].assign(
+        Fecha_Registro=df["Fecha_Registro"].max() + pd.Timedelta(days=1), Score_CriSTAL=0, Prob_Mortalidad=0.0)
+    triado.agregar(baja)
+    assert primero not in triado.top()["ID_Paciente"].tolist()
+    assert triado.completo
+    assert triado.top()["ID_Paciente"].tolist() == _referencia(pd.concat([df, baja], ignore_index=True), 3)
+
+
+def test_desempate_no_soportado():
+    with pytest.raises(ValueError):
+        TriajeTopK(5, desempate="azar")
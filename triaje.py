@@ -0,0 +1,188 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+# --- TRIAJE TOP-K DE LA LISTA DE ESPERA QUIRÚRGICA ---
+# Los coordinadores necesitan los N pacientes de mayor riesgo entre decenas de miles.
+# En vez de ordenar la cohorte entera, las valoraciones se recorren una sola vez (por
+# bloques) a través de un montículo mínimo acotado: la raíz es el peor de los k
+# retenidos y cada candidato solo entra si lo supera (heappushpop, O(log k)).
+#
+# Criterio: probabilidad de mortalidad descendente. Como el score es discreto (0-20),
+# los empates son masivos y se deshacen con:
+#   "espera": la valoración más antigua primero (más tiempo en lista).
+#   "delta":  el mayor empeoramiento del score respecto a la valoración anterior.
+#
+# Revaloraciones: la última valoración de un paciente sustituye a las anteriores.
+# Dentro de un bloque se resuelve de forma vectorizada (exacto: una cohorte ya cargada
+# se procesa como un único bloque). Entre bloques (valoraciones que llegan después),
+# la entrada antigua no se busca en el montículo: se invalida (borrado perezoso) y se
+# retira de una vez. Un margen de capacidad cubre esas bajas; `completo` indica si
+# algún candidato descartado antes podría haber vuelto al top (hay que reconstruir).
+
+DESEMPATES = {"espera": "Mayor tiempo en espera", "delta": "Mayor empeoramiento del score"}
+MARGEN = 16
+
+
+class TriajeTopK:
+    """
+    Los k pacientes de mayor riesgo (cohorte del Dashboard: ID_Paciente, Fecha_Registro,
+    Score_CriSTAL, Prob_Mortalidad, Servicio) que cumplen los filtros.
+
+    `agregar(df)` procesa valoraciones nuevas en orden cronológico y puede llamarse
+    tantas veces como se quiera; `top()` devuelve la lista ordenada. La memoria es
+    O(k + margen); con desempate "delta" se guarda además el último score de cada
+    paciente (un entero por paciente) para calcular el empeoramiento.
+    """
+
+    def __init__(self, k, servicios=None, desde=None, hasta=None, desempate="espera", margen=MARGEN):
+        if desempate not in DESEMPATES:
+            raise ValueError(f"Desempate no soportado: {desempate}")
+        self.k = k
+        self.capacidad = k + margen
+        self.servicios = None if not servicios else set(servicios)
+        self.desde = None if desde is None else pd.Timestamp(desde)
+        self.hasta = None if hasta is None else pd.Timestamp(hasta)
+        self.desempate = desempate
+        # Entradas: (prob, desempate, -seq, seq, id, fecha, score, servicio, delta).
+        # seq es único, así que la comparación nunca llega al resto de campos.
+        self._monticulo = []
+        self._vigentes = {}     # id -> seq de su entrada válida en el montículo
+        self._ultimo_score = {}  # id -> score de su última valoración (solo "delta")
+        self._seq = 0
+        self._descartado = None  # Clave del mejor candidato que quedó fuera (o None)
+
+    def __len__(self):
+        return len(self._vigentes)
+
+    @property
+    def completo(self):
+        """
+        True si top() es exacto: hay k entradas vigentes mejores que cualquier candidato
+        descartado (o no se descartó ninguno).
+        """
+        if self._descartado is None:
+            return True
+        return sum(e[:3] > self._descartado for e in self._validas()) >= self.k
+
+    def _descartar(self, clave):
+        if self._descartado is None or clave > self._descartado:
+            self._descartado = clave
+
+    # --- ACTUALIZACIÓN ---
+
+    def agregar(self, df, tam_bloque=None):
+        """
+        Procesa valoraciones (en orden cronológico) sin ordenar la cohorte. Sin
+        `tam_bloque`, todo `df` forma un bloque: las revaloraciones que contiene se
+        resuelven de forma exacta.
+        """
+        tam_bloque = tam_bloque or max(len(df), 1)
+        for inicio in range(0, len(df), tam_bloque):
+            self._agregar_bloque(df.iloc[inicio:inicio + tam_bloque])
+        return self
+
+    def _agregar_bloque(self, bloque):
+        ids = bloque["ID_Paciente"].astype(str).to_numpy()
+        fechas = pd.to_datetime(bloque["Fecha_Registro"]).to_numpy().astype("datetime64[ns]")
+        scores = bloque["Score_CriSTAL"].to_numpy(dtype=np.int64)
+        probs = bloque["Prob_Mortalidad"].to_numpy(dtype=np.float64)
+        seqs = np.arange(self._seq, self._seq + len(bloque))
+        self._seq += len(bloque)
+
+        if self.desempate == "delta":
+            # Score anterior: dentro del bloque o, para la primera aparición, el guardado
+            previo = pd.Series(scores).groupby(ids).shift(1)
+            sin_previo = previo.isna().to_numpy()
+            previo[sin_previo] = pd.Series(ids[sin_previo]).map(self._ultimo_score).to_numpy()
+            deltas = (scores - previo.to_numpy()).astype(np.float64)
+            deltas[np.isnan(deltas)] = 0
+            ultimo = ~pd.Series(ids).duplicated(keep="last").to_numpy()
+            self._ultimo_score.update(zip(ids[ultimo], scores[ultimo].tolist()))
+        else:
+            deltas = np.zeros(len(bloque))
+
+        # 1. Filtro de fechas; de cada paciente solo cuenta su última valoración
+        dentro = np.ones(len(bloque), dtype=bool)
+        if self.desde is not None:
+            dentro &= fechas >= self.desde.to_datetime64()
+        if self.hasta is not None:
+            dentro &= fechas <= self.hasta.to_datetime64()
+        idx = np.flatnonzero(dentro & ~_duplicados_posteriores(ids, dentro))
+
+        # 2. Invalidación perezosa de las entradas superadas por una revaloración
+        for id_pac in ids[idx]:
+            self._vigentes.pop(id_pac, None)
+
+        # 3. Filtro de servicio
+        servicios = bloque["Servicio"].astype(str).to_numpy()
+        if self.servicios is not None:
+            idx = idx[np.isin(servicios[idx], list(self.servicios))]
+        if len(self._monticulo) > len(self._vigentes):
+            self._compactar()  # Una raíz invalidada daría un umbral demasiado alto
+        if len(idx) == 0:
+            return
+
+        # 4. Prefiltro vectorizado por probabilidad (sin ordenar): la `capacidad`-ésima
+        # mayor del bloque (np.partition, O(n)) y, con el montículo lleno, la de la raíz
+        umbral = -np.inf
+        if len(idx) > self.capacidad:
+            umbral = np.partition(probs[idx], len(idx) - self.capacidad)[len(idx) - self.capacidad]
+        if len(self._monticulo) >= self.capacidad:
+            umbral = max(umbral, self._monticulo[0][0])
+        pasa = probs[idx] >= umbral
+        if not pasa.all():
+            self._descartar((float(probs[idx][~pasa].max()), np.inf, np.inf))
+            idx = idx[pasa]
+
+        desempates = -fechas[idx].astype("int64") if self.desempate == "espera" else deltas[idx]
+
+        for i, d in zip(idx.tolist(), desempates.tolist()):
+            entrada = (probs[i], d, -int(seqs[i]), int(seqs[i]), ids[i], fechas[i], int(scores[i]),
+                       servicios[i], int(deltas[i]))
+            if len(self._monticulo) < self.capacidad:
+                heapq.heappush(self._monticulo, entrada)
+                self._vigentes[ids[i]] = entrada[3]
+            elif entrada > self._monticulo[0]:
+                saliente = heapq.heappushpop(self._monticulo, entrada)
+                self._vigentes[ids[i]] = entrada[3]
+                if self._vigentes.get(saliente[4]) == saliente[3]:
+                    del self._vigentes[saliente[4]]
+                    self._descartar(saliente[:3])
+            else:
+                self._descartar(entrada[:3])
+
+    def _validas(self):
+        return [e for e in self._monticulo if self._vigentes.get(e[4]) == e[3]]
+
+    def _compactar(self):
+        """Elimina del montículo las entradas invalidadas (O(k))."""
+        self._monticulo = self._validas()
+        heapq.heapify(self._monticulo)
+
+    # --- CONSULTA ---
+
+    def top(self, hoy=None):
+        """Los k pacientes de mayor riesgo, de mayor a menor prioridad."""
+        hoy = pd.Timestamp.now() if hoy is None else pd.Timestamp(hoy)
+        mejores = heapq.nlargest(self.k, self._validas())
+        df = pd.DataFrame(
+            [(e[4], e[5], e[7], e[6], e[0], e[8]) for e in mejores],
+            columns=["ID_Paciente", "Fecha_Registro", "Servicio", "Score_CriSTAL", "Prob_Mortalidad", "Delta_Score"],
+        )
+        df.insert(0, "Prioridad", np.arange(1, len(df) + 1))
+        df["Dias_Espera"] = (hoy - pd.to_datetime(df["Fecha_Registro"])).dt.days
+        if self.desempate != "delta":
+            df = df.drop(columns="Delta_Score")
+        return df
+
+
+def _duplicados_posteriores(ids, mascara):
+    """True en las filas de `mascara` que tienen otra fila posterior (también en `mascara`) del mismo id."""
+    return pd.Series(ids).where(mascara).duplicated(keep="last").to_numpy() & mascara
+
+
+def triaje(df, k, servicios=None, desde=None, hasta=None, desempate="espera", hoy=None):
+    """Top-k exacto de una cohorte completa, en una sola pasada."""
+    return TriajeTopK(k, servicios, desde, hasta, desempate).agregar(df).top(hoy)
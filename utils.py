@@ -29,6 +29,160 @@ def categorizar_score(score):
     elif score < 14: return "3. Alto (12-13)"
     else: return "4. Crítico (>13)"
 
+# --- ESQUEMA TIPADO DE LA COHORTE ---
+
+# Categorías ordenadas: el código entero (0-3) sirve directamente para filtrar
+CATEGORIAS_RIESGO = ["1. Bajo (<8)", "2. Intermedio (8-11)", "3. Alto (12-13)", "4. Crítico (>13)"]
+COLORES_RIESGO = ["#2ecc71", "#f1c40f", "#e67e22", "#e74c3c"]
+CODIGO_ALTO = 2  # Códigos >= 2 son Alto o Crítico
+LIMITES_RIESGO = [8, 12, 14]
+
+TIPO_CATEGORIA_RIESGO = pd.CategoricalDtype(CATEGORIAS_RIESGO, ordered=True)
+TIPO_COLOR = pd.CategoricalDtype(COLORES_RIESGO)
+
+# Servicios quirúrgicos (lista de espera)
+SERVICIOS = ["Cirugía General", "Traumatología", "Urología", "Cirugía Vascular", "Cirugía Torácica"]
+SIN_SERVICIO = "Sin especificar"
+TIPO_SERVICIO = pd.CategoricalDtype(SERVICIOS + [SIN_SERVICIO])
+
+# Dashboard (datos simulados)
+ESQUEMA_COHORTE = {
+    'Score_CriSTAL': 'int8',
+    'Prob_Mortalidad': 'float32',
+    'Categoria_Riesgo': TIPO_CATEGORIA_RIESGO,
+    'Color': TIPO_COLOR,
+    'Edad_65+': 'bool',
+    'Fragilidad': 'bool',
+    'Comorbilidad_ICC': 'bool',
+    'Comorbilidad_EPOC': 'bool',
+    'Fisiologico_Agudo': 'bool',
+    'Deterioro_Cognitivo': 'bool',
+    'Items_FRAIL': 'int8',
+    'Outcome_30dias': 'bool',
+    'Total_Factores': 'int8',
+    'Servicio': TIPO_SERVICIO,
+}
+# Factores de riesgo binarios de la cohorte (los que suma Total_Factores)
+FACTORES_COHORTE = ['Edad_65+', 'Fragilidad', 'Comorbilidad_ICC', 'Comorbilidad_EPOC',
+                    'Fisiologico_Agudo', 'Deterioro_Cognitivo']
+
+# Registro (columnas escritas por Registro_Paciente.py, en orden)
+COLUMNAS_REGISTRO = [
+    "Fecha", "ID", "Score_Total", "Prob_Mortalidad_Mat_%",
+    "V1_Edad_Valor", "V1_Edad_Puntos",
+    "V2_Residencia_Valor", "V2_Residencia_Puntos",
+    "V3_Fisiologico_Detalle", "V3_Fisiologico_Puntos",
+    "V4_Comorbilidad_Detalle", "V4_Comorbilidad_Puntos",
+    "V5_Cognitivo_Detalle", "V5_Cognitivo_Puntos",
+    "V6_IngresoPrevio_Valor", "V6_IngresoPrevio_Puntos",
+    "V7_Proteinuria_Valor", "V7_Proteinuria_Puntos",
+    "V8_ECG_Valor", "V8_ECG_Puntos",
+    "V9_Fragilidad_Detalle", "V9_Fragilidad_Puntos",
+    "Outcome_30dias",
+    "V3_Fisiologico_Codigo", "V4_Comorbilidad_Codigo", "V9_Fragilidad_Codigo",
+    "Servicio",
+]
+
+ESQUEMA_REGISTRO = {
+    'Score_Total': 'int8',
+    'Prob_Mortalidad_Mat_%': 'float32',
+    'V1_Edad_Valor': 'int8',
+    'V2_Residencia_Valor': 'bool',
+    'V3_Fisiologico_Detalle': 'category',
+    'V4_Comorbilidad_Detalle': 'category',
+    'V5_Cognitivo_Detalle': 'bool',
+    'V6_IngresoPrevio_Valor': 'bool',
+    'V7_Proteinuria_Valor': 'bool',
+    'V8_ECG_Valor': 'bool',
+    'V9_Fragilidad_Detalle': 'category',
+    'Outcome_30dias': 'float32',  # Vacío (seguimiento pendiente) -> NaN
+    # Máscaras de bits de codificacion.py (7 bits como máximo)
+    'V3_Fisiologico_Codigo': 'int8',
+    'V4_Comorbilidad_Codigo': 'int8',
+    'V9_Fragilidad_Codigo': 'int8',
+    'Servicio': 'category',
+    **{f'V{i}_{n}_Puntos': 'int8' for i, n in enumerate(
+        ['Edad', 'Residencia', 'Fisiologico', 'Comorbilidad', 'Cognitivo',
+         'IngresoPrevio', 'Proteinuria', 'ECG', 'Fragilidad'], start=1)},
+}
+
+def categorizar_scores(scores):
+    """Versión vectorizada de categorizar_score: devuelve un Categorical ordenado."""
+    codigos = np.searchsorted(LIMITES_RIESGO, np.asarray(scores), side='right')
+    return pd.Categorical.from_codes(codigos, dtype=TIPO_CATEGORIA_RIESGO)
+
+def colores_scores(scores):
+    """Versión vectorizada de obtener_color_riesgo: devuelve un Categorical de colores."""
+    codigos = np.searchsorted(LIMITES_RIESGO, np.asarray(scores), side='right')
+    return pd.Categorical.from_codes(codigos, dtype=TIPO_COLOR)
+
+def aplicar_esquema(df, esquema):
+    """
+    Convierte las columnas presentes en `df` a los tipos compactos del esquema.
+    Los valores "Sí"/"No" del registro se traducen a booleanos y las celdas vacías de
+    las columnas enteras, a 0. Las columnas que ya tienen su tipo se conservan sin
+    copiar (p. ej. las de un snapshot mapeado en memoria).
+    """
+    df = df.copy(deep=False)
+    for col, tipo in esquema.items():
+        if col not in df.columns or df[col].dtype == tipo:
+            continue
+        if tipo == 'bool' and not pd.api.types.is_bool_dtype(df[col]):
+            df[col] = df[col].eq("Sí")
+        elif tipo == 'float32' and not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(tipo)
+        elif tipo in ('int8', 'int16', 'int32', 'int64') and not pd.api.types.is_numeric_dtype(df[col]):
+            # Celdas vacías o editadas a mano (p. ej. códigos aún sin migrar) -> 0
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(tipo)
+        else:
+            df[col] = df[col].astype(tipo)
+    if 'Fecha' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['Fecha']):
+        df['Fecha'] = pd.to_datetime(df['Fecha'], errors='coerce')
+    return df
+
+def cargar_registro_tipado(registros):
+    """Construye el DataFrame del registro (p. ej. desde ws.get_all_records()) con el esquema compacto."""
+    return aplicar_esquema(pd.DataFrame(registros), ESQUEMA_REGISTRO)
+
+# Columnas del registro que necesita cohorte_desde_registro (lectura por columnas)
+COLUMNAS_COHORTE = [
+    "ID", "Fecha", "Score_Total", "Prob_Mortalidad_Mat_%", "V1_Edad_Puntos",
+    "V3_Fisiologico_Puntos", "V4_Comorbilidad_Detalle", "V5_Cognitivo_Puntos",
+    "V9_Fragilidad_Puntos", "Outcome_30dias", "Servicio",
+]
+
+def cohorte_desde_registro(reg):
+    """
+    Traduce el registro tipado (columnas de Registro_Paciente.py) al formato
+    de cohorte que usa el Dashboard (mismas columnas que get_mock_patient_data).
+    """
+    scores = reg['Score_Total'].to_numpy()
+    comorb = reg['V4_Comorbilidad_Detalle'].astype(str)
+    df = pd.DataFrame({
+        'ID_Paciente': reg['ID'].astype(str).array,
+        'Fecha_Registro': pd.to_datetime(reg['Fecha']).to_numpy(),
+        'Score_CriSTAL': scores,
+        'Prob_Mortalidad': reg['Prob_Mortalidad_Mat_%'].to_numpy(),
+        'Categoria_Riesgo': categorizar_scores(scores),
+        'Color': colores_scores(scores),
+        'Edad_65+': reg['V1_Edad_Puntos'].to_numpy() > 0,
+        'Fragilidad': reg['V9_Fragilidad_Puntos'].to_numpy() > 0,
+        'Comorbilidad_ICC': comorb.str.contains("ICC", regex=False).to_numpy(),
+        'Comorbilidad_EPOC': comorb.str.contains("EPOC", regex=False).to_numpy(),
+        'Fisiologico_Agudo': reg['V3_Fisiologico_Puntos'].to_numpy() > 0,
+        'Deterioro_Cognitivo': reg['V5_Cognitivo_Puntos'].to_numpy() > 0,
+        'Items_FRAIL': reg['V9_Fragilidad_Puntos'].to_numpy(),
+        # Outcome vacío (seguimiento pendiente) queda como NaN
+        'Outcome_30dias': reg['Outcome_30dias'].to_numpy(dtype='float32'),
+        # Registros anteriores a la columna Servicio (o con un servicio fuera de la lista)
+        'Servicio': pd.Categorical(
+            reg['Servicio'].astype(str) if 'Servicio' in reg.columns else [SIN_SERVICIO] * len(reg),
+            categories=TIPO_SERVICIO.categories,
+        ).fillna(SIN_SERVICIO),
+    })
+    df['Total_Factores'] = df[FACTORES_COHORTE].sum(axis=1)
+    return aplicar_esquema(df, {k: v for k, v in ESQUEMA_COHORTE.items() if k != 'Outcome_30dias'})
+
 # --- FUNCIÓN DE DATOS SIMULADOS PARA DASHBOARD ---
 
 def get_mock_patient_data():
@@ -41,12 +195,14 @@ def get_mock_patient_data():
     # 1. Scores y Probabilidad
     scores = np.random.normal(loc=9, scale=3, size=N).clip(0, 20).astype(int)
     probabilidades = calcular_probabilidad_math(scores)
-    categorias = [categorizar_score(s) for s in scores]
+    categorias = categorizar_scores(scores)
     
     # 2. Factores de Riesgo (Booleano)
+    fragilidad = np.random.choice([True, False], N, p=[0.6, 0.4])
+    items_frail = np.where(fragilidad, np.random.randint(1, 6, N), 0)
     factores = {
         'Edad_65+': np.random.choice([True, False], N, p=[0.7, 0.3]),
-        'Fragilidad': np.random.choice([True, False], N, p=[0.6, 0.4]),
+        'Fragilidad': fragilidad,
         'Comorbilidad_ICC': np.random.choice([True, False], N, p=[0.3, 0.7]),
         'Comorbilidad_EPOC': np.random.choice([True, False], N, p=[0.25, 0.75]),
         'Fisiologico_Agudo': np.random.choice([True, False], N, p=[0.05, 0.95]), # Raro, solo en urgencias
@@ -60,8 +216,11 @@ def get_mock_patient_data():
         'Score_CriSTAL': scores,
         'Prob_Mortalidad': probabilidades,
         'Categoria_Riesgo': categorias,
-        'Color': [obtener_color_riesgo(s) for s in scores],
-        **factores
+        'Color': colores_scores(scores),
+        **factores,
+        'Items_FRAIL': items_frail,
+        'Outcome_30dias': np.random.random(N) < probabilidades / 100,  # Mortalidad observada simulada
+        'Servicio': np.random.choice(SERVICIOS, N),
     }
     
     df = pd.DataFrame(data)
@@ -76,4 +235,4 @@ def get_mock_patient_data():
         df['Deterioro_Cognitivo'].astype(int)
     )
     
-    return df
+    return aplicar_esquema(df, ESQUEMA_COHORTE)